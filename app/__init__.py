@@ -1,5 +1,16 @@
 from .google_drive.drive import GoogleDrive
-from .data import PostgresExporter, AzureBlobStorage, SalesTransformations
+from .data import (
+    PostgresExporter,
+    AzureBlobStorage,
+    SalesTransformations,
+    SheetFingerprintIndex,
+    SpreadsheetIdCache,
+    TrackedEmailFilter,
+    get_tracked_email_filter,
+    ProcessingLedger,
+    ingest_queue_name,
+)
+from .slack import SlackNotifier
 import logging 
 import base64
 import json
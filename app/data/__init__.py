@@ -1,3 +1,6 @@
-from .azure import AzureExporter, PostgresExporter, AzureBlobStorage
+from .azure import AzureExporter, PostgresExporter, AzureBlobStorage, ingest_queue_name
 from .transformations import SalesTransformations
-
+from .fingerprints import SheetFingerprintIndex, fingerprint_rows
+from .spreadsheet_cache import SpreadsheetIdCache
+from .email_filter import TrackedEmailFilter, get_tracked_email_filter
+from .ledger import ProcessingLedger
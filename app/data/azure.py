@@ -1,15 +1,126 @@
 import os
-from dataclasses import dataclass
-from typing import Optional
-
+import json
+import hashlib
+from time import perf_counter
+import re
+from contextlib import nullcontext
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+import numpy as np
 import pandas as pd
-from sqlalchemy import create_engine, types, text
+from sqlalchemy import bindparam, create_engine, types, text
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.engine import URL
-import requests
 import textwrap
 import logging
 from app.google_drive.drive import GoogleDrive
+from app.slack.notifier import get_notifier
+from .fingerprints import fingerprint_rows
+from .backend import default_dtype_backend, dtype_backend_kwargs
+from .parsing import parse_xlsx
+from ..instrumentation import count_api_calls, instrumented, record
+from azure.core.exceptions import ResourceExistsError, ResourceNotFoundError
 from azure.storage.blob import BlobServiceClient, BlobType
+import io
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+    import pyarrow.parquet as pq
+except ImportError:  # parquet salesfiles and the arrow backend are optional
+    pa = pa_csv = pq = None
+
+try:
+    from azure.storage.queue import QueueClient, TextBase64DecodePolicy, TextBase64EncodePolicy
+except ImportError:  # only needed for ZI_SEARCH_INGEST=queue or batch
+    QueueClient = None
+
+# salesfiles containers announced on the ingest queue instead of read by a blob trigger.
+QUEUED_CONTAINERS = ("salesfiles/zi_search",)
+ZI_SEARCH_INGEST_QUEUE = "zi-search-ingest"
+# read in batches by ZiSearchBatchIngest, no trigger listens on it.
+ZI_SEARCH_BATCH_QUEUE = "zi-search-ingest-batch"
+# parsed salesfiles whose mark or upload failed, read back when sales_sync resumes them.
+RESUME_CONTAINER = "salesfiles-resume"
+
+
+def ingest_queue_name() -> Optional[str]:
+    """The ingest queue with ZI_SEARCH_INGEST=queue or batch, otherwise None
+    and the zi search blobs are picked up by the blob triggers."""
+    return {
+        "queue": ZI_SEARCH_INGEST_QUEUE,
+        "batch": ZI_SEARCH_BATCH_QUEUE,
+    }.get(os.environ.get("ZI_SEARCH_INGEST"))
+
+# franchise master list file id -> (drive modifiedTime, franchise domains),
+# kept for the life of the worker so unchanged lists aren't re-downloaded.
+_franchise_cache = {}
+
+
+def normalize_domain(url: str) -> str:
+    """Same normalisation as the city search franchise join: host without www."""
+    domain = re.sub(r"^https?://", "", str(url).strip().lower()).split("/")[0]
+    return domain.replace("www.", "")
+
+
+def normalize_contact_ids(contact_ids: pd.Series) -> pd.Series:
+    """ZoomInfo contact ids as strings whatever dtype they were read with. A
+    float column (ids with blanks) would otherwise give "123.0" where an int
+    or arrow column gives "123"."""
+    return pd.Series(
+        [
+            None if pd.isna(contact_id) else re.sub(r"\.0$", "", str(contact_id).strip(" "))
+            for contact_id in contact_ids
+        ],
+        index=contact_ids.index,
+        dtype=object,
+    )
+
+
+def contact_fingerprints(dataset: pd.DataFrame) -> pd.Series:
+    """md5 of the normalised email and zoominfo contact id, NaN when both are blank
+    (insert_raw_data turns "nan" into NULL). Must match the backfill in the lead
+    fingerprints migration: only spaces are trimmed, as sql trim() does, and the
+    ids are expected to be normalised with normalize_contact_ids."""
+    emails = dataset["email_address"].astype(object).where(dataset["email_address"].notna(), "")
+    contact_ids = dataset["zoominfo_contact_id"].astype(object).where(
+        dataset["zoominfo_contact_id"].notna(), ""
+    )
+    return pd.Series(
+        [
+            hashlib.md5(f"{email.strip(' ').lower()}|{contact_id}".encode()).hexdigest()
+            if email or contact_id
+            else np.nan
+            for email, contact_id in zip(emails.astype(str), contact_ids.astype(str))
+        ],
+        index=dataset.index,
+    )
+
+
+# a repeat contact stays on the file it was first seen in, the repeat is a lead_sightings row.
+LEAD_FIRST_SEEN_COLUMNS = ("drive_metadata_uuid", "created_at")
+
+
+def upsert_method(conflict_column: str, keep_on_conflict: tuple = ()) -> Callable:
+    """pandas to_sql method: rows that collide on `conflict_column` update the
+    existing row instead of inserting another one. The `keep_on_conflict`
+    columns keep their existing values."""
+
+    def upsert(table, conn, keys, data_iter) -> int:
+        rows = [dict(zip(keys, row)) for row in data_iter]
+        stmt = insert(table.table).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[conflict_column],
+            set_={
+                key: stmt.excluded[key]
+                for key in keys
+                if key != conflict_column and key not in keep_on_conflict
+            },
+        )
+        return conn.execute(stmt).rowcount
+
+    return upsert
 
 
 @dataclass
@@ -118,6 +229,7 @@ class PostgresExporter:
     host: str = None
     port: str = None
     database: str = None
+    dtype_backend: Optional[str] = field(default_factory=default_dtype_backend)
 
     def __post_init__(self):
         self.connection_string = f"postgresql://{self.username}:{self.password}@{self.host}:{self.port}/{self.database}"
@@ -127,6 +239,16 @@ class PostgresExporter:
         with self.engine.connect() as connection:
             connection.execute(text(f"CREATE SCHEMA IF NOT EXISTS {schema}"))
 
+    def _begin(self, connection=None):
+        """
+        Joins the caller's transaction when a connection is passed,
+        otherwise opens (and commits) a new one.
+        """
+        return nullcontext(connection) if connection is not None else self.engine.begin()
+
+    def _clean_column_name(self, column: str) -> str:
+        return self._clean_column_names(pd.DataFrame(columns=[column])).columns[0]
+
     def _clean_column_names(self, dataset: pd.DataFrame) -> pd.DataFrame:
         dataset.columns = (
             dataset.columns.str.strip()
@@ -139,6 +261,7 @@ class PostgresExporter:
         )
         return dataset
 
+    @instrumented()
     def insert_raw_data(
         self,
         dataset: pd.DataFrame,
@@ -146,24 +269,35 @@ class PostgresExporter:
         schema: str,
         created_at_column: Optional[str] = "created_at",
         column_names: Optional[list] = None, 
+        connection=None,
+        upsert_on: Optional[str] = None,
+        chunksize: Optional[int] = None,
+        keep_on_conflict: tuple = (),
     ) -> None:
         if dataset.empty:
             pass
 
         else:
             dataset = self._clean_column_names(dataset)
+            record(rows=dataset.shape[0], table=f"{schema}.{table_name}")
 
-            dataset = dataset.astype(str)
+            if self.dtype_backend == "pyarrow":
+                # nulls stay null, no "nan" strings to replace afterwards.
+                dataset = dataset.astype("string[pyarrow]")
+            else:
+                dataset = dataset.astype(str)
             dataset[created_at_column] = pd.to_datetime("now").utcnow()
 
-            col_types = {
-                col: types.VARCHAR(dataset[col].astype(str).str.len().max())
-                for col in dataset.columns
-                if col not in [created_at_column]
-            }
+            col_types = {}
+            if self.dtype_backend != "pyarrow":
+                col_types = {
+                    col: types.VARCHAR(dataset[col].astype(str).str.len().max())
+                    for col in dataset.columns
+                    if col not in [created_at_column]
+                }
 
-            col_types[created_at_column] = types.DateTime()
-            dataset = dataset.replace("nan", None)
+                col_types[created_at_column] = types.DateTime()
+                dataset = dataset.replace("nan", None)
             
             if column_names:
                 
@@ -177,17 +311,229 @@ class PostgresExporter:
                 dataset = dataset[column_names]
 
             if table_name == 'drive_metadata':
-                dataset = dataset.drop(columns=['config_file_uuid', 'hubspot_owner', 'zi_search', 'has_posted_on_slack', 'file_type', 'has_been_processed'])
+                dataset = dataset.drop(columns=['config_file_uuid', 'hubspot_owner', 'zi_search', 'has_posted_on_slack', 'file_type', 'has_been_processed', 'content_hash', 'duplicate_of'])
             
+            if self.dtype_backend == "pyarrow":
+                self.copy_dataframe(
+                    dataset=dataset,
+                    table_name=table_name,
+                    schema=schema,
+                    connection=connection,
+                    upsert_on=upsert_on,
+                    keep_on_conflict=keep_on_conflict,
+                )
+                return None
+
             dataset.to_sql(
                 name=table_name,
                 schema=schema,
-                con=self.engine,
+                con=connection if connection is not None else self.engine,
                 if_exists="append",
                 index=False,
                 dtype=col_types,
+                method=upsert_method(upsert_on, keep_on_conflict) if upsert_on else None,
+                chunksize=chunksize,
             )
 
+    def copy_dataframe(
+        self,
+        dataset: pd.DataFrame,
+        table_name: str,
+        schema: str,
+        connection=None,
+        upsert_on: Optional[str] = None,
+        keep_on_conflict: tuple = (),
+    ) -> None:
+        """
+        Loads the frame with COPY FROM STDIN, serialised to csv by arrow.
+        With `upsert_on` the rows are copied into a temp staging table first
+        and merged with INSERT ... ON CONFLICT, leaving the `keep_on_conflict`
+        columns of existing rows as they are.
+        """
+        if pa_csv is None:
+            raise ImportError("pyarrow is required for the arrow backend")
+
+        for col in dataset.columns[dataset.dtypes.astype(str).str.startswith("datetime64")]:
+            dataset[col] = dataset[col].dt.tz_localize(None).astype("datetime64[us]")
+
+        buffer = io.BytesIO()
+        pa_csv.write_csv(pa.Table.from_pandas(dataset, preserve_index=False), buffer)
+        buffer.seek(0)
+
+        columns = ", ".join(dataset.columns)
+        target = f"{schema}.{table_name}"
+
+        with self._begin(connection) as connection:
+            if upsert_on:
+                connection.execute(
+                    text(
+                        f"CREATE TEMPORARY TABLE stg_{table_name} (LIKE {target} INCLUDING DEFAULTS) ON COMMIT DROP"
+                    )
+                )
+                target = f"stg_{table_name}"
+
+            cursor = connection.connection.cursor()
+            cursor.copy_expert(
+                f"COPY {target} ({columns}) FROM STDIN WITH (FORMAT csv, HEADER true)",
+                buffer,
+            )
+
+            if upsert_on:
+                updates = ", ".join(
+                    f"{col} = EXCLUDED.{col}"
+                    for col in dataset.columns
+                    if col != upsert_on and col not in keep_on_conflict
+                )
+                connection.execute(
+                    text(
+                        f"""
+                        INSERT INTO {schema}.{table_name} ({columns})
+                        SELECT {columns} FROM {target}
+                        ON CONFLICT ({upsert_on}) DO UPDATE SET {updates};
+                        DROP TABLE {target};
+                        """
+                    )
+                )
+
+    def insert_leads(self, dataset: pd.DataFrame, connection=None) -> None:
+        """
+        Loads a ZoomInfo export into sales_leads.leads, one row per contact.
+        Contacts already in the table keep the file they were first seen in,
+        only their other columns are refreshed. Every sighting is recorded in
+        sales_leads.lead_sightings, also when the dataset holds the same
+        contact in several files.
+        """
+        if dataset.empty:
+            return None
+
+        dataset = self._clean_column_names(dataset)
+        for col in ["email_address", "zoominfo_contact_id"]:
+            if col not in dataset.columns:
+                dataset[col] = np.nan
+        # stored normalised too, so the migration backfill computes the same fingerprint.
+        dataset["zoominfo_contact_id"] = normalize_contact_ids(dataset["zoominfo_contact_id"])
+        dataset["contact_fingerprint"] = contact_fingerprints(dataset)
+        # taken before the dedupe, which keeps only the first file of each contact.
+        sightings = dataset[["contact_fingerprint", "drive_metadata_uuid"]].drop_duplicates()
+        dataset = pd.concat(
+            [
+                dataset[dataset["contact_fingerprint"].isna()],
+                dataset[dataset["contact_fingerprint"].notna()].drop_duplicates(
+                    subset=["contact_fingerprint"], keep="first"
+                ),
+            ]
+        )
+
+        column_count = len(self.get_columns_from_table("leads", "sales_leads"))
+        self.insert_raw_data(
+            dataset=dataset,
+            table_name="leads",
+            schema="sales_leads",
+            connection=connection,
+            upsert_on="contact_fingerprint",
+            keep_on_conflict=LEAD_FIRST_SEEN_COLUMNS,
+            # postgres caps a statement at 65535 bind parameters.
+            chunksize=max(1, 60000 // column_count),
+        )
+
+        with self._begin(connection) as connection:
+            connection.execute(text(self.lead_sightings_query(sightings)))
+
+    def lead_sightings_query(self, sightings: pd.DataFrame) -> str:
+        """
+        Records the (contact_fingerprint, drive_metadata_uuid) pairs of
+        `sightings` against the lead of each contact. Leads without a
+        fingerprint are one row per file and are sighted in their own file.
+        """
+        drive_metadata_uuids = ", ".join(
+            f"'{uuid}'" for uuid in sightings["drive_metadata_uuid"].unique()
+        )
+        pairs = ", ".join(
+            f"('{fingerprint}', '{uuid}')"
+            for fingerprint, uuid in sightings.dropna(subset=["contact_fingerprint"]).itertuples(index=False)
+        )
+        fingerprinted = f"""
+            SELECT l.uuid AS lead_uuid, CAST(p.drive_metadata_uuid AS uuid) AS drive_metadata_uuid, l.created_at
+            FROM (VALUES {pairs}) AS p (contact_fingerprint, drive_metadata_uuid)
+            INNER JOIN sales_leads.leads l
+              ON l.contact_fingerprint = p.contact_fingerprint
+            UNION
+        """ if pairs else ""
+        return f"""
+        INSERT INTO sales_leads.lead_sightings (lead_uuid, drive_metadata_uuid, created_at)
+        SELECT n.lead_uuid, n.drive_metadata_uuid, n.created_at
+        FROM ({fingerprinted}
+            SELECT l.uuid, l.drive_metadata_uuid, l.created_at
+            FROM sales_leads.leads l
+            WHERE l.drive_metadata_uuid IN ({drive_metadata_uuids})
+            AND l.contact_fingerprint IS NULL
+        ) n
+        WHERE NOT EXISTS (
+            SELECT 1
+            FROM sales_leads.lead_sightings s
+            WHERE s.lead_uuid = n.lead_uuid
+            AND s.drive_metadata_uuid = n.drive_metadata_uuid
+        )
+        """
+
+    def get_ingest_checkpoint(self, file_id: str, total_rows: int) -> int:
+        """
+        Rows of the file already loaded by committed chunks. Checkpoints from a
+        different version of the file (another row count) are discarded and
+        the load starts over, which the contact upsert makes safe.
+        """
+        with self.engine.begin() as connection:
+            rows_loaded, stale = connection.execute(
+                text(self.ingest_checkpoint_query(file_id, total_rows))
+            ).fetchone()
+            if stale:
+                logging.info(f"Discarding checkpoints of {file_id}, the file has changed")
+                self.clear_ingest_checkpoints(file_id, connection=connection)
+                return 0
+            return rows_loaded
+
+    def ingest_checkpoint_query(self, file_id: str, total_rows: int) -> str:
+        return f"""
+        SELECT COALESCE(MAX(chunk_offset + chunk_rows), 0) AS rows_loaded
+             , COUNT(*) FILTER (WHERE total_rows <> {int(total_rows)}) AS stale
+        FROM sales_leads.ingest_checkpoints
+        WHERE file_id = '{file_id}'
+        """
+
+    def clear_ingest_checkpoints(self, file_id: str, connection=None) -> None:
+        query = f"DELETE FROM sales_leads.ingest_checkpoints WHERE file_id = '{file_id}'"
+        with self._begin(connection) as connection:
+            connection.execute(text(query))
+
+    def insert_leads_checkpointed(
+        self, dataset: pd.DataFrame, file_id: str, chunk_rows: Optional[int] = None
+    ) -> int:
+        """
+        insert_leads in chunks of `chunk_rows`, each committed together with
+        its checkpoint, so a retry resumes after the last committed chunk.
+        Returns the number of rows loaded by this call.
+        """
+        chunk_rows = chunk_rows or int(os.environ.get("INGEST_CHUNK_ROWS", 5000))
+        total_rows = dataset.shape[0]
+        start = self.get_ingest_checkpoint(file_id, total_rows)
+        if start:
+            logging.info(f"Resuming {file_id} at row {start} of {total_rows}")
+
+        for offset in range(start, total_rows, chunk_rows):
+            chunk = dataset.iloc[offset : offset + chunk_rows].copy()
+            with self.engine.begin() as connection:
+                self.insert_leads(dataset=chunk, connection=connection)
+                connection.execute(
+                    text(
+                        f"""
+                        INSERT INTO sales_leads.ingest_checkpoints
+                        (file_id, chunk_offset, chunk_rows, total_rows, created_at)
+                        VALUES ('{file_id}', {offset}, {chunk.shape[0]}, {total_rows}, CURRENT_TIMESTAMP)
+                        """
+                    )
+                )
+        return max(total_rows - start, 0)
+
     def check_if_record_exists(
         self,
         table_name: str,
@@ -228,13 +574,16 @@ class PostgresExporter:
             """
             return pd.read_sql(query, connection)
 
-    def  update_tracking_table(self, drive_metadata_uuid: str) -> None:
+    def  update_tracking_table(self, drive_metadata_uuid: str, connection=None) -> None:
         """
         Get the assoicated UUID and write an update statement
         to the tracking table.
         """
+        with self._begin(connection) as connection:
+            connection.execute(text(self.tracking_query(drive_metadata_uuid)))
 
-        qry = f"""
+    def tracking_query(self, drive_metadata_uuid: str) -> str:
+        return f"""
         WITH new_data AS (
             SELECT l.email_address
             , l.uuid as lead_uuid
@@ -247,22 +596,26 @@ class PostgresExporter:
             AND l.email_address IS NOT NULL
             AND t.lead_uuid IS NULL
         )
-        INSERT INTO sales_leads.tracking
-        (lead_uuid, status, email_address, created_at)
-        SELECT lead_uuid, status::status_enum, email_address, CURRENT_TIMESTAMP
-        FROM new_data
+        , inserted AS (
+            INSERT INTO sales_leads.tracking
+            (lead_uuid, status, email_address, created_at)
+            SELECT lead_uuid, status::status_enum, email_address, CURRENT_TIMESTAMP
+            FROM new_data
+            RETURNING 1
+        )
+        {self._increment_metrics_query(drive_metadata_uuid, posted="COUNT(*)", shopify="0", source="inserted")}
         """
 
-        with self.engine.begin() as connection:
-            connection.execute(text(qry))
-
     def update_city_search_tracking_table(self, drive_metadata_uuid: str) -> None:
         """
         Get the assoicated UUID and write an update statement
         to the tracking table.
         """
+        with self.engine.begin() as connection:
+            connection.execute(text(self.city_search_tracking_query(drive_metadata_uuid)))
 
-        qry = f"""
+    def city_search_tracking_query(self, drive_metadata_uuid: str) -> str:
+        return f"""
         WITH new_data AS (
             SELECT COALESCE(l.main_point_of_contact_email, l.generic_contact_email) AS email_address
             , l.uuid as city_search_lead_uuid
@@ -279,18 +632,24 @@ class PostgresExporter:
                 ON t.city_search_lead_uuid = n.city_search_lead_uuid
                 WHERE n.city_search_lead_uuid IS NOT NULL
             )
-        INSERT INTO sales_leads.tracking
-        (city_search_lead_uuid, status, email_address, created_at)
-        SELECT city_search_lead_uuid, status::status_enum, email_address, CURRENT_TIMESTAMP
-        FROM not_already_seen
+        , inserted AS (
+            INSERT INTO sales_leads.tracking
+            (city_search_lead_uuid, status, email_address, created_at)
+            SELECT city_search_lead_uuid, status::status_enum, email_address, CURRENT_TIMESTAMP
+            FROM not_already_seen
+            RETURNING 1
+        )
+        {self._increment_metrics_query(drive_metadata_uuid, posted="COUNT(*)", shopify="0", source="inserted")}
         """
 
-        with self.engine.begin() as connection:
-            connection.execute(text(qry))
+    def update_tracking_table_shopify_customer(
+        self, drive_metadata_uuid: str, connection=None
+    ) -> None:
+        with self._begin(connection) as connection:
+            connection.execute(text(self.shopify_tracking_query(drive_metadata_uuid)))
 
-    def update_tracking_table_shopify_customer(self, drive_metadata_uuid: str) -> None:
-        with self.engine.begin() as connection:
-            qry = f"""WITH new_data AS (
+    def shopify_tracking_query(self, drive_metadata_uuid: str) -> str:
+        return f"""WITH new_data AS (
                 SELECT  tracking.uuid 
                 , l.email_address
                 , l.uuid as lead_uuid
@@ -306,25 +665,30 @@ class PostgresExporter:
                     -- we check for shopify customers AFTER they have been posted
                     -- so we want to update these records
                 )
-    
-                INSERT INTO sales_leads.tracking
-                (uuid, lead_uuid, status, email_address, created_at)
-                SELECT uuid, lead_uuid, status::status_enum, email_address, CURRENT_TIMESTAMP
-                FROM new_data
-                ON CONFLICT (uuid)
-                DO UPDATE
-                SET status = EXCLUDED.status
-                  , created_at = CURRENT_TIMESTAMP
+
+                , upserted AS (
+                    INSERT INTO sales_leads.tracking
+                    (uuid, lead_uuid, status, email_address, created_at)
+                    SELECT uuid, lead_uuid, status::status_enum, email_address, CURRENT_TIMESTAMP
+                    FROM new_data
+                    ON CONFLICT (uuid)
+                    DO UPDATE
+                    SET status = EXCLUDED.status
+                      , created_at = CURRENT_TIMESTAMP
+                    RETURNING (xmax = 0) AS is_new -- false when a posted row was flipped
+                )
+                {self._increment_metrics_query(drive_metadata_uuid, posted="-COUNT(*) FILTER (WHERE NOT is_new)", shopify="COUNT(*)", source="upserted")}
                 ;
             """
 
-            connection.execute(text(qry))
-
     def update_city_search_tracking_table_shopify_customer(
         self, drive_metadata_uuid: str
     ) -> None:
         with self.engine.begin() as connection:
-            qry = f"""WITH new_data AS (
+            connection.execute(text(self.city_search_shopify_tracking_query(drive_metadata_uuid)))
+
+    def city_search_shopify_tracking_query(self, drive_metadata_uuid: str) -> str:
+        return f"""WITH new_data AS (
                 SELECT  tracking.uuid 
                 , COALESCE(l.main_point_of_contact_email, l.generic_contact_email) AS email_address
                 , l.uuid as city_search_lead_uuid
@@ -340,111 +704,233 @@ class PostgresExporter:
                     -- we check for shopify customers AFTER they have been posted
                     -- so we want to update these records
                 )
-    
-                INSERT INTO sales_leads.tracking
-                (uuid, city_search_lead_uuid, status, email_address, created_at)
-                SELECT COALESCE(uuid,gen_random_uuid()), city_search_lead_uuid, status::status_enum, email_address, CURRENT_TIMESTAMP
-                FROM new_data
-                ON CONFLICT (uuid)
-                DO UPDATE
-                SET status = EXCLUDED.status
-                  , created_at = CURRENT_TIMESTAMP
+
+                , upserted AS (
+                    INSERT INTO sales_leads.tracking
+                    (uuid, city_search_lead_uuid, status, email_address, created_at)
+                    SELECT COALESCE(uuid,gen_random_uuid()), city_search_lead_uuid, status::status_enum, email_address, CURRENT_TIMESTAMP
+                    FROM new_data
+                    ON CONFLICT (uuid)
+                    DO UPDATE
+                    SET status = EXCLUDED.status
+                      , created_at = CURRENT_TIMESTAMP
+                    RETURNING (xmax = 0) AS is_new -- false when a posted row was flipped
+                )
+                {self._increment_metrics_query(drive_metadata_uuid, posted="-COUNT(*) FILTER (WHERE NOT is_new)", shopify="COUNT(*)", source="upserted")}
                 ;
             """
 
-            connection.execute(text(qry))
+    def _increment_metrics_query(
+        self, drive_metadata_uuid: str, posted: str, shopify: str, source: str
+    ) -> str:
+        """
+        Trailing statement for the tracking updates, adds the deltas
+        aggregated from the `source` cte onto the per file counters.
+        """
+        return f"""
+        INSERT INTO sales_leads.drive_metadata_metrics AS m
+        (drive_metadata_uuid, number_of_posted_leads, number_of_shopify_customers, updated_at)
+        SELECT '{drive_metadata_uuid}', {posted}, {shopify}, CURRENT_TIMESTAMP
+        FROM {source}
+        ON CONFLICT (drive_metadata_uuid) DO UPDATE
+        SET number_of_posted_leads = m.number_of_posted_leads + EXCLUDED.number_of_posted_leads
+          , number_of_shopify_customers = m.number_of_shopify_customers + EXCLUDED.number_of_shopify_customers
+          , updated_at = EXCLUDED.updated_at
+        """
+
+    def get_slack_channel_metrics(self, drive_metadata_uuid: str) -> pd.DataFrame:
+        return pd.read_sql(self.slack_channel_metrics_query(drive_metadata_uuid), self.engine)
+
+    def slack_channel_metrics_query(self, drive_metadata_uuid: str) -> str:
+        return f"""
+                     SELECT d.name
+                          , m.number_of_shopify_customers
+                          , m.number_of_posted_leads
+                          , d.created_at
+                     FROM sales_leads.drive_metadata_metrics m
+                       INNER JOIN sales_leads.drive_metadata d
+                         ON d.uuid = m.drive_metadata_uuid
+                     WHERE m.drive_metadata_uuid = '{drive_metadata_uuid}'
+                           """
 
     def get_slack_channel_metrics_zi_search(
         self, drive_metadata_uuid: str
     ) -> pd.DataFrame:
-        return pd.read_sql(
-            f""" 
-                     SELECT d.name
-                          , SUM(CASE WHEN tracking.status = 'shopify_customer' THEN 1 ELSE 0 END) AS number_of_shopify_customers
-                          , SUM(CASE WHEN tracking.status = 'posted' THEN 1 ELSE 0 END)           AS number_of_posted_leads
-                          , d.created_at
-                     FROM sales_leads.tracking
-                       LEFT JOIN sales_leads.leads          l
-                         ON l.uuid = tracking.lead_uuid
-                       LEFT JOIN sales_leads.drive_metadata d
-                         ON d.uuid = l.drive_metadata_uuid
-                     WHERE l.drive_metadata_uuid IN ('{drive_metadata_uuid}')
-                     GROUP BY d.name, d.created_at
-                     
-                           """,
-            self.engine,
-        )
+        return self.get_slack_channel_metrics(drive_metadata_uuid=drive_metadata_uuid)
 
     def get_slack_channel_metrics_city_search(
         self, drive_metadata_uuid: str
     ) -> pd.DataFrame:
-        return pd.read_sql(
-            f""" 
-                     SELECT d.name
-                          , SUM(CASE WHEN tracking.status = 'shopify_customer' THEN 1 ELSE 0 END) AS number_of_shopify_customers
-                          , SUM(CASE WHEN tracking.status = 'posted' THEN 1 ELSE 0 END)           AS number_of_posted_leads
-                          , d.created_at
-                     FROM sales_leads.tracking
-                       LEFT JOIN sales_leads.city_search_enriched          l
-                         ON l.uuid = tracking.city_search_lead_uuid
-                       LEFT JOIN sales_leads.drive_metadata d
-                         ON d.uuid = l.drive_metadata_uuid
-                     WHERE l.drive_metadata_uuid IN ('{drive_metadata_uuid}')
-                     GROUP BY d.name, d.created_at
-                           """,
-            self.engine,
-        )
+        return self.get_slack_channel_metrics(drive_metadata_uuid=drive_metadata_uuid)
 
-    def create_config_temp_table(self, temp_table_name: str) -> None:
-        qry = f"""
-        CREATE TEMPORARY TABLE {temp_table_name} (
-            
-            filename varchar(255),
-            hubspot_owner varchar(255),
-            zi_search varchar(255), 
-            file_type varchar(255)
-            )           
+    def backfill_drive_metadata_metrics(self) -> None:
+        """
+        Rebuilds the per file counters from the full tracking history.
+        Only needed once after the migration or if the counters drift.
+        """
+        qry = """
+        WITH tracked AS (
+            SELECT COALESCE(l.drive_metadata_uuid, c.drive_metadata_uuid) AS drive_metadata_uuid
+            , t.status
+            FROM sales_leads.tracking t
+            LEFT JOIN sales_leads.leads l
+              ON l.uuid = t.lead_uuid
+            LEFT JOIN sales_leads.city_search_enriched c
+              ON c.uuid = t.city_search_lead_uuid
+        )
+        INSERT INTO sales_leads.drive_metadata_metrics
+        (drive_metadata_uuid, number_of_posted_leads, number_of_shopify_customers, updated_at)
+        SELECT drive_metadata_uuid
+        , SUM(CASE WHEN status = 'posted' THEN 1 ELSE 0 END)
+        , SUM(CASE WHEN status = 'shopify_customer' THEN 1 ELSE 0 END)
+        , CURRENT_TIMESTAMP
+        FROM tracked
+        WHERE drive_metadata_uuid IS NOT NULL
+        GROUP BY drive_metadata_uuid
+        ON CONFLICT (drive_metadata_uuid) DO UPDATE
+        SET number_of_posted_leads = EXCLUDED.number_of_posted_leads
+          , number_of_shopify_customers = EXCLUDED.number_of_shopify_customers
+          , updated_at = EXCLUDED.updated_at;
         """
 
         with self.engine.begin() as connection:
             connection.execute(text(qry))
 
-    def update_config_metadata(self, dataframe: pd.DataFrame) -> None:
-        if dataframe.empty:
-            pass
-        else:
-            self.create_config_temp_table(temp_table_name="temp_config")
+    def get_sync_state(self, name: str) -> Optional[dict]:
+        with self.engine.connect() as connection:
+            row = connection.execute(
+                text(
+                    "SELECT modified_time, content_hash FROM sales_leads.sync_state WHERE name = :name"
+                ),
+                {"name": name},
+            ).mappings().fetchone()
+            return dict(row) if row is not None else None
+
+    def set_sync_state(self, name: str, modified_time: str, content_hash: str) -> None:
+        qry = """
+        INSERT INTO sales_leads.sync_state (name, modified_time, content_hash, updated_at)
+        VALUES (:name, :modified_time, :content_hash, CURRENT_TIMESTAMP)
+        ON CONFLICT (name) DO UPDATE
+        SET modified_time = EXCLUDED.modified_time
+          , content_hash = EXCLUDED.content_hash
+          , updated_at = EXCLUDED.updated_at
+        """
+        with self.engine.begin() as connection:
+            connection.execute(
+                text(qry),
+                {"name": name, "modified_time": modified_time, "content_hash": content_hash},
+            )
 
-            logging.info(dataframe.columns)
+    def sync_file_config(
+        self, gdrive: GoogleDrive, spreadsheet_name: str, folder_id: str
+    ) -> bool:
+        """
+        Syncs the quick mail config sheet into sales_leads.quick_mail_config.
 
-            dataframe.columns = ["filename", "hubspot_owner", "zi_search"]
+        The sheet is only downloaded when its drive modifiedTime moved on, and
+        only rows whose hash changed are merged. Returns True if anything changed.
+        """
+        state = self.get_sync_state("quick_mail_config") or {}
+        # by the cached id first, the sheet is only opened (and searched for) when needed.
+        modified_time = gdrive.get_cached_spreadsheet_modified_time(spreadsheet_name, folder_id)
+        if modified_time is None:
+            spreadsheet = gdrive.open_spreadsheet(spreadsheet_name=spreadsheet_name, folder_id=folder_id)
+            modified_time = gdrive.get_file_modified_time(spreadsheet.id)
+
+        if state.get("modified_time") == modified_time:
+            logging.info("Config file unchanged since last sync, skipping")
+            return False
+
+        file_config = gdrive.get_file_config(spreadsheet_name, folder_id=folder_id)
+        file_config.columns = ["filename", "hubspot_owner", "zi_search"]
+        file_config = file_config.drop_duplicates(subset=["filename"], keep="last")
+        file_config["row_hash"] = fingerprint_rows(file_config).values
+        content_hash = hashlib.sha1("".join(sorted(file_config["row_hash"])).encode()).hexdigest()
+
+        changed = content_hash != state.get("content_hash")
+        if changed:
+            self.merge_config_rows(file_config)
+
+        self.set_sync_state("quick_mail_config", modified_time, content_hash)
+        return changed
+
+    def merge_config_rows(self, file_config: pd.DataFrame) -> None:
+        current = pd.read_sql(
+            "SELECT filename, row_hash FROM sales_leads.quick_mail_config", self.engine
+        )
+        removed = current.loc[~current["filename"].isin(file_config["filename"]), "filename"]
+        if not removed.empty:
+            logging.info(f"Removing {removed.shape[0]} config rows deleted from the sheet")
+            with self.engine.begin() as connection:
+                connection.execute(
+                    text(
+                        "DELETE FROM sales_leads.quick_mail_config WHERE filename IN :filenames"
+                    ).bindparams(bindparam("filenames", expanding=True)),
+                    {"filenames": removed.tolist()},
+                )
 
-            dataframe.to_sql(
-                name="temp_config", con=self.engine, if_exists="append", index=False
+        changed_rows = file_config[
+            ~file_config["row_hash"].isin(current["row_hash"])
+        ]
+        logging.info(f"Merging {changed_rows.shape[0]} changed config rows")
+
+        if changed_rows.empty:
+            return None
+
+        qry = """
+        INSERT INTO sales_leads.quick_mail_config
+        (filename, hubspot_owner, zi_search, row_hash, updated_at)
+        VALUES (:filename, :hubspot_owner, :zi_search, :row_hash, CURRENT_TIMESTAMP)
+        ON CONFLICT (filename) DO UPDATE
+        SET hubspot_owner = EXCLUDED.hubspot_owner
+          , zi_search = EXCLUDED.zi_search
+          , row_hash = EXCLUDED.row_hash
+          , updated_at = EXCLUDED.updated_at
+        """
+        with self.engine.begin() as connection:
+            # blanks are stored as NULL, not as the strings "nan" or "None".
+            connection.execute(
+                text(qry),
+                [
+                    {key: None if pd.isna(value) else str(value) for key, value in row.items()}
+                    for row in changed_rows[["filename", "hubspot_owner", "zi_search", "row_hash"]]
+                    .to_dict(orient="records")
+                ],
             )
 
-            qry = """
-            WITH drive_metadata AS (
-                SELECT d.uuid
-                , f.hubspot_owner
-                , f.zi_search
-                , current_timestamp as updated_at
-                FROM sales_leads.drive_metadata d
-                INNER JOIN temp_config f
-                    ON f.filename = d.name
-                WHERE d.config_file_uuid IS NULL -- only update records that have not been updated before.
-            )
-            INSERT INTO sales_leads.drive_metadata
-            (uuid, hubspot_owner, zi_search, updated_at)
-            SELECT uuid, hubspot_owner, zi_search, updated_at
-            FROM drive_metadata
-            ON CONFLICT (uuid) DO UPDATE
-            SET config_file_uuid = gen_random_uuid()
-            , hubspot_owner = EXCLUDED.hubspot_owner
-            , zi_search = EXCLUDED.zi_search
-            , updated_at = EXCLUDED.updated_at;
-            DROP TABLE temp_config;
-            """
+    def update_config_metadata(self, dataframe: Optional[pd.DataFrame] = None) -> None:
+        """
+        Applies the synced config to drive files that don't have one yet.
+        A config dataframe can still be passed in, it is merged first.
+        """
+        if dataframe is not None and not dataframe.empty:
+            logging.info(dataframe.columns)
+            dataframe.columns = ["filename", "hubspot_owner", "zi_search"]
+            dataframe = dataframe.drop_duplicates(subset=["filename"], keep="last")
+            dataframe["row_hash"] = fingerprint_rows(dataframe).values
+            self.merge_config_rows(dataframe)
+
+        qry = """
+        WITH drive_metadata AS (
+            SELECT d.uuid
+            , f.hubspot_owner
+            , f.zi_search
+            , current_timestamp as updated_at
+            FROM sales_leads.drive_metadata d
+            INNER JOIN sales_leads.quick_mail_config f
+                ON f.filename = d.name
+            WHERE d.config_file_uuid IS NULL -- only update records that have not been updated before.
+        )
+        INSERT INTO sales_leads.drive_metadata
+        (uuid, hubspot_owner, zi_search, updated_at)
+        SELECT uuid, hubspot_owner, zi_search, updated_at
+        FROM drive_metadata
+        ON CONFLICT (uuid) DO UPDATE
+        SET config_file_uuid = gen_random_uuid()
+        , hubspot_owner = EXCLUDED.hubspot_owner
+        , zi_search = EXCLUDED.zi_search
+        , updated_at = EXCLUDED.updated_at;
+        """
 
         with self.engine.begin() as connection:
             connection.execute(text(qry))
@@ -452,7 +938,7 @@ class PostgresExporter:
     def get_and_post_missing_config(self, slack_webhook) -> None:
         missing_config = pd.read_sql(
             """ 
-            SELECT name, created_at, lastmodifyinguser_displayname, file_type
+            SELECT uuid, name, created_at, lastmodifyinguser_displayname, file_type
             FROM sales_leads.drive_metadata
             WHERE
             config_file_uuid IS NULL
@@ -463,6 +949,7 @@ class PostgresExporter:
         )
 
         if not missing_config.empty:
+            messages = []
             for index, row in missing_config.iterrows():
                 missing_config_msg = textwrap.dedent(
                     f"""
@@ -474,19 +961,11 @@ class PostgresExporter:
                 https://docs.google.com/spreadsheets/d/1_wPctIjTdSXDvJIRmXw9S5MqYe3zE8dfCYGLYWg4BPg/edit#gid=0
                 """
                 )
+                messages.append(missing_config_msg)
 
-                response = requests.post(
-                    slack_webhook,
-                    json={"text": missing_config_msg}
-                )
-                
-                if response.status_code == 200:
-                    logging.info("Slack notification sent successfully")
-                else:
-                    logging.error(f"Failed to send slack notification: {response.status_code}")
-
-
-                self.update_drive_table_slack_posted()
+            delivered = get_notifier(slack_webhook).flush(messages)
+            posted_uuids = missing_config.loc[delivered, "uuid"].tolist()
+            self.update_drive_table_slack_posted(uuids=posted_uuids)
 
     def send_update_slack_metrics(
         self,
@@ -495,6 +974,7 @@ class PostgresExporter:
         sheet_name: Optional[str] = "",
         sheet_url: Optional[str] = "",
     ) -> None:
+        messages = []
         for group, data in slack_df.groupby("name"):
             message = textwrap.dedent(
                 f"""
@@ -508,17 +988,18 @@ class PostgresExporter:
                 message = message + f"\nSpreadsheet: <{sheet_url}|{sheet_name}>"
 
             logging.info(message)
-            response = requests.post(
-                os.environ.get("SLACK_WEBHOOK"),
-                json={"text": message}
-            )
-            
-            if response.status_code == 200:
-                logging.info("Slack metrics notification sent successfully")
-            else:
-                logging.error(f"Failed to send slack metrics: {response.status_code}")
+            messages.append(message)
+
+        get_notifier(slack_webhook or os.environ.get("SLACK_WEBHOOK")).flush(messages)
+
+    def update_drive_table_slack_posted(self, uuids: Optional[list] = None) -> None:
+        """
+        Flags the missing config rows as posted, when `uuids` is given
+        only those rows are flagged (the ones slack accepted).
+        """
+        if uuids is not None and not uuids:
+            return None
 
-    def update_drive_table_slack_posted(self) -> None:
         qry = f"""
         UPDATE sales_leads.drive_metadata
         SET has_posted_on_slack = True
@@ -526,20 +1007,114 @@ class PostgresExporter:
         AND has_posted_on_slack IS NULL
         """
 
+        if uuids:
+            qry += f"""AND uuid IN ({', '.join(f"'{item}'" for item in uuids)})"""
+
         with self.engine.begin() as connection:
             connection.execute(text(qry))
 
     def get_files_to_process(self, ids: list) -> pd.DataFrame:
         with self.engine.connect() as connection:
-            query = f"""
+            return pd.read_sql(self.files_to_process_query(ids), connection)
+
+    def files_to_process_query(self, ids: list) -> str:
+        return f"""
             SELECT id, name, file_type
             FROM sales_leads.drive_metadata
             WHERE id IN ({', '.join(f"'{item}'" for item in ids)})
             AND (config_file_uuid IS NOT NULL
             OR file_type = 'city_search') -- this doesn't need a config type.
+            AND duplicate_of IS NULL -- same content was already picked up under another file.
             """
-            return pd.read_sql(query, connection)
 
+    def mark_duplicate_files(self, ids: list) -> pd.DataFrame:
+        """
+        Flags files whose drive md5Checksum matches an earlier file, this only
+        needs the listing so duplicates are skipped before they are downloaded.
+        Returns the id and name of the flagged files.
+        """
+        with self.engine.begin() as connection:
+            return pd.DataFrame(
+                connection.execute(text(self.duplicate_files_query(ids))).mappings().all()
+            )
+
+    def duplicate_files_query(self, ids: list) -> str:
+        return f"""
+        WITH originals AS (
+            SELECT DISTINCT ON (md5checksum) uuid, md5checksum
+            FROM sales_leads.drive_metadata
+            WHERE md5checksum IS NOT NULL
+            AND md5checksum <> ''
+            AND duplicate_of IS NULL
+            AND {self._completed_file_filter("drive_metadata")}
+            ORDER BY md5checksum, created_at, uuid
+        )
+        UPDATE sales_leads.drive_metadata d
+        SET duplicate_of = o.uuid
+          , updated_at = CURRENT_TIMESTAMP
+        FROM originals o
+        WHERE d.md5checksum = o.md5checksum
+        AND d.uuid <> o.uuid
+        AND d.duplicate_of IS NULL
+        AND d.id IN ({', '.join(f"'{item}'" for item in ids)})
+        RETURNING d.id, d.name
+        """
+
+    def _completed_file_filter(self, alias: str) -> str:
+        """
+        Only a file that made it through can be the original of a duplicate:
+        ingested, or uploaded to salesfiles according to the ledger. Otherwise
+        a copy of a file without config, or of one that failed, would be
+        skipped for good.
+        """
+        return f"""(
+            {alias}.has_been_processed IS TRUE
+            OR EXISTS (
+                SELECT 1
+                FROM sales_leads.file_processing_ledger pl
+                WHERE pl.file_id = {alias}.id
+                AND pl.stage = 'upload'
+                AND pl.finished_at IS NOT NULL
+                AND pl.error IS NULL
+            )
+        )"""
+
+    def mark_duplicate_content(self, file_id: str, dataframe: pd.DataFrame) -> bool:
+        """
+        Stores a hash of the converted rows on the file, for duplicates drive
+        can't see (e.g. the same export saved as xlsx and csv). Returns True
+        when another file already had the same rows.
+        """
+        with self.engine.begin() as connection:
+            row = connection.execute(
+                text(self.duplicate_content_query(file_id, dataframe))
+            ).fetchone()
+            return row is not None and row[0] is not None
+
+    def duplicate_content_query(self, file_id: str, dataframe: pd.DataFrame) -> str:
+        rows = fingerprint_rows(dataframe.drop(columns=["drive_metadata_uuid"], errors="ignore"))
+        content_hash = hashlib.sha1("".join(sorted(rows)).encode()).hexdigest()
+
+        return f"""
+        WITH original AS (
+            SELECT uuid
+            FROM sales_leads.drive_metadata
+            WHERE content_hash = '{content_hash}'
+            AND id <> '{file_id}'
+            AND duplicate_of IS NULL
+            AND {self._completed_file_filter("drive_metadata")}
+            ORDER BY created_at
+            LIMIT 1
+        )
+        UPDATE sales_leads.drive_metadata
+        SET content_hash = '{content_hash}'
+          , duplicate_of = (SELECT uuid FROM original)
+          , updated_at = CURRENT_TIMESTAMP
+        WHERE id = '{file_id}'
+        RETURNING duplicate_of
+        """
+
+    @instrumented()
     def process_file(self, file_id: str, gdrive: GoogleDrive) -> pd.DataFrame:
         uuid = self.get_uuid_from_table(
             table_name="drive_metadata",
@@ -549,14 +1124,30 @@ class PostgresExporter:
         )
 
         stream = gdrive.get_stream_object(file_id)
+        record(bytes=stream.getbuffer().nbytes, file_id=file_id)
 
         file_ext = gdrive.get_file_type(file_id)
 
+        return self.parse_salesfile(stream, file_ext, uuid["uuid"].values[0], file_name=file_id)
+
+    def parse_salesfile(
+        self,
+        stream: io.BytesIO,
+        file_ext: str,
+        drive_metadata_uuid: str,
+        file_name: Optional[str] = None,
+    ) -> pd.DataFrame:
+        start = perf_counter()
         if file_ext == "csv":
             stream.seek(0)
-            df = pd.read_csv(stream)
+            df = pd.read_csv(stream, **dtype_backend_kwargs(self.dtype_backend))
         elif file_ext == "xlsx":
-            df = pd.read_excel(stream)
+            df = parse_xlsx(stream.getvalue(), self.dtype_backend)
+
+        logging.info(
+            f"Parsed {file_name or drive_metadata_uuid} ({file_ext}, {df.shape[0]} rows) "
+            f"in {perf_counter() - start:.2f}s"
+        )
 
         if "drive_metadata_uuid" in df.columns:
             logging.info(
@@ -564,7 +1155,7 @@ class PostgresExporter:
             )
             df = df.drop(columns=["drive_metadata_uuid"])
 
-        df["drive_metadata_uuid"] = uuid["uuid"].values[0]
+        df["drive_metadata_uuid"] = drive_metadata_uuid
 
         return df
 
@@ -622,21 +1213,43 @@ class PostgresExporter:
         with self.engine.begin() as connection:
             connection.execute(text(qry))
 
+    def sync_franchise_data(self, gdrive: GoogleDrive, file_id: str) -> set:
+        """
+        Returns the franchise domains, re-merging the FRANCHISE Master List into
+        city_search_franchises only when its drive modifiedTime has changed.
+        """
+        modified_time = gdrive.get_file_modified_time(file_id)
+        cached = _franchise_cache.get(file_id)
+        if cached and cached[0] == modified_time:
+            logging.info("Franchise data unchanged, using cached domains")
+            return cached[1]
+
+        state = self.get_sync_state("franchise_master_list") or {}
+        if state.get("modified_time") == modified_time:
+            logging.info("Franchise data unchanged, loading domains from database")
+            domains = pd.read_sql(
+                "SELECT domain_name FROM sales_leads.city_search_franchises", self.engine
+            )["domain_name"]
+        else:
+            logging.info("Franchise data changed, upserting franchise data")
+            franchise_df = gdrive.get_franchise_data(file_id=file_id)
+            self.upsert_franchise_data(
+                dataframe=franchise_df, temp_table_name="temp_franchise_data"
+            )
+            domains = franchise_df["domain_name"]
+            self.set_sync_state("franchise_master_list", modified_time, None)
+
+        franchise_domains = {normalize_domain(domain) for domain in domains.dropna()}
+        _franchise_cache[file_id] = (modified_time, franchise_domains)
+        return franchise_domains
+
     def post_city_search_slack_message(
         self, link: str, spread_sheet_name: str, owner: Optional[str] = "U03K3H773RB"
     ):
         message = f"""Hi <@{owner}>, <{link}|City Search - {spread_sheet_name} is ready to be dispersed.>"""
 
-        # Replace notifier with requests
-        response = requests.post(
-            os.environ.get("SLACK_WEBHOOK"),
-            json={"text": message}
-        )
-        
-        if response.status_code == 200:
+        if get_notifier(os.environ.get("SLACK_WEBHOOK")).post({"text": message}):
             logging.info("City search slack notification sent successfully")
-        else:
-            logging.error(f"Failed to send city search notification: {response.status_code}")
 
     def get_missing_file_types(self, gdrive: GoogleDrive) -> pd.DataFrame:
         missing_files = pd.read_sql(
@@ -699,15 +1312,34 @@ class PostgresExporter:
         with self.engine.begin() as connection:
             connection.execute(text(update_query))
 
-    def update_file_has_been_processed(self, file_id: str) -> None:
+    def update_file_has_been_processed(self, file_id: str, connection=None) -> None:
         query = f"""
                 UPDATE sales_leads.drive_metadata
                 SET has_been_processed = True
                 WHERE id = '{file_id}'
                 """
-        with self.engine.begin() as connection:
+        with self._begin(connection) as connection:
             connection.execute(text(query))
 
+    def update_files_have_been_processed(self, file_ids: list, connection=None) -> None:
+        query = f"""
+                UPDATE sales_leads.drive_metadata
+                SET has_been_processed = True
+                WHERE id IN ({', '.join(f"'{file_id}'" for file_id in file_ids)})
+                """
+        with self._begin(connection) as connection:
+            connection.execute(text(query))
+
+    def get_processed_file_ids(self, file_ids: list) -> set:
+        with self.engine.connect() as connection:
+            query = f"""
+            SELECT id
+            FROM sales_leads.drive_metadata
+            WHERE id IN ({', '.join(f"'{file_id}'" for file_id in file_ids)})
+            AND has_been_processed = True
+            """
+            return {row[0] for row in connection.execute(text(query)).fetchall()}
+
     def check_if_file_has_been_processed(self, file_id: str) -> bool:
         with self.engine.connect() as connection:
             query = f"""
@@ -734,31 +1366,290 @@ class PostgresExporter:
             """
             return [c[0] for c in connection.execute(text(query)).fetchall()]
 
+    def enqueue_outbox_event(
+        self, event_type: str, payload: dict, connection=None
+    ) -> None:
+        """
+        Records a side effect (sheet write, slack post) to be performed
+        by the outbox drain once the caller's transaction commits.
+        """
+        qry = """
+        INSERT INTO sales_leads.outbox (event_type, payload, created_at)
+        VALUES (:event_type, CAST(:payload AS jsonb), CURRENT_TIMESTAMP)
+        """
+
+        with self._begin(connection) as connection:
+            connection.execute(
+                text(qry),
+                {"event_type": event_type, "payload": json.dumps(payload, default=str)},
+            )
+
+    def claim_outbox_events(
+        self, batch_size: int = 50, max_attempts: int = 5, lock_timeout_minutes: int = 15
+    ) -> pd.DataFrame:
+        """
+        Marks the next batch of pending events as processing and returns them.
+        Events stuck in processing (a drain that died) are picked up again
+        after `lock_timeout_minutes`, or marked failed if that was their
+        last attempt.
+        """
+        qry = self.claim_outbox_events_query(batch_size, max_attempts, lock_timeout_minutes)
+
+        with self.engine.begin() as connection:
+            expired = connection.execute(
+                text(self.expire_outbox_events_query(max_attempts, lock_timeout_minutes))
+            ).mappings().all()
+            for event in expired:
+                logging.error(
+                    f"Outbox event {event['uuid']} ({event['event_type']}) failed, "
+                    f"its last attempt never finished"
+                )
+            events = pd.DataFrame(connection.execute(text(qry)).mappings().all())
+
+        return events.sort_values("created_at") if not events.empty else events
+
+    def claim_outbox_events_query(
+        self, batch_size: int = 50, max_attempts: int = 5, lock_timeout_minutes: int = 15
+    ) -> str:
+        return f"""
+        WITH next_events AS (
+            SELECT uuid
+            FROM sales_leads.outbox
+            WHERE (status = 'pending'
+               OR (status = 'processing' AND locked_at < CURRENT_TIMESTAMP - INTERVAL '{lock_timeout_minutes} minutes'))
+            AND attempts < {max_attempts}
+            ORDER BY created_at
+            LIMIT {batch_size}
+            FOR UPDATE SKIP LOCKED
+        )
+        UPDATE sales_leads.outbox o
+        SET status = 'processing'
+          , attempts = o.attempts + 1
+          , locked_at = CURRENT_TIMESTAMP
+        FROM next_events n
+        WHERE o.uuid = n.uuid
+        RETURNING o.uuid, o.event_type, o.payload, o.attempts, o.created_at
+        """
+
+    def expire_outbox_events_query(self, max_attempts: int = 5, lock_timeout_minutes: int = 15) -> str:
+        return f"""
+        UPDATE sales_leads.outbox
+        SET status = 'failed'
+          , last_error = 'lease expired on the last attempt'
+        WHERE status = 'processing'
+        AND locked_at < CURRENT_TIMESTAMP - INTERVAL '{lock_timeout_minutes} minutes'
+        AND attempts >= {max_attempts}
+        RETURNING uuid, event_type
+        """
+
+    def get_unwritten_sheet_events(self, drive_metadata_uuids: list) -> pd.DataFrame:
+        """The files of `drive_metadata_uuids` whose google_sheet events aren't
+        done yet, and whether one of them failed for good."""
+        if not drive_metadata_uuids:
+            return pd.DataFrame(columns=["drive_metadata_uuid", "failed"])
+        return pd.read_sql(self.unwritten_sheet_events_query(drive_metadata_uuids), self.engine)
+
+    def unwritten_sheet_events_query(self, drive_metadata_uuids: list) -> str:
+        return f"""
+        SELECT payload->>'drive_metadata_uuid' AS drive_metadata_uuid
+             , bool_or(status = 'failed')     AS failed
+        FROM sales_leads.outbox
+        WHERE status IN ('pending', 'processing', 'failed')
+        AND event_type = 'google_sheet'
+        AND payload->>'drive_metadata_uuid' IN ({', '.join(f"'{uuid}'" for uuid in drive_metadata_uuids)})
+        GROUP BY 1
+        """
+
+    def release_outbox_event(self, uuid: str) -> None:
+        """Puts a claimed event back as pending without using up an attempt."""
+        qry = f"""
+        UPDATE sales_leads.outbox
+        SET status = 'pending'
+          , attempts = attempts - 1
+          , locked_at = NULL
+        WHERE uuid = '{uuid}'
+        """
+
+        with self.engine.begin() as connection:
+            connection.execute(text(qry))
+
+    def complete_outbox_event(self, uuid: str) -> None:
+        qry = f"""
+        UPDATE sales_leads.outbox
+        SET status = 'done'
+          , processed_at = CURRENT_TIMESTAMP
+          , last_error = NULL
+        WHERE uuid = '{uuid}'
+        """
+
+        with self.engine.begin() as connection:
+            connection.execute(text(qry))
+
+    def fail_outbox_event(self, uuid: str, error: str, max_attempts: int = 5) -> None:
+        qry = f"""
+        UPDATE sales_leads.outbox
+        SET status = (CASE WHEN attempts >= {max_attempts} THEN 'failed' ELSE 'pending' END)::outbox_status_enum
+          , last_error = :error
+        WHERE uuid = '{uuid}'
+        """
+
+        with self.engine.begin() as connection:
+            connection.execute(text(qry), {"error": error})
+
 
 @dataclass
 class AzureBlobStorage:
     connection_string: str
     blob_service_client: BlobServiceClient = None
+    ingest_queue_name: Optional[str] = None
+    queue_client: "QueueClient" = None
 
     def __post_init__(self):
         self.blob_service_client = BlobServiceClient.from_connection_string(
             self.connection_string
         )
+        if self.ingest_queue_name:
+            if QueueClient is None:
+                raise ImportError("azure-storage-queue is required for queue ingestion")
+            # the functions queue trigger expects base64 message bodies
+            self.queue_client = QueueClient.from_connection_string(
+                self.connection_string,
+                self.ingest_queue_name,
+                message_encode_policy=TextBase64EncodePolicy(),
+                message_decode_policy=TextBase64DecodePolicy(),
+            )
+            try:
+                self.queue_client.create_queue()
+            except ResourceExistsError:
+                pass
 
+    @instrumented()
     def upload_dataframe(
-        self, dataframe, container_name, blob_name, file_id: Optional[str] = None
+        self,
+        dataframe,
+        container_name,
+        blob_name,
+        file_id: Optional[str] = None,
+        file_format: Optional[str] = "csv",
     ):
         blob_client = self.blob_service_client.get_blob_client(
             container_name, blob_name
         )
+        data = self.serialize_dataframe(dataframe, file_format)
+        record(rows=dataframe.shape[0], bytes=len(data), blob_name=blob_name)
+
         blob_client.upload_blob(
-            dataframe.to_csv(index=False), blob_type=BlobType.BlockBlob, overwrite=True
+            data, blob_type=BlobType.BlockBlob, overwrite=True
         )
         logging.info(f"Uploaded {blob_name} to {container_name}")
+        count_api_calls()
 
         if file_id:
             metadata = {"file_id": file_id}
             blob_client.set_blob_metadata(metadata)
+            count_api_calls()
+            self.enqueue_salesfile(container_name, blob_name, file_id, rows=dataframe.shape[0])
+
+    def enqueue_salesfile(
+        self, container_name: str, blob_name: str, file_id: str, rows: Optional[int] = None
+    ) -> None:
+        """Announces an uploaded salesfile on the ingest queue, with everything the
+        consumer needs so it doesn't have to read the blob properties back."""
+        if self.queue_client is None or container_name not in QUEUED_CONTAINERS:
+            return None
+        message = {"blob_name": f"{container_name}/{blob_name}", "file_id": file_id, "rows": rows}
+        self.queue_client.send_message(json.dumps(message))
+        count_api_calls()
+        logging.info(f"Queued {blob_name} on {self.ingest_queue_name}")
+
+    def receive_salesfile_messages(self, max_messages: int, visibility_timeout: int = 600) -> list:
+        """Up to `max_messages` ingest messages, hidden from other readers for
+        `visibility_timeout` seconds. Messages that aren't deleted come back."""
+        messages = self.queue_client.receive_messages(
+            messages_per_page=min(max_messages, 32),
+            visibility_timeout=visibility_timeout,
+            max_messages=max_messages,
+        )
+        messages = list(messages)
+        count_api_calls()
+        return messages
+
+    def delete_salesfile_message(self, message) -> None:
+        self.queue_client.delete_message(message)
+        count_api_calls()
+
+    def poison_salesfile_message(self, message) -> None:
+        """Moves the message to <queue>-poison, as the functions host does after maxDequeueCount."""
+        poison = QueueClient.from_connection_string(
+            self.connection_string,
+            f"{self.ingest_queue_name}-poison",
+            message_encode_policy=TextBase64EncodePolicy(),
+        )
+        try:
+            poison.create_queue()
+        except ResourceExistsError:
+            pass
+        poison.send_message(message.content)
+        self.delete_salesfile_message(message)
+        logging.error(f"Moved {message.content} to {self.ingest_queue_name}-poison")
+
+    def serialize_dataframe(self, dataframe: pd.DataFrame, file_format: str = "csv"):
+        if file_format == "parquet":
+            return self.dataframe_to_parquet(dataframe)
+        return dataframe.to_csv(index=False)
+
+    def stash_salesfile(self, file_id: str, dataframe: pd.DataFrame) -> None:
+        """Keeps the parsed file so a resumed run doesn't download and parse it
+        again. Without pyarrow nothing is kept and the resume starts over."""
+        if pq is None:
+            return None
+        container_client = self.blob_service_client.get_container_client(RESUME_CONTAINER)
+        try:
+            container_client.create_container()
+        except ResourceExistsError:
+            pass
+        container_client.upload_blob(
+            f"{file_id}.parquet", self.dataframe_to_parquet(dataframe), overwrite=True
+        )
+        count_api_calls()
+        logging.info(f"Stashed {file_id} in {RESUME_CONTAINER}")
+
+    def read_stashed_salesfile(self, file_id: str) -> Optional[pd.DataFrame]:
+        """The frame stash_salesfile kept for the file, None if there is none."""
+        if pq is None:
+            return None
+        blob_client = self.blob_service_client.get_blob_client(RESUME_CONTAINER, f"{file_id}.parquet")
+        try:
+            data = blob_client.download_blob().readall()
+        except ResourceNotFoundError:
+            return None
+        finally:
+            count_api_calls()
+        return self.read_salesfile(data, blob_name=f"{file_id}.parquet")
+
+    def delete_stashed_salesfile(self, file_id: str) -> None:
+        blob_client = self.blob_service_client.get_blob_client(RESUME_CONTAINER, f"{file_id}.parquet")
+        try:
+            blob_client.delete_blob()
+        except ResourceNotFoundError:
+            pass
+        count_api_calls()
+
+    @staticmethod
+    def salesfile_blob_name(file_name: str, file_format: str = "csv") -> str:
+        if file_format == "parquet":
+            return f"{file_name}.parquet"
+        return file_name.replace("xlsx", "csv")
+
+    def retrigger_blob(self, container_name: str, blob_name: str) -> None:
+        """Rewrites the blob with its own content and metadata so its blob trigger runs again."""
+        blob_client = self.blob_service_client.get_blob_client(container_name, blob_name)
+        metadata = blob_client.get_blob_properties().metadata
+        data = blob_client.download_blob().readall()
+        blob_client.upload_blob(
+            data, blob_type=BlobType.BlockBlob, overwrite=True, metadata=metadata
+        )
+        logging.info(f"Re-uploaded {blob_name} to {container_name}")
 
     def get_blob_metadata(self, container_name, blob_name):
         blob_client = self.blob_service_client.get_blob_client(
@@ -766,6 +1657,45 @@ class AzureBlobStorage:
         )
         return blob_client.get_blob_properties()
 
+    def dataframe_to_parquet(self, dataframe: pd.DataFrame) -> bytes:
+        """Parquet bytes with the column types embedded in the schema.
+        Mixed type columns (common in xlsx drops) are stored as strings."""
+        if pq is None:
+            raise ImportError("pyarrow is required for parquet salesfiles")
+
+        dataframe = dataframe.copy()
+        for col in dataframe.columns[dataframe.dtypes == object]:
+            dataframe[col] = dataframe[col].astype("string")
+
+        buffer = io.BytesIO()
+        dataframe.to_parquet(buffer, engine="pyarrow", index=False, compression="zstd")
+        return buffer.getvalue()
+
+    def read_salesfile(
+        self,
+        data: bytes,
+        blob_name: str,
+        usecols: Optional[Callable[[str], bool]] = None,
+        dtype_backend: Optional[str] = None,
+    ) -> pd.DataFrame:
+        """Reads a salesfiles blob in either format, only the columns `usecols` keeps.
+        On the default backend nulls come back as NaN like read_csv, which
+        insert_raw_data relies on."""
+        if blob_name.endswith(".parquet"):
+            if pq is None:
+                raise ImportError("pyarrow is required for parquet salesfiles")
+            names = pq.read_schema(pa.BufferReader(data)).names
+            columns = [name for name in names if usecols(name)] if usecols else None
+            table = pq.read_table(pa.BufferReader(data), columns=columns)
+            if dtype_backend == "pyarrow":
+                return table.to_pandas(types_mapper=pd.ArrowDtype)
+            df = table.to_pandas(ignore_metadata=True)
+            return df.where(df.notna(), np.nan)
+
+        return pd.read_csv(
+            io.BytesIO(data), usecols=usecols, **dtype_backend_kwargs(dtype_backend)
+        )
+
     def split_and_return_blob_name(self, blob_name: str) -> str:
         return blob_name.split("/")[-1]
 
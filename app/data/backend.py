@@ -0,0 +1,13 @@
+import os
+from typing import Optional
+
+
+def default_dtype_backend() -> Optional[str]:
+    """PIPELINE_DTYPE_BACKEND=pyarrow switches the pipeline to arrow backed frames
+    and COPY loads, unset keeps the object dtype path."""
+    return os.environ.get("PIPELINE_DTYPE_BACKEND") or None
+
+
+def dtype_backend_kwargs(dtype_backend: Optional[str]) -> dict:
+    """pandas readers reject dtype_backend=None, so only pass it when set."""
+    return {"dtype_backend": dtype_backend} if dtype_backend else {}
@@ -0,0 +1,107 @@
+from dataclasses import dataclass, field
+from time import monotonic
+from typing import Iterable, Optional
+import logging
+
+import numpy as np
+import pandas as pd
+
+
+def hash_emails(emails: Iterable[str]) -> np.ndarray:
+    """64 bit hashes of the email strings, sorted and de-duplicated."""
+    emails = pd.Series(list(emails), dtype=object).dropna()
+    hashes = pd.util.hash_pandas_object(emails, index=False).to_numpy(dtype=np.uint64)
+    return np.unique(hashes)
+
+
+@dataclass
+class TrackedEmailFilter:
+    """In-process membership set of emails already tracked or known Shopify customers.
+
+    Emails are kept as a sorted array of 64 bit hashes (8 bytes per email)
+    and looked up with a binary search. A hit can only be wrong on a hash
+    collision, so the filter is safe for deciding a lead frame has nothing
+    new. Emails are compared exactly as stored, matching the joins in
+    get_new_zi_search_lead_data.
+    """
+
+    engine: str = None
+    refresh_seconds: int = 300
+    shopify_refresh_seconds: int = 3600
+    hashes: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=np.uint64))
+    tracking_loaded_until: Optional[pd.Timestamp] = None
+    refreshed_at: float = 0.0
+    shopify_refreshed_at: float = 0.0
+
+    @classmethod
+    def from_emails(cls, emails: Iterable[str]) -> "TrackedEmailFilter":
+        email_filter = cls()
+        email_filter.add(emails)
+        return email_filter
+
+    def add(self, emails: Iterable[str]) -> None:
+        self.hashes = np.union1d(self.hashes, hash_emails(emails))
+
+    def contains(self, emails: pd.Series) -> np.ndarray:
+        hashes = pd.util.hash_pandas_object(
+            emails.astype(object), index=False
+        ).to_numpy(dtype=np.uint64)
+        positions = np.searchsorted(self.hashes, hashes)
+        positions[positions == len(self.hashes)] = 0
+        return (self.hashes.size > 0) & (self.hashes[positions] == hashes)
+
+    def prefilter(
+        self, dataframe: pd.DataFrame, email_column: Optional[str] = "email_address"
+    ) -> pd.DataFrame:
+        """Rows that may still be new leads (email present and not seen before).
+        A drop without the email column has none, every lead needs an email."""
+        if email_column not in dataframe.columns:
+            return dataframe.iloc[0:0]
+        self.refresh()
+        emails = dataframe[email_column]
+        has_email = emails.notna() & ~emails.astype(str).isin(["", "nan"])
+        return dataframe[has_email.values & ~self.contains(emails)]
+
+    @property
+    def memory_bytes(self) -> int:
+        return self.hashes.nbytes
+
+    def refresh(self, force: Optional[bool] = False) -> None:
+        """Pulls tracking rows created since the last load, and the shopify view less often."""
+        if self.engine is None:
+            return None
+
+        now = monotonic()
+        if not force and now - self.refreshed_at < self.refresh_seconds:
+            return None
+
+        query = "SELECT email_address, created_at FROM sales_leads.tracking"
+        if self.tracking_loaded_until is not None:
+            query += f" WHERE created_at > '{self.tracking_loaded_until}'"
+        tracking = pd.read_sql(query, self.engine)
+        if not tracking.empty:
+            self.add(tracking["email_address"])
+            self.tracking_loaded_until = tracking["created_at"].max()
+
+        if force or now - self.shopify_refreshed_at >= self.shopify_refresh_seconds:
+            shopify = pd.read_sql(
+                "SELECT email FROM dm_shopify.sales_customer_view", self.engine
+            )
+            self.add(shopify["email"])
+            self.shopify_refreshed_at = now
+
+        self.refreshed_at = now
+        logging.info(
+            f"Tracked email filter holds {self.hashes.size} emails ({self.memory_bytes} bytes)"
+        )
+
+
+_tracked_email_filters = {}
+
+
+def get_tracked_email_filter(engine) -> TrackedEmailFilter:
+    """One filter per database for the life of the worker."""
+    key = str(engine.url)
+    if key not in _tracked_email_filters:
+        _tracked_email_filters[key] = TrackedEmailFilter(engine=engine)
+    return _tracked_email_filters[key]
@@ -0,0 +1,135 @@
+from dataclasses import dataclass
+from datetime import date, datetime
+from numbers import Number
+from typing import Any, Iterable, List, Optional
+import hashlib
+import math
+import re
+
+import pandas as pd
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+
+def fingerprint_rows(dataframe: pd.DataFrame) -> pd.Series:
+    """sha1 of each row's values, stable across runs and pandas versions."""
+    values = dataframe.astype(object).where(dataframe.notna(), "").astype(str)
+    return pd.Series(
+        [
+            hashlib.sha1("\x1f".join(row).encode()).hexdigest()
+            for row in values.itertuples(index=False, name=None)
+        ],
+        index=dataframe.index,
+    )
+
+
+SHEETS_EPOCH = datetime(1899, 12, 30)
+ISO_DATETIME = re.compile(r"^\d{4}-\d{2}-\d{2}([ T]\d{2}:\d{2}(:\d{2}(\.\d+)?)?)?$")
+
+
+def sheet_cell(value: Any) -> str:
+    """A cell as the sheet stores it, the same whether it comes from a dataframe
+    or from a FORMULA read-back. Sheets parses USER_ENTERED numbers and dates,
+    so 1234, 1234.0 and "1234" are all 1234, and dates are serial numbers."""
+    if value is None or (not isinstance(value, (str, list)) and pd.isna(value)):
+        return ""
+    if isinstance(value, bool):
+        return str(value).upper()
+    if isinstance(value, str):
+        value = value.strip()
+        if value.upper() in ("TRUE", "FALSE"):
+            return value.upper()
+        if ISO_DATETIME.match(value):
+            value = pd.Timestamp(value)
+        else:
+            try:
+                value = float(value)
+            except ValueError:
+                return value
+    if isinstance(value, (datetime, date)) and not getattr(value, "tzinfo", None):
+        value = (pd.Timestamp(value) - SHEETS_EPOCH) / pd.Timedelta(days=1)
+    if isinstance(value, Number):
+        value = round(float(value), 9)
+        if not math.isfinite(value):
+            return str(value)
+        return str(int(value)) if value.is_integer() else repr(value)
+    return str(value)
+
+
+def sheet_values_to_frame(values: List[list], columns: Iterable[str]) -> pd.DataFrame:
+    """The data rows of a sheet read back from the api, header first, in the
+    order of `columns`. The api drops trailing blank cells, so rows are padded."""
+    if not values:
+        return pd.DataFrame(columns=list(columns))
+    header = values[0]
+    rows = [row + [""] * (len(header) - len(row)) for row in values[1:]]
+    frame = pd.DataFrame([row[: len(header)] for row in rows], columns=header)
+    return frame.reindex(columns=list(columns), fill_value="")
+
+
+@dataclass
+class SheetFingerprintIndex:
+    """Rows already written to each worksheet, keyed by spreadsheet and sheet id."""
+
+    engine: Optional[Engine] = None
+
+    def fingerprint_rows(self, dataframe: pd.DataFrame) -> pd.Series:
+        """Fingerprints of the rows as the sheet stores them, see sheet_cell()."""
+        return fingerprint_rows(dataframe.astype(object).apply(lambda column: column.map(sheet_cell)))
+
+    def get(self, spreadsheet_id: str, worksheet_id: str) -> set:
+        query = """
+        SELECT fingerprint
+        FROM sales_leads.sheet_row_fingerprints
+        WHERE spreadsheet_id = :spreadsheet_id
+        AND worksheet_id = :worksheet_id
+        """
+        with self.engine.connect() as connection:
+            rows = connection.execute(
+                text(query),
+                {"spreadsheet_id": spreadsheet_id, "worksheet_id": str(worksheet_id)},
+            )
+            return {row[0] for row in rows}
+
+    def add(self, spreadsheet_id: str, worksheet_id: str, fingerprints: Iterable[str]) -> None:
+        params = [
+            {
+                "spreadsheet_id": spreadsheet_id,
+                "worksheet_id": str(worksheet_id),
+                "fingerprint": fingerprint,
+            }
+            for fingerprint in set(fingerprints)
+        ]
+        if not params:
+            return None
+
+        query = """
+        INSERT INTO sales_leads.sheet_row_fingerprints
+        (spreadsheet_id, worksheet_id, fingerprint, created_at)
+        VALUES (:spreadsheet_id, :worksheet_id, :fingerprint, CURRENT_TIMESTAMP)
+        ON CONFLICT DO NOTHING
+        """
+        with self.engine.begin() as connection:
+            connection.execute(text(query), params)
+
+    def seed(
+        self, spreadsheet_id: str, worksheet_id: str, values: List[list], columns: Iterable[str]
+    ) -> set:
+        """Records the rows already on a sheet that has no fingerprints yet, e.g.
+        written before the index existed, and returns their fingerprints.
+        `values` should be read with the FORMULA render option, as written."""
+        fingerprints = set(self.fingerprint_rows(sheet_values_to_frame(values, columns)))
+        self.add(spreadsheet_id, worksheet_id, fingerprints)
+        return fingerprints
+
+    def clear(self, spreadsheet_id: str, worksheet_id: str) -> None:
+        query = """
+        DELETE FROM sales_leads.sheet_row_fingerprints
+        WHERE spreadsheet_id = :spreadsheet_id
+        AND worksheet_id = :worksheet_id
+        """
+        with self.engine.begin() as connection:
+            connection.execute(
+                text(query),
+                {"spreadsheet_id": spreadsheet_id, "worksheet_id": str(worksheet_id)},
+            )
@@ -0,0 +1,179 @@
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator, Iterator, Optional
+import asyncio
+
+import pandas as pd
+from sqlalchemy import text
+
+from ..instrumentation import StageMetrics, instrument
+
+
+@dataclass
+class ProcessingLedger:
+    """
+    One row per file per stage run in sales_leads.file_processing_ledger,
+    with start and finish times, rows, bytes, api calls and the error if
+    it failed. A row with no finished_at is a stage still running, or one
+    whose worker died.
+    """
+
+    engine: str = None
+    stuck_after_minutes: int = 30
+
+    @contextmanager
+    def stage(
+        self, file_id: str, stage: str, source: str, blob_name: Optional[str] = None
+    ) -> Iterator[StageMetrics]:
+        """Ledgers the block as `stage`. What inner stages record() is totalled on it.
+        Without an engine the stage is only instrumented."""
+        if self.engine is None:
+            with instrument(stage, collect=True, file_id=file_id, source=source) as metrics:
+                yield metrics
+            return
+
+        uuid = self.start(file_id, stage, source, blob_name)
+        error = None
+        try:
+            with instrument(stage, collect=True, file_id=file_id, source=source) as metrics:
+                yield metrics
+        except Exception as e:
+            error = repr(e)
+            raise
+        finally:
+            self.finish(uuid, metrics, error)
+
+    @asynccontextmanager
+    async def astage(
+        self, file_id: str, stage: str, source: str, blob_name: Optional[str] = None
+    ) -> AsyncIterator[StageMetrics]:
+        """stage() for the event loop, the ledger writes run in a worker thread."""
+        if self.engine is None:
+            with instrument(stage, collect=True, file_id=file_id, source=source) as metrics:
+                yield metrics
+            return
+
+        uuid = await asyncio.to_thread(self.start, file_id, stage, source, blob_name)
+        error = None
+        try:
+            with instrument(stage, collect=True, file_id=file_id, source=source) as metrics:
+                yield metrics
+        except Exception as e:
+            error = repr(e)
+            raise
+        finally:
+            await asyncio.to_thread(self.finish, uuid, metrics, error)
+
+    def start(self, file_id: str, stage: str, source: str, blob_name: Optional[str] = None) -> str:
+        query = """
+        INSERT INTO sales_leads.file_processing_ledger
+        (file_id, source, stage, blob_name, started_at)
+        VALUES (:file_id, :source, :stage, :blob_name, CURRENT_TIMESTAMP)
+        RETURNING uuid
+        """
+        # own transaction, so the row survives a rollback of the work it records.
+        with self.engine.begin() as connection:
+            return connection.execute(
+                text(query),
+                {"file_id": file_id, "source": source, "stage": stage, "blob_name": blob_name},
+            ).scalar_one()
+
+    def finish(self, uuid: str, metrics: StageMetrics, error: Optional[str] = None) -> None:
+        query = """
+        UPDATE sales_leads.file_processing_ledger
+        SET finished_at = CURRENT_TIMESTAMP
+          , rows = :rows
+          , bytes = :bytes
+          , api_calls = :api_calls
+          , error = :error
+        WHERE uuid = :uuid
+        """
+        with self.engine.begin() as connection:
+            connection.execute(
+                text(query),
+                {
+                    "uuid": uuid,
+                    "rows": metrics.rows,
+                    "bytes": metrics.bytes,
+                    "api_calls": metrics.api_calls,
+                    "error": error,
+                },
+            )
+
+    def failed_files(self, source: str, max_attempts: int = 3) -> pd.DataFrame:
+        """
+        Files whose latest stage run for `source` failed or got stuck, with the
+        stage to resume from. A file that later ran a stage successfully is
+        not returned, nor one that has failed or got stuck `max_attempts` times.
+        """
+        return pd.read_sql(self.failed_files_query(source, max_attempts), self.engine)
+
+    def failed_files_query(self, source: str, max_attempts: int = 3) -> str:
+        return f"""
+        WITH attempts AS (
+            SELECT l.file_id
+                 , COUNT(*) AS attempts
+            FROM sales_leads.file_processing_ledger l
+            WHERE l.source = '{source}'
+            AND (l.error IS NOT NULL OR {self._stuck_filter("l")})
+            GROUP BY l.file_id
+        ),
+        latest AS (
+            SELECT DISTINCT ON (l.file_id)
+                   l.file_id
+                 , l.stage
+                 , l.blob_name
+                 , l.error
+                 , l.finished_at
+                 , l.started_at
+            FROM sales_leads.file_processing_ledger l
+            WHERE l.source = '{source}'
+            ORDER BY l.file_id, l.started_at DESC
+        )
+        SELECT l.file_id AS id
+             , d.name
+             , l.stage
+             , l.blob_name
+             , COALESCE(l.error, 'stuck') AS error
+             , COALESCE(a.attempts, 0)    AS attempts
+        FROM latest l
+        CROSS JOIN LATERAL (
+            SELECT name FROM sales_leads.drive_metadata WHERE id = l.file_id LIMIT 1
+        ) d
+        LEFT JOIN attempts a
+            ON a.file_id = l.file_id
+        WHERE (l.error IS NOT NULL OR {self._stuck_filter("l")})
+        AND COALESCE(a.attempts, 0) < {int(max_attempts)}
+        """
+
+    def _stuck_filter(self, alias: str) -> str:
+        """A run with no finish that started over `stuck_after_minutes` ago, its worker died."""
+        return f"""({alias}.finished_at IS NULL
+               AND {alias}.started_at < CURRENT_TIMESTAMP - INTERVAL '{self.stuck_after_minutes} minutes')"""
+
+    def latency_report(self, days: int = 7) -> pd.DataFrame:
+        """p50/p95 seconds per file type and stage over the last `days`, successful runs only."""
+        return pd.read_sql(self.latency_report_query(days), self.engine)
+
+    def latency_report_query(self, days: int = 7) -> str:
+        return f"""
+        SELECT COALESCE(d.fileextension, 'unknown')                                  AS file_type
+             , l.source
+             , l.stage
+             , COUNT(*)                                                              AS runs
+             , PERCENTILE_CONT(0.5) WITHIN GROUP (
+                   ORDER BY EXTRACT(EPOCH FROM l.finished_at - l.started_at))        AS p50_seconds
+             , PERCENTILE_CONT(0.95) WITHIN GROUP (
+                   ORDER BY EXTRACT(EPOCH FROM l.finished_at - l.started_at))        AS p95_seconds
+             , SUM(l.rows) / NULLIF(SUM(EXTRACT(EPOCH FROM l.finished_at - l.started_at)), 0)
+                                                                                     AS rows_per_second
+        FROM sales_leads.file_processing_ledger l
+        LEFT JOIN LATERAL (
+            SELECT fileextension FROM sales_leads.drive_metadata WHERE id = l.file_id LIMIT 1
+        ) d ON TRUE
+        WHERE l.finished_at IS NOT NULL
+        AND l.error IS NULL
+        AND l.started_at > CURRENT_TIMESTAMP - INTERVAL '{int(days)} days'
+        GROUP BY 1, 2, 3
+        ORDER BY 1, 2, 3
+        """
@@ -0,0 +1,75 @@
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+import io
+import logging
+import multiprocessing
+import os
+
+import pandas as pd
+from pandas.io.parsers import TextParser
+
+from .backend import dtype_backend_kwargs
+
+try:
+    from python_calamine import CalamineWorkbook
+except ImportError:  # calamine is an optional faster xlsx engine
+    CalamineWorkbook = None
+
+_parse_pool: Optional[ProcessPoolExecutor] = None
+
+
+def xlsx_engine() -> str:
+    """XLSX_ENGINE=openpyxl|calamine, by default calamine when it is installed."""
+    engine = os.environ.get("XLSX_ENGINE")
+    if engine:
+        return engine
+    return "calamine" if CalamineWorkbook is not None else "openpyxl"
+
+
+def convert_calamine_cell(cell):
+    # same conversions as pandas' openpyxl reader, so both engines give the same frame.
+    if isinstance(cell, float) and cell.is_integer():
+        return int(cell)
+    return cell
+
+
+def read_xlsx(data: bytes, dtype_backend: Optional[str] = None) -> pd.DataFrame:
+    """First sheet of the workbook, header on the first row."""
+    if xlsx_engine() != "calamine":
+        return pd.read_excel(io.BytesIO(data), **dtype_backend_kwargs(dtype_backend))
+
+    sheet = CalamineWorkbook.from_filelike(io.BytesIO(data)).get_sheet_by_index(0)
+    rows = [
+        [convert_calamine_cell(cell) for cell in row]
+        for row in sheet.to_python(skip_empty_area=True)
+    ]
+    if not rows:
+        return pd.DataFrame()
+    return TextParser(rows, header=0, **dtype_backend_kwargs(dtype_backend)).read()
+
+
+def get_parse_pool() -> ProcessPoolExecutor:
+    """One pool per worker process. spawn rather than fork, the callers run in threads."""
+    global _parse_pool
+    if _parse_pool is None:
+        _parse_pool = ProcessPoolExecutor(
+            max_workers=int(os.environ.get("XLSX_PARSE_PROCESSES", os.cpu_count() or 1)),
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _parse_pool
+
+
+def parse_xlsx(data: bytes, dtype_backend: Optional[str] = None) -> pd.DataFrame:
+    """
+    Workbooks over XLSX_POOL_MIN_BYTES (1 MiB by default) are decoded in the
+    process pool, so several can be parsed at once and the caller's thread
+    only waits. Smaller ones are not worth the pickling.
+    """
+    if len(data) < int(os.environ.get("XLSX_POOL_MIN_BYTES", 1024**2)):
+        return read_xlsx(data, dtype_backend)
+
+    try:
+        return get_parse_pool().submit(read_xlsx, data, dtype_backend).result()
+    except RuntimeError as e:  # the pool can't be used, e.g. during interpreter shutdown
+        logging.warning(f"Parsing xlsx in process, pool unavailable: {e}")
+        return read_xlsx(data, dtype_backend)
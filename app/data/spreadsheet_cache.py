@@ -0,0 +1,85 @@
+from dataclasses import dataclass, field
+from time import monotonic
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import text
+
+# services are created per invocation, keep the entries for the whole worker.
+_entries: Dict[Tuple[str, str], Tuple[str, float]] = {}
+
+
+@dataclass
+class SpreadsheetIdCache:
+    """Spreadsheet name + folder -> spreadsheet id.
+
+    Lookups hit an in-process dict first (entries live for `ttl_seconds`)
+    and fall back to sales_leads.spreadsheet_ids, so a new worker doesn't
+    have to search drive for spreadsheets that already exist.
+    """
+
+    engine: str = None
+    ttl_seconds: int = 3600
+    entries: Dict[Tuple[str, str], Tuple[str, float]] = field(default_factory=lambda: _entries)
+
+    def get(self, spreadsheet_name: str, folder_id: Optional[str] = None) -> Optional[str]:
+        key = (spreadsheet_name, folder_id or "")
+        if key in self.entries:
+            spreadsheet_id, expires_at = self.entries[key]
+            if expires_at > monotonic():
+                return spreadsheet_id
+            del self.entries[key]
+
+        query = """
+        SELECT spreadsheet_id
+        FROM sales_leads.spreadsheet_ids
+        WHERE spreadsheet_name = :spreadsheet_name
+        AND folder_id = :folder_id
+        """
+        with self.engine.connect() as connection:
+            row = connection.execute(
+                text(query), {"spreadsheet_name": key[0], "folder_id": key[1]}
+            ).fetchone()
+
+        if row is None:
+            return None
+
+        self.entries[key] = (row[0], monotonic() + self.ttl_seconds)
+        return row[0]
+
+    def set(
+        self, spreadsheet_name: str, folder_id: Optional[str], spreadsheet_id: str
+    ) -> None:
+        key = (spreadsheet_name, folder_id or "")
+        self.entries[key] = (spreadsheet_id, monotonic() + self.ttl_seconds)
+
+        query = """
+        INSERT INTO sales_leads.spreadsheet_ids
+        (spreadsheet_name, folder_id, spreadsheet_id, updated_at)
+        VALUES (:spreadsheet_name, :folder_id, :spreadsheet_id, CURRENT_TIMESTAMP)
+        ON CONFLICT (spreadsheet_name, folder_id) DO UPDATE
+        SET spreadsheet_id = EXCLUDED.spreadsheet_id
+          , updated_at = EXCLUDED.updated_at
+        """
+        with self.engine.begin() as connection:
+            connection.execute(
+                text(query),
+                {
+                    "spreadsheet_name": key[0],
+                    "folder_id": key[1],
+                    "spreadsheet_id": spreadsheet_id,
+                },
+            )
+
+    def invalidate(self, spreadsheet_name: str, folder_id: Optional[str] = None) -> None:
+        key = (spreadsheet_name, folder_id or "")
+        self.entries.pop(key, None)
+
+        query = """
+        DELETE FROM sales_leads.spreadsheet_ids
+        WHERE spreadsheet_name = :spreadsheet_name
+        AND folder_id = :folder_id
+        """
+        with self.engine.begin() as connection:
+            connection.execute(
+                text(query), {"spreadsheet_name": key[0], "folder_id": key[1]}
+            )
@@ -1,7 +1,12 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from contextlib import nullcontext
 import pandas as pd
-from typing import TYPE_CHECKING, Optional, Union, Dict
+from sqlalchemy import text
+from typing import TYPE_CHECKING, Iterator, Optional, Union, Dict
 import logging
+from ..google_drive.sheets import SheetWriteScheduler
+from .backend import default_dtype_backend, dtype_backend_kwargs
+from ..instrumentation import instrument, instrumented
 
 if TYPE_CHECKING:
     from ..google_drive.drive import GoogleDrive
@@ -14,6 +19,8 @@ logging.basicConfig(level=logging.INFO,
 class SalesTransformations:
     engine: str = None
     google_api: Optional["GoogleDrive"] = None
+    dtype_backend: Optional[str] = field(default_factory=default_dtype_backend)
+    read_chunksize: int = 10000
     target_schema = {
         "First Name": "first_name",
         "Last Name": "last_name",
@@ -27,9 +34,49 @@ class SalesTransformations:
         "ZI Search": "zi_search",
     }
 
-    def get_new_zi_search_lead_data(self, file_name: str) -> pd.DataFrame:
+    def stream_sql(
+        self, query: str, chunksize: Optional[int] = None, connection=None
+    ) -> Iterator[pd.DataFrame]:
+        """
+        Yields the result in frames of `chunksize` rows read from a server side
+        (named) cursor, so neither psycopg2 nor pandas hold the whole result.
+        An empty result still yields one empty frame with the columns.
+        """
+        chunksize = chunksize or self.read_chunksize
+        statement = text(query).execution_options(
+            stream_results=True, max_row_buffer=chunksize
+        )
+        with instrument("stream_sql", nested=False) as metrics, (
+            nullcontext(connection) if connection is not None else self.engine.connect()
+        ) as conn:
+            for chunk in pd.read_sql(
+                statement,
+                conn,
+                chunksize=chunksize,
+                **dtype_backend_kwargs(self.dtype_backend),
+            ):
+                metrics.add(rows=chunk.shape[0])
+                yield chunk
+
+    @instrumented()
+    def get_new_zi_search_lead_data(self, file_name: str, connection=None) -> pd.DataFrame:
         df = pd.read_sql(
-            f"""
+            self.new_zi_search_lead_query(file_name),
+            connection if connection is not None else self.engine,
+            **dtype_backend_kwargs(self.dtype_backend),
+        )
+
+        return df
+
+    def stream_new_zi_search_lead_data(
+        self, file_name: str, chunksize: Optional[int] = None, connection=None
+    ) -> Iterator[pd.DataFrame]:
+        return self.stream_sql(
+            self.new_zi_search_lead_query(file_name), chunksize=chunksize, connection=connection
+        )
+
+    def new_zi_search_lead_query(self, file_name: str) -> str:
+        return f"""
                 WITH cte_new_latest_leads AS
                     (
                         SELECT s.*
@@ -58,16 +105,85 @@ class SalesTransformations:
                 WHERE row_number = 1
                 AND d.config_file_uuid IS NOT NULL
                 AND d.name = '{file_name}'
-                """,
-            self.engine,
+                """
+
+    def stream_new_zi_search_batch_lead_data(
+        self, file_ids: list, chunksize: Optional[int] = None, connection=None
+    ) -> Iterator[pd.DataFrame]:
+        return self.stream_sql(
+            self.new_zi_search_batch_lead_query(file_ids), chunksize=chunksize, connection=connection
         )
 
-        return df
-    
+    def new_zi_search_batch_lead_query(self, file_ids: list) -> str:
+        """
+        new_zi_search_lead_query for a batch of files in one pass, ordered by
+        file. Only the emails found in the batch are ranked, an email in more
+        than one file goes to the file holding its latest lead. Leads loaded
+        together share created_at, so between those the file created last in
+        drive wins.
+        """
+        ids = ", ".join(f"'{file_id}'" for file_id in file_ids)
+        return f"""
+                WITH batch AS
+                    (
+                        SELECT uuid, name, zi_search, hubspot_owner
+                        FROM sales_leads.drive_metadata
+                        WHERE id IN ({ids})
+                        AND config_file_uuid IS NOT NULL
+                        ),
+                cte_new_latest_leads AS
+                    (
+                        SELECT s.*
+                            , ROW_NUMBER()
+                                OVER (PARTITION BY s.email_address
+                                      ORDER BY s.created_at DESC, f.created_at DESC, f.uuid) AS row_number
+                        FROM sales_leads.leads                     s
+                        INNER JOIN sales_leads.drive_metadata     f
+                            ON f.uuid = s.drive_metadata_uuid
+                        LEFT JOIN dm_shopify.sales_customer_view c
+                            ON s.email_address = c.email
+                        LEFT JOIN sales_leads.tracking           t
+                            ON t.lead_uuid = s.uuid
+                        LEFT JOIN sales_leads.tracking           t1
+                            ON t1.email_address = s.email_address
+                        WHERE
+                            c.email IS NULL -- not seen this customer before
+                        AND t.uuid IS NULL -- and not sent this record previously.
+                        AND s.email_address IS NOT NULL -- filter out blank emails.
+                        AND t1.email_address IS NULL
+                        AND s.company_country = 'United States'
+                        AND s.email_address IN (
+                            SELECT b.email_address
+                            FROM sales_leads.leads b
+                            INNER JOIN batch
+                                ON batch.uuid = b.drive_metadata_uuid
+                        )
+                        )
 
+                SELECT first_name, last_name, job_title, job_function, email_address, linkedin_contact_profile_url, company_name
+                    , COALESCE(mobile_phone, direct_phone_number) as phone_number, d.zi_search, d.hubspot_owner, d.name as file_name, l.drive_metadata_uuid
+                FROM cte_new_latest_leads l
+                INNER JOIN batch          d
+                    ON d.uuid = l.drive_metadata_uuid
+                WHERE row_number = 1
+                ORDER BY l.drive_metadata_uuid
+                """
+
+    @instrumented()
     def get_new_city_search_lead_data(self,file_id : str) -> pd.DataFrame:
-        
-        query = f"""WITH cte_new_latest_leads AS (
+        return pd.read_sql(
+            self.new_city_search_lead_query(file_id),
+            self.engine,
+            **dtype_backend_kwargs(self.dtype_backend),
+        )
+
+    def stream_new_city_search_lead_data(
+        self, file_id: str, chunksize: Optional[int] = None
+    ) -> Iterator[pd.DataFrame]:
+        return self.stream_sql(self.new_city_search_lead_query(file_id), chunksize=chunksize)
+
+    def new_city_search_lead_query(self, file_id: str) -> str:
+        return f"""WITH cte_new_latest_leads AS (
          SELECT s.*
               , ROW_NUMBER()
                 OVER (PARTITION BY COALESCE(s.main_point_of_contact_email, s.generic_contact_email) ORDER BY s.created_at DESC) AS row_number
@@ -104,8 +220,6 @@ class SalesTransformations:
                 row_number = 1
             AND d.config_file_uuid IS NOT NULL
             AND d.id =  '{file_id}' """
-            
-        return pd.read_sql(query, self.engine)
 
 
     def check_if_columns_exist_if_not_create(self, dataframe : pd.DataFrame, target_columns : list):
@@ -134,10 +248,23 @@ class SalesTransformations:
 
         return quick_mail_df
 
+    @instrumented()
     def create_google_sheet_output_for_city_search_data(
         self, file_id: str
     ) -> pd.DataFrame:
-        query = f"""
+        return pd.read_sql(
+            self.city_search_output_query(file_id),
+            self.engine,
+            **dtype_backend_kwargs(self.dtype_backend),
+        )
+
+    def stream_google_sheet_output_for_city_search_data(
+        self, file_id: str, chunksize: Optional[int] = None
+    ) -> Iterator[pd.DataFrame]:
+        return self.stream_sql(self.city_search_output_query(file_id), chunksize=chunksize)
+
+    def city_search_output_query(self, file_id: str) -> str:
+        return f"""
         WITH all_file_uuids AS (
                          SELECT uuid
                          FROM sales_leads.drive_metadata
@@ -177,25 +304,14 @@ class SalesTransformations:
                                                           SELECT uuid
                                                           FROM all_file_uuids))
         """
-        return pd.read_sql(query, self.engine)
 
     def get_google_sheet_link_by_name(self, spreadsheet_name: str):
         return self.google_api.get_google_sheet_link_by_name(
             spreadsheet_name=spreadsheet_name
         )
 
-    def post_city_search_data_to_google_sheet(
-        self, spreadsheet_name: str, folder_id: str,
-        file_id : str
-        
-    ) -> Dict[str, str]:
-        city_search_df = self.create_google_sheet_output_for_city_search_data(
-            file_id=file_id
-        )
-        
-        file_name = pd.read_sql(f"SELECT name FROM sales_leads.drive_metadata WHERE id = '{file_id}'", self.engine)['name'].values[0]
-
-        sheet_url_dict = {}
+    def split_city_search_output(self, city_search_df: pd.DataFrame):
+        """Franchise and non franchise rows of the city search output, sheet ready."""
         city_search_df["phone"] = (
             city_search_df["phone"].fillna("").apply(lambda x: '="' + x + '"')
         )
@@ -211,21 +327,48 @@ class SalesTransformations:
         city_search_df_non_franchise = city_search_df_non_franchise.drop(
             columns=["franchise_name", "domain_name"]
         )
-        logging.info('Writing non franchise data to google sheet')
-        url = self.google_api.write_to_google_sheet(
-            dataframe=city_search_df_non_franchise,
-            spreadsheet_name=spreadsheet_name,
-            target_sheet=f"{file_name[:30]}_non_franchise",
-            folder_id=folder_id,
-        )
+        return city_search_df_franchise, city_search_df_non_franchise
 
-        sheet_url_dict[file_name] = url
-        logging.info('Writing franchise data to google sheet')
-        self.google_api.write_to_google_sheet(
-            dataframe=city_search_df_franchise,
-            spreadsheet_name=spreadsheet_name,
-            target_sheet=f"{file_name[:30]}_franchise",
-            folder_id=folder_id,
-        )
+    def post_city_search_data_to_google_sheet(
+        self, spreadsheet_name: str, folder_id: str,
+        file_id : str
+        
+    ) -> Dict[str, str]:
+        file_name = pd.read_sql(f"SELECT name FROM sales_leads.drive_metadata WHERE id = '{file_id}'", self.engine)['name'].values[0]
+
+        sheet_url_dict = {}
+        franchise_sheet = f"{file_name[:30]}_franchise"
+        non_franchise_sheet = f"{file_name[:30]}_non_franchise"
+
+        # the output is streamed, the first chunk replaces both tabs in one
+        # batch and the rest are appended so memory stays flat on big files.
+        scheduler = SheetWriteScheduler(gdrive=self.google_api, replacement_strategy="replace")
+        urls = {}
+        chunks = self.stream_google_sheet_output_for_city_search_data(file_id=file_id)
+        for i, chunk in enumerate(chunks):
+            city_search_df_franchise, city_search_df_non_franchise = (
+                self.split_city_search_output(chunk)
+            )
+            tabs = {
+                non_franchise_sheet: city_search_df_non_franchise,
+                franchise_sheet: city_search_df_franchise,
+            }
+            if not urls:
+                for target_sheet, dataframe in tabs.items():
+                    scheduler.queue(
+                        dataframe=dataframe,
+                        spreadsheet_name=spreadsheet_name,
+                        target_sheet=target_sheet,
+                        folder_id=folder_id,
+                    )
+                logging.info('Writing franchise and non franchise data to google sheet')
+                urls = scheduler.flush()
+            else:
+                scheduler.append(
+                    tabs, spreadsheet_name=spreadsheet_name, folder_id=folder_id
+                )
+                logging.info(f'Appended chunk {i} of the city search output')
+
+        sheet_url_dict[file_name] = urls.get(non_franchise_sheet)
 
         return sheet_url_dict
@@ -1,27 +1,75 @@
 from dataclasses import dataclass
 from googleapiclient.discovery import build, Resource
+from googleapiclient.errors import HttpError
 from googleapiclient.http import MediaIoBaseDownload
 from google.oauth2 import service_account
-from typing import Optional
+from typing import TYPE_CHECKING, Optional
 from io import BytesIO
 import pandas as pd
 import gspread
 from gspread_dataframe import set_with_dataframe
-from gspread.exceptions import WorksheetNotFound, SpreadsheetNotFound
+from gspread.exceptions import APIError, WorksheetNotFound, SpreadsheetNotFound
+from requests.adapters import HTTPAdapter
 import logging
+import os
 import sys
 
+from ..instrumentation import count_api_calls, instrumented, record
+from .sheets import SheetWriteScheduler, dataframe_to_values
+
+if TYPE_CHECKING:
+    from ..data.fingerprints import SheetFingerprintIndex
+    from ..data.spreadsheet_cache import SpreadsheetIdCache
+
+
+GOOGLE_API_HOSTS = ("https://www.googleapis.com", "https://sheets.googleapis.com")
+
+
+class RedirectAdapter(HTTPAdapter):
+    """Sends google api requests to `base_url` instead, e.g. a local stand-in server."""
+
+    def __init__(self, base_url: str, **kwargs):
+        super().__init__(**kwargs)
+        self.base_url = base_url.rstrip("/")
+
+    def send(self, request, **kwargs):
+        for host in GOOGLE_API_HOSTS:
+            if request.url.startswith(host):
+                request.url = self.base_url + request.url[len(host):]
+        return super().send(request, **kwargs)
+
 
 @dataclass
 class GoogleDrive:
     creds: Optional[service_account.Credentials] = None
     drive_service: Optional[Resource] = None
+    fingerprint_index: Optional["SheetFingerprintIndex"] = None
+    spreadsheet_cache: Optional["SpreadsheetIdCache"] = None
 
     def __post_init__(self):
         self.creds = service_account.Credentials.from_service_account_info(self.creds)
         self.creds = self.creds.with_scopes(["https://www.googleapis.com/auth/drive"])
-        self.drive_service = build("drive", "v3", credentials=self.creds)
+        self.drive_service = self.build_drive_service()
         self.client = gspread.authorize(self.creds)
+        # GOOGLE_API_URL points gspread (sheets and its drive lookups) at a stand-in server.
+        if os.environ.get("GOOGLE_API_URL"):
+            adapter = RedirectAdapter(os.environ["GOOGLE_API_URL"])
+            for host in GOOGLE_API_HOSTS:
+                self.client.session.mount(host, adapter)
+        self.spreadsheets = {}
+        self.worksheets = {}
+
+    def build_drive_service(self) -> Resource:
+        """A new drive client. The http transport is not thread safe, so each
+        worker thread needs its own."""
+        # DRIVE_API_URL points the client at a stand-in drive server for benchmarks.
+        api_endpoint = os.environ.get("DRIVE_API_URL")
+        return build(
+            "drive",
+            "v3",
+            credentials=self.creds,
+            client_options={"api_endpoint": api_endpoint} if api_endpoint else None,
+        )
 
     def get_shared_with_me(self) -> list:
         files = (
@@ -119,6 +167,7 @@ class GoogleDrive:
         done = False
         while done is False:
             _, done = downloader.next_chunk()
+            count_api_calls()
         return downloaded
 
     def get_stream_object(self, file_id: str) -> BytesIO:
@@ -131,21 +180,61 @@ class GoogleDrive:
         worksheet_name: str,
         folder_id: Optional[str] = None,
     ) -> gspread.Worksheet:
+        spreadsheet = self.open_spreadsheet(
+            spreadsheet_name=spreadsheet_name, folder_id=folder_id
+        )
+
+        worksheets = self.get_worksheets(spreadsheet)
+        if worksheet_name in worksheets:
+            logging.info("Worksheet Found Returning worksheet object")
+            return worksheets[worksheet_name]
+
+        new_worksheet = self.create_worksheet(
+            sheet_name=worksheet_name, spreadsheet=spreadsheet
+        )
+        worksheets[worksheet_name] = new_worksheet
+        return new_worksheet
+
+    def get_worksheets(self, spreadsheet: gspread.Spreadsheet) -> dict:
+        """Worksheets by title, fetched once per spreadsheet handle."""
+        if spreadsheet.id not in self.worksheets:
+            self.worksheets[spreadsheet.id] = {
+                worksheet.title: worksheet for worksheet in spreadsheet.worksheets()
+            }
+        return self.worksheets[spreadsheet.id]
+
+    def open_spreadsheet(
+        self, spreadsheet_name: str, folder_id: Optional[str] = None
+    ) -> gspread.Spreadsheet:
+        """Opens (or creates) the spreadsheet, reusing handles by spreadsheet id.
+
+        When a spreadsheet_cache is set the id is looked up by name and folder
+        first, so only the first open of a spreadsheet searches drive by title.
+        """
+        if self.spreadsheet_cache is not None:
+            spreadsheet_id = self.spreadsheet_cache.get(spreadsheet_name, folder_id)
+            if spreadsheet_id:
+                try:
+                    return self.open_spreadsheet_by_key(spreadsheet_id)
+                except (SpreadsheetNotFound, APIError):
+                    logging.info(f"Cached id for {spreadsheet_name} is stale, searching drive")
+                    self.spreadsheet_cache.invalidate(spreadsheet_name, folder_id)
+
         try:
             spreadsheet = self.client.open(spreadsheet_name, folder_id=folder_id)
         except SpreadsheetNotFound:
-            self.create_new_quickmail_output_sheet(spreadsheet_name=spreadsheet_name, folder_id=folder_id)
-            spreadsheet = self.client.open(spreadsheet_name)
+            spreadsheet_id = self.create_new_quickmail_output_sheet(spreadsheet_name=spreadsheet_name, folder_id=folder_id)
+            spreadsheet = self.client.open_by_key(spreadsheet_id)
 
-        try:
-            worksheet = spreadsheet.worksheet(worksheet_name)
-            logging.info("Worksheet Found Returning worksheet object")
-            return worksheet
-        except WorksheetNotFound:
-            new_worksheet = self.create_worksheet(
-                sheet_name=worksheet_name, spreadsheet=spreadsheet
-            )
-            return new_worksheet
+        if self.spreadsheet_cache is not None:
+            self.spreadsheet_cache.set(spreadsheet_name, folder_id, spreadsheet.id)
+
+        return self.spreadsheets.setdefault(spreadsheet.id, spreadsheet)
+
+    def open_spreadsheet_by_key(self, spreadsheet_id: str) -> gspread.Spreadsheet:
+        if spreadsheet_id not in self.spreadsheets:
+            self.spreadsheets[spreadsheet_id] = self.client.open_by_key(spreadsheet_id)
+        return self.spreadsheets[spreadsheet_id]
 
     def create_worksheet(
         self, sheet_name: str, spreadsheet: gspread.Spreadsheet
@@ -159,14 +248,21 @@ class GoogleDrive:
         worksheet = spreadsheet.add_worksheet(title=sheet_name, rows="100", cols="20")
         return worksheet
 
-    def get_row_number_to_append_to(self, worksheet: gspread.Worksheet) -> int:
-        current_row_count_values = len(worksheet.get_all_values())
-
-        if current_row_count_values == 0:
-            return 1
-        else:
-            return current_row_count_values + 1
+    def append_dataframe(
+        self, dataframe: pd.DataFrame, worksheet: gspread.Worksheet, include_header: bool
+    ) -> None:
+        """Appends the rows in one values.append call. Sheets finds the end of
+        the table itself, so no row has to be counted and blanks in column A
+        don't matter."""
+        values = dataframe_to_values(dataframe)
+        worksheet.append_rows(
+            values if include_header else values[1:],
+            value_input_option="USER_ENTERED",
+            insert_data_option="INSERT_ROWS",
+            table_range="A1",
+        )
 
+    @instrumented()
     def write_to_google_sheet(
         self,
         dataframe: pd.DataFrame,
@@ -175,25 +271,29 @@ class GoogleDrive:
         folder_id: str,
         replacement_strategy: Optional[str] = "replace",
     ) -> gspread.Worksheet.url:
+        record(rows=dataframe.shape[0], target_sheet=target_sheet)
         worksheet = self.get_spreadsheet(
             spreadsheet_name=spreadsheet_name, worksheet_name=target_sheet, folder_id=folder_id
         )
 
+        if replacement_strategy == "diff" and self.fingerprint_index is not None:
+            # the same path as a SheetWriteScheduler flush, so both fingerprint alike.
+            SheetWriteScheduler(gdrive=self).append_unseen_rows(
+                worksheet.spreadsheet, {worksheet.title: dataframe}, {worksheet.title: worksheet.id}
+            )
+            return worksheet.url
+
         if replacement_strategy == "replace":
-            rc = 1
             worksheet.clear()
+            if self.fingerprint_index is not None:
+                self.fingerprint_index.clear(worksheet.spreadsheet.id, worksheet.id)
+            set_with_dataframe(dataframe=dataframe, worksheet=worksheet, row=1)
         else:
-            rc = self.get_row_number_to_append_to(worksheet=worksheet)
-
-        include_headers = True if rc <= 1 else False
+            # only the first row is read, to know whether the header is needed.
+            self.append_dataframe(
+                dataframe, worksheet, include_header=not worksheet.get_values("1:1")
+            )
 
-        set_with_dataframe(
-            dataframe=dataframe,
-            worksheet=worksheet,
-            row=rc,
-            include_column_header=include_headers,
-        )
-        
         return worksheet.url
 
     def get_file_config(
@@ -214,22 +314,43 @@ class GoogleDrive:
             folder_id=folder_id,
         )
 
-        if len(config.get_all_values()) == 1:
+        values = config.get_all_values()
+        if len(values) == 1:
             logging.info("No data in config file")
-            return pd.DataFrame(data=[], columns=config.get_all_values()[0])
-        else:
-            return pd.DataFrame(config.get_all_records())
+        return pd.DataFrame(data=values[1:], columns=values[0])
 
-    def create_new_quickmail_output_sheet(self, spreadsheet_name: str, folder_id: str) -> None:
+    def create_new_quickmail_output_sheet(self, spreadsheet_name: str, folder_id: str) -> str:
         file_metadata = {
             "name": spreadsheet_name,
             "mimeType": "application/vnd.google-apps.spreadsheet",
             "parents": [folder_id],
         }
 
-        self.drive_service.files().create(body=file_metadata).execute()
+        return self.drive_service.files().create(body=file_metadata, fields="id").execute()["id"]
+
+    def get_file_modified_time(self, file_id: str) -> str:
+        file = self.drive_service.files().get(fileId=file_id, fields="modifiedTime").execute()
+        return file.get("modifiedTime")
+
+    def get_cached_spreadsheet_modified_time(
+        self, spreadsheet_name: str, folder_id: Optional[str] = None
+    ) -> Optional[str]:
+        """modifiedTime of the spreadsheet by its cached id, without opening it
+        or searching drive. None when the id isn't cached or is stale."""
+        if self.spreadsheet_cache is None:
+            return None
+        spreadsheet_id = self.spreadsheet_cache.get(spreadsheet_name, folder_id)
+        if not spreadsheet_id:
+            return None
+        try:
+            return self.get_file_modified_time(spreadsheet_id)
+        except HttpError:
+            logging.info(f"Cached id for {spreadsheet_name} is stale")
+            self.spreadsheet_cache.invalidate(spreadsheet_name, folder_id)
+            return None
 
     def get_parent_folder_name(self, parent_id: str) -> str:
+        count_api_calls()
         parent_folder = (
             self.drive_service.files()
             .get(fileId=parent_id, fields="name")
@@ -239,6 +360,7 @@ class GoogleDrive:
     
     
     def get_parent_folder(self, file_id: str) -> list:
+        count_api_calls()
         file = self.drive_service.files().get(fileId=file_id, fields="parents").execute()
         parents = file.get("parents", [])
         return parents
@@ -259,19 +381,22 @@ class GoogleDrive:
         return parent_folders
     
     def get_file_type(self, file_id: str) -> str:
+        count_api_calls()
         file = self.drive_service.files().get(fileId=file_id, fields="fileExtension").execute()
         return file.get("fileExtension", [])
         
     #TODO add the following into the above class to recursively trawl child folders for modified files.
     
     def get_all_files_in_folder(self, folder_id: str) -> list:
+        count_api_calls()
         query = f"'{folder_id}' in parents and trashed=false and name!='Processed'"
         results = self.drive_service.files().list(q=query, 
-                                                fields="files(id, name, parents, createdTime, modifiedTime,owners,lastModifyingUser, fileExtension, mimeType)"
+                                                fields="files(id, name, parents, createdTime, modifiedTime,owners,lastModifyingUser, fileExtension, mimeType, md5Checksum)"
                                                 ).execute()
         items = results.get('files', [])
         return items
 
+    @instrumented()
     def get_modified_files_in_folder(self, folder_id: str, delta_days: int = 7) -> list:
         delta = (pd.Timestamp.today() - pd.Timedelta(days=delta_days)).strftime(
             "%Y-%m-%dT00:00:00"
@@ -0,0 +1,282 @@
+from dataclasses import dataclass, field
+from threading import Lock
+from time import monotonic, sleep
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+import logging
+import os
+
+import pandas as pd
+import gspread
+from gspread.exceptions import APIError
+
+from ..instrumentation import count_api_calls, instrumented, record
+
+if TYPE_CHECKING:
+    from .drive import GoogleDrive
+
+
+@dataclass
+class TokenBucket:
+    """Paces calls to at most `rate_per_minute`, allowing bursts up to the same size."""
+
+    rate_per_minute: int = 60
+
+    def __post_init__(self):
+        self.capacity = float(self.rate_per_minute)
+        self.tokens = self.capacity
+        self.updated_at = monotonic()
+        self.lock = Lock()
+
+    def acquire(self, tokens: int = 1) -> None:
+        while True:
+            with self.lock:
+                now = monotonic()
+                self.tokens = min(
+                    self.capacity,
+                    self.tokens + (now - self.updated_at) * self.rate_per_minute / 60,
+                )
+                self.updated_at = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                wait = (tokens - self.tokens) * 60 / self.rate_per_minute
+            sleep(wait)
+
+
+# the sheets quota is per minute per user, so the buckets are shared by the process.
+read_bucket = TokenBucket(int(os.environ.get("SHEETS_READ_REQUESTS_PER_MINUTE", 60)))
+write_bucket = TokenBucket(int(os.environ.get("SHEETS_WRITE_REQUESTS_PER_MINUTE", 60)))
+
+
+def call_with_quota(bucket: TokenBucket, func, *args, max_retries: int = 5, **kwargs):
+    """Runs a sheets api call under the bucket, backing off if it still gets a 429."""
+    for attempt in range(max_retries + 1):
+        bucket.acquire()
+        count_api_calls()
+        try:
+            return func(*args, **kwargs)
+        except APIError as e:
+            if e.response.status_code != 429 or attempt == max_retries:
+                raise
+            wait = 2**attempt * 5
+            logging.info(f"Sheets quota exceeded, retrying in {wait} seconds")
+            sleep(wait)
+
+
+def dataframe_to_values(dataframe: pd.DataFrame) -> List[list]:
+    values = dataframe.astype(object).where(dataframe.notna(), "").astype(str)
+    return [dataframe.columns.tolist()] + values.values.tolist()
+
+
+@dataclass
+class SheetWriteScheduler:
+    """Collects tab writes and sends them per spreadsheet in batched calls.
+
+    flush() opens each spreadsheet once. New tabs are added with one
+    batchUpdate and filled with one values.batchUpdate, however many are
+    pending. With the "diff" strategy, tabs that already exist get only the
+    rows the fingerprint index hasn't seen, one values.append per tab. With
+    "replace" they are resized, cleared and rewritten with the new ones.
+    """
+
+    gdrive: "GoogleDrive" = None
+    replacement_strategy: str = "diff"
+    pending: Dict[Tuple[str, str], Dict[str, pd.DataFrame]] = field(default_factory=dict)
+    sheet_ids: Dict[Tuple[str, str], int] = field(default_factory=dict)
+
+    def queue(
+        self,
+        dataframe: pd.DataFrame,
+        spreadsheet_name: str,
+        target_sheet: str,
+        folder_id: Optional[str] = None,
+    ) -> None:
+        tabs = self.pending.setdefault((spreadsheet_name, folder_id), {})
+        # several writes to one tab in a flush are all kept, in queue order.
+        if target_sheet in tabs:
+            dataframe = pd.concat([tabs[target_sheet], dataframe], ignore_index=True)
+        tabs[target_sheet] = dataframe
+
+    def flush(self) -> Dict[str, str]:
+        """Writes everything queued and returns the url of each target sheet."""
+        pending, self.pending = self.pending, {}
+        urls = {}
+        for (spreadsheet_name, folder_id), tabs in pending.items():
+            spreadsheet = call_with_quota(
+                read_bucket,
+                self.gdrive.open_spreadsheet,
+                spreadsheet_name=spreadsheet_name,
+                folder_id=folder_id,
+            )
+            urls.update(self.write_tabs(spreadsheet, tabs))
+        return urls
+
+    def append(
+        self,
+        tabs: Dict[str, pd.DataFrame],
+        spreadsheet_name: str,
+        folder_id: Optional[str] = None,
+    ) -> None:
+        """Appends rows below what is already in each tab, without the header.
+        The tabs must exist, e.g. written by an earlier flush()."""
+        spreadsheet = call_with_quota(
+            read_bucket,
+            self.gdrive.open_spreadsheet,
+            spreadsheet_name=spreadsheet_name,
+            folder_id=folder_id,
+        )
+        index = self.gdrive.fingerprint_index
+        for title, dataframe in tabs.items():
+            if dataframe.empty:
+                continue
+            call_with_quota(
+                write_bucket,
+                spreadsheet.values_append,
+                f"'{title}'!A1",
+                params={"valueInputOption": "USER_ENTERED", "insertDataOption": "INSERT_ROWS"},
+                body={"values": dataframe_to_values(dataframe)[1:]},
+            )
+            sheet_id = self.sheet_ids.get((spreadsheet.id, title))
+            if index is not None and sheet_id is not None:
+                index.add(spreadsheet.id, sheet_id, index.fingerprint_rows(dataframe))
+
+    @instrumented()
+    def write_tabs(
+        self, spreadsheet: gspread.Spreadsheet, tabs: Dict[str, pd.DataFrame]
+    ) -> Dict[str, str]:
+        record(rows=sum(dataframe.shape[0] for dataframe in tabs.values()), tabs=len(tabs))
+        metadata = call_with_quota(read_bucket, spreadsheet.fetch_sheet_metadata)
+        sheet_ids = {
+            sheet["properties"]["title"]: sheet["properties"]["sheetId"]
+            for sheet in metadata["sheets"]
+        }
+
+        if self.replacement_strategy == "replace":
+            rewrite, existing = tabs, {}
+        else:
+            rewrite = {title: df for title, df in tabs.items() if title not in sheet_ids}
+            existing = {title: df for title, df in tabs.items() if title in sheet_ids}
+
+        if rewrite:
+            self.rewrite_tabs(spreadsheet, rewrite, sheet_ids)
+        if existing:
+            self.append_unseen_rows(spreadsheet, existing, sheet_ids)
+
+        for title in tabs:
+            self.sheet_ids[(spreadsheet.id, title)] = sheet_ids[title]
+        return {
+            title: f"{spreadsheet.url}#gid={sheet_ids[title]}" for title in tabs
+        }
+
+    def rewrite_tabs(
+        self,
+        spreadsheet: gspread.Spreadsheet,
+        tabs: Dict[str, pd.DataFrame],
+        sheet_ids: Dict[str, int],
+    ) -> None:
+        """Adds or resizes the tabs and writes them from A1, adding the new sheet ids to `sheet_ids`."""
+        requests = []
+        for title, dataframe in tabs.items():
+            grid = {
+                "rowCount": max(dataframe.shape[0] + 1, 2),
+                "columnCount": max(dataframe.shape[1], 1),
+            }
+            if title in sheet_ids:
+                requests.append(
+                    {
+                        "updateSheetProperties": {
+                            "properties": {"sheetId": sheet_ids[title], "gridProperties": grid},
+                            "fields": "gridProperties(rowCount,columnCount)",
+                        }
+                    }
+                )
+            else:
+                requests.append(
+                    {"addSheet": {"properties": {"title": title, "gridProperties": grid}}}
+                )
+
+        cleared = [f"'{title}'" for title in tabs if title in sheet_ids]
+        response = call_with_quota(
+            write_bucket, spreadsheet.batch_update, {"requests": requests}
+        )
+        for reply in response.get("replies", []):
+            if "addSheet" in reply:
+                properties = reply["addSheet"]["properties"]
+                sheet_ids[properties["title"]] = properties["sheetId"]
+
+        if cleared:
+            call_with_quota(write_bucket, spreadsheet.values_batch_clear, body={"ranges": cleared})
+        call_with_quota(
+            write_bucket,
+            spreadsheet.values_batch_update,
+            body={
+                "valueInputOption": "USER_ENTERED",
+                "data": [
+                    {"range": f"'{title}'!A1", "values": dataframe_to_values(dataframe)}
+                    for title, dataframe in tabs.items()
+                ],
+            },
+        )
+        logging.info(f"Wrote {len(tabs)} tabs to {spreadsheet.title} in one batch")
+
+        index = self.gdrive.fingerprint_index
+        if index is not None:
+            for title, dataframe in tabs.items():
+                index.clear(spreadsheet.id, sheet_ids[title])
+                index.add(spreadsheet.id, sheet_ids[title], index.fingerprint_rows(dataframe))
+
+    def append_unseen_rows(
+        self,
+        spreadsheet: gspread.Spreadsheet,
+        tabs: Dict[str, pd.DataFrame],
+        sheet_ids: Dict[str, int],
+    ) -> None:
+        """Appends to existing tabs the rows not written to them before.
+
+        Tabs without recorded fingerprints, e.g. written before the index
+        existed, are read in one values.batchGet and their rows recorded.
+        """
+        index = self.gdrive.fingerprint_index
+        known = {
+            title: index.get(spreadsheet.id, sheet_ids[title]) if index is not None else set()
+            for title in tabs
+        }
+
+        empty = {}
+        unseeded = [title for title in tabs if not known[title]]
+        if unseeded:
+            response = call_with_quota(
+                read_bucket,
+                spreadsheet.values_batch_get,
+                [f"'{title}'" for title in unseeded],
+                params={"valueRenderOption": "FORMULA"},
+            )
+            for title, value_range in zip(unseeded, response.get("valueRanges", [])):
+                values = value_range.get("values", [])
+                empty[title] = not values
+                if values and index is not None:
+                    known[title] = index.seed(
+                        spreadsheet.id, sheet_ids[title], values, tabs[title].columns
+                    )
+
+        for title, dataframe in tabs.items():
+            if index is not None:
+                fingerprints = index.fingerprint_rows(dataframe)
+                is_new = ~fingerprints.isin(known[title]) & ~fingerprints.duplicated()
+                new_rows = dataframe[is_new.values]
+            else:
+                new_rows = dataframe
+            logging.info(f"Appending {new_rows.shape[0]} of {dataframe.shape[0]} rows to {title}")
+            if new_rows.empty:
+                continue
+
+            values = dataframe_to_values(new_rows)
+            call_with_quota(
+                write_bucket,
+                spreadsheet.values_append,
+                f"'{title}'!A1",
+                params={"valueInputOption": "USER_ENTERED", "insertDataOption": "INSERT_ROWS"},
+                body={"values": values if empty.get(title) else values[1:]},
+            )
+            if index is not None:
+                index.add(spreadsheet.id, sheet_ids[title], fingerprints[is_new])
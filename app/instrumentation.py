@@ -0,0 +1,131 @@
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass, field
+from time import perf_counter
+from typing import Callable, Iterator, Optional, Tuple
+import functools
+import json
+import logging
+import os
+
+try:
+    import sentry_sdk
+except ImportError:  # metrics are still logged without sentry
+    sentry_sdk = None
+
+metrics_logger = logging.getLogger("app.metrics")
+
+_active_stages: ContextVar[Tuple["StageMetrics", ...]] = ContextVar("active_stages", default=())
+
+
+@dataclass
+class StageMetrics:
+    stage: str
+    tags: dict = field(default_factory=dict)
+    rows: int = 0
+    bytes: int = 0
+    api_calls: int = 0
+    duration_seconds: float = 0.0
+    error: Optional[str] = None
+    collect: bool = False
+
+    def add(self, rows: int = 0, bytes: int = 0, api_calls: int = 0) -> None:
+        self.rows += rows
+        self.bytes += bytes
+        self.api_calls += api_calls
+
+    def to_json(self) -> str:
+        metrics = asdict(self)
+        tags = metrics.pop("tags")
+        metrics.pop("collect")
+        return json.dumps({"metric": "pipeline.stage", **metrics, **tags}, default=str)
+
+
+def record(rows: int = 0, bytes: int = 0, **tags) -> None:
+    """Adds to the innermost running stage and to enclosing stages opened with
+    collect=True, a no-op outside a stage."""
+    stages = _active_stages.get()
+    if stages:
+        stages[-1].add(rows=rows, bytes=bytes)
+        stages[-1].tags.update(tags)
+        for metrics in stages[:-1]:
+            if metrics.collect:
+                metrics.add(rows=rows, bytes=bytes)
+
+
+def count_api_calls(calls: int = 1) -> None:
+    """Counts external api calls against every running stage."""
+    for metrics in _active_stages.get():
+        metrics.api_calls += calls
+
+
+def sentry_span(stage: str):
+    """A span under the running transaction, or the transaction itself for the
+    outermost stage, which is where the sampling decision is made."""
+    if sentry_sdk is None:
+        return nullcontext()
+    if sentry_sdk.Hub.current.scope.transaction is None:
+        return sentry_sdk.start_transaction(op="pipeline", name=stage)
+    return sentry_sdk.start_span(op="pipeline.stage", description=stage)
+
+
+@contextmanager
+def instrument(
+    stage: str, nested: bool = True, collect: bool = False, **tags
+) -> Iterator[StageMetrics]:
+    """
+    Times the block and logs its StageMetrics as a json line on app.metrics.
+    Nested stages also become sentry spans and collect record() and
+    count_api_calls() calls. Use nested=False around generators, whose
+    body runs interleaved with the caller. With collect=True the stage also
+    totals what its inner stages record.
+    """
+    metrics = StageMetrics(stage=stage, tags=tags, collect=collect)
+    token = _active_stages.set(_active_stages.get() + (metrics,)) if nested else None
+    span_context = sentry_span(stage) if nested else nullcontext()
+    start = perf_counter()
+    with span_context as span:
+        try:
+            yield metrics
+        except Exception as e:
+            metrics.error = type(e).__name__
+            raise
+        finally:
+            metrics.duration_seconds = perf_counter() - start
+            if token is not None:
+                _active_stages.reset(token)
+            if span is not None:
+                for key in ("rows", "bytes", "api_calls"):
+                    span.set_data(key, getattr(metrics, key))
+                for key, value in metrics.tags.items():
+                    span.set_tag(key, value)
+            metrics_logger.info(metrics.to_json())
+
+
+def instrumented(stage: Optional[str] = None, **tags) -> Callable:
+    """instrument() as a decorator. A sized return value (frame or list)
+    counts as the rows unless the function recorded them itself."""
+
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with instrument(stage or func.__name__, **tags) as metrics:
+                result = func(*args, **kwargs)
+                if not metrics.rows and hasattr(result, "__len__") and not isinstance(result, (str, bytes, dict)):
+                    metrics.rows = len(result)
+                return result
+
+        return wrapper
+
+    return decorator
+
+
+def traces_sampler(sampling_context: dict) -> float:
+    """
+    Head based sampling: a trace keeps its parent's decision, otherwise it is
+    sampled at SENTRY_TRACES_SAMPLE_RATE (10% by default). Spans of an
+    unsampled trace are not recorded at all.
+    """
+    if sampling_context.get("parent_sampled") is not None:
+        return float(sampling_context["parent_sampled"])
+    return float(os.environ.get("SENTRY_TRACES_SAMPLE_RATE", 0.1))
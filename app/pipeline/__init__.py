@@ -0,0 +1,2 @@
+from .sync import process_salesfiles
+from .staged import Stage, StagedPipeline, StageCounter, run_staged_sales_sync
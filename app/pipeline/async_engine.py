@@ -0,0 +1,214 @@
+from dataclasses import dataclass, field
+from io import BytesIO
+from typing import TYPE_CHECKING, Optional
+import asyncio
+import logging
+import os
+
+import aiohttp
+import pandas as pd
+from azure.storage.blob import BlobType
+from azure.storage.blob.aio import BlobServiceClient
+from google.auth.transport.requests import Request
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from ..data.ledger import ProcessingLedger
+from .sync import resumed_salesfile, stash_on_failure
+
+if TYPE_CHECKING:
+    from google.oauth2 import service_account
+
+    from ..data.azure import AzureBlobStorage, PostgresExporter
+
+DRIVE_API_URL = "https://www.googleapis.com/drive/v3/"
+
+
+@dataclass
+class AsyncDriveClient:
+    """The few drive v3 calls the sync loop makes, over aiohttp."""
+
+    creds: "service_account.Credentials" = None
+    session: aiohttp.ClientSession = None
+    api_url: str = field(
+        default_factory=lambda: os.environ.get("DRIVE_API_URL", DRIVE_API_URL)
+    )
+
+    def __post_init__(self):
+        self.token_lock = asyncio.Lock()
+
+    async def headers(self) -> dict:
+        async with self.token_lock:
+            if not self.creds.valid:
+                await asyncio.to_thread(self.creds.refresh, Request())
+        return {"Authorization": f"Bearer {self.creds.token}"}
+
+    async def get(self, file_id: str, fields: str) -> dict:
+        async with self.session.get(
+            f"{self.api_url.rstrip('/')}/files/{file_id}",
+            params={"fields": fields, "supportsAllDrives": "true"},
+            headers=await self.headers(),
+        ) as response:
+            response.raise_for_status()
+            return await response.json()
+
+    async def download(self, file_id: str) -> bytes:
+        async with self.session.get(
+            f"{self.api_url.rstrip('/')}/files/{file_id}",
+            params={"alt": "media", "supportsAllDrives": "true"},
+            headers=await self.headers(),
+        ) as response:
+            response.raise_for_status()
+            return await response.read()
+
+
+@dataclass
+class AsyncSalesSync:
+    """
+    asyncio variant of process_salesfiles. Up to `concurrency` files are in
+    flight, so downloading one file overlaps the upload and metadata writes
+    of the others. Parsing and serialising run in worker threads to keep the
+    event loop free. The queries are the PostgresExporter ones, run through
+    asyncpg. Files resumed at mark or upload skip the download and parse like
+    process_salesfiles does, and the ledger writes run in worker threads.
+    """
+
+    psql: "PostgresExporter" = None
+    az: "AzureBlobStorage" = None
+    creds: "service_account.Credentials" = None
+    file_format: str = "csv"
+    concurrency: int = 4
+    upload_delay_seconds: float = 5
+    ledger: ProcessingLedger = field(default_factory=ProcessingLedger)
+
+    async def run(self, files_to_process: pd.DataFrame) -> None:
+        engine = create_async_engine(
+            self.psql.connection_string.replace("postgresql://", "postgresql+asyncpg://", 1)
+        )
+        semaphore = asyncio.Semaphore(self.concurrency)
+        try:
+            async with aiohttp.ClientSession() as session, BlobServiceClient.from_connection_string(
+                self.az.connection_string
+            ) as blob_service_client:
+                drive = AsyncDriveClient(creds=self.creds, session=session)
+
+                async def bounded(file):
+                    async with semaphore:
+                        await self.process(file, drive, engine, blob_service_client)
+
+                results = await asyncio.gather(
+                    *(bounded(file) for file in files_to_process.itertuples()),
+                    return_exceptions=True,
+                )
+        finally:
+            await engine.dispose()
+
+        for file, result in zip(files_to_process.itertuples(), results):
+            if isinstance(result, Exception):
+                logging.error(f"Failed to process {file.name}: {result}")
+        errors = [result for result in results if isinstance(result, Exception)]
+        if errors:
+            raise errors[0]
+
+    async def process(self, file, drive: AsyncDriveClient, engine, blob_service_client) -> None:
+        logging.info(f"Processing file: {file.name}")
+        dataframe = await asyncio.to_thread(resumed_salesfile, self.az, file)
+        resumed = dataframe is not None
+        if resumed:
+            metadata = await drive.get(file.id, "parents")
+        else:
+            async with self.ledger.astage(file.id, "process", source="sales_sync"):
+                metadata, dataframe = await self.download_and_parse(file, drive, engine)
+
+        try:
+            # a file that failed at upload was already marked.
+            if not (resumed and file.stage == "upload"):
+                async with self.ledger.astage(file.id, "mark", source="sales_sync"):
+                    query = await asyncio.to_thread(self.psql.duplicate_content_query, file.id, dataframe)
+                    async with engine.begin() as connection:
+                        row = (await connection.execute(text(query))).fetchone()
+                if row is not None and row[0] is not None:
+                    logging.info(f"{file.name} has the same rows as an earlier file, skipping")
+                    if resumed:
+                        await asyncio.to_thread(self.az.delete_stashed_salesfile, file.id)
+                    return None
+
+            await self.upload(file, metadata, dataframe, drive, blob_service_client)
+        except Exception:
+            await asyncio.to_thread(stash_on_failure, self.az, file.id, dataframe)
+            raise
+
+        if resumed:
+            await asyncio.to_thread(self.az.delete_stashed_salesfile, file.id)
+
+    async def download_and_parse(self, file, drive: AsyncDriveClient, engine):
+        metadata, data = await asyncio.gather(
+            drive.get(file.id, "fileExtension,parents"), drive.download(file.id)
+        )
+
+        async with engine.connect() as connection:
+            uuid = (
+                await connection.execute(
+                    text(f"SELECT uuid FROM sales_leads.drive_metadata WHERE id = '{file.id}'")
+                )
+            ).scalar_one()
+
+        dataframe = await asyncio.to_thread(
+            self.psql.parse_salesfile,
+            BytesIO(data),
+            metadata.get("fileExtension"),
+            str(uuid),
+            file_name=file.name,
+        )
+        return metadata, dataframe
+
+    async def upload(
+        self, file, metadata: dict, dataframe: pd.DataFrame, drive: AsyncDriveClient, blob_service_client
+    ) -> None:
+        parent = await drive.get(metadata["parents"][0], "name")
+        parent_name = parent["name"].replace(" ", "_").lower().strip()
+        payload = await asyncio.to_thread(
+            self.az.serialize_dataframe, dataframe, self.file_format
+        )
+
+        await asyncio.sleep(self.upload_delay_seconds)
+        blob_name = self.az.salesfile_blob_name(file.name, self.file_format)
+        async with self.ledger.astage(file.id, "upload", source="sales_sync", blob_name=blob_name):
+            blob_client = blob_service_client.get_blob_client(f"salesfiles/{parent_name}", blob_name)
+            await blob_client.upload_blob(
+                payload,
+                blob_type=BlobType.BlockBlob,
+                overwrite=True,
+                metadata={"file_id": file.id},
+            )
+            logging.info(f"Uploaded {blob_name} to salesfiles/{parent_name}")
+            await asyncio.to_thread(
+                self.az.enqueue_salesfile,
+                f"salesfiles/{parent_name}",
+                blob_name,
+                file.id,
+                dataframe.shape[0],
+            )
+
+
+def run_async_sales_sync(
+    psql: "PostgresExporter",
+    gdrive,
+    az: "AzureBlobStorage",
+    files_to_process: pd.DataFrame,
+    file_format: str = "csv",
+    concurrency: Optional[int] = None,
+    upload_delay_seconds: float = 5,
+    ledger: Optional[ProcessingLedger] = None,
+) -> None:
+    asyncio.run(
+        AsyncSalesSync(
+            psql=psql,
+            az=az,
+            creds=gdrive.creds,
+            file_format=file_format,
+            concurrency=concurrency or int(os.environ.get("SALES_SYNC_CONCURRENCY", 4)),
+            upload_delay_seconds=upload_delay_seconds,
+            ledger=ledger or ProcessingLedger(),
+        ).run(files_to_process)
+    )
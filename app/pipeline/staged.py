@@ -0,0 +1,307 @@
+from dataclasses import dataclass, field
+from queue import Queue
+from threading import Lock, Thread, local
+from time import perf_counter
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, List, Optional
+import copy
+import logging
+import os
+
+import pandas as pd
+
+from ..data.ledger import ProcessingLedger
+from ..instrumentation import record
+from .sync import RESUMABLE_STAGES, resumed_salesfile, stash_on_failure
+
+if TYPE_CHECKING:
+    from ..data.azure import AzureBlobStorage, PostgresExporter
+    from ..google_drive.drive import GoogleDrive
+
+_DONE = object()
+
+
+@dataclass
+class StageCounter:
+    name: str
+    workers: int = 1
+    processed: int = 0
+    dropped: int = 0
+    failed: int = 0
+    busy_seconds: float = 0.0
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    lock: Lock = field(default_factory=Lock, repr=False)
+
+    def record(self, seconds: float, outcome: str) -> None:
+        with self.lock:
+            setattr(self, outcome, getattr(self, outcome) + 1)
+            self.busy_seconds += seconds
+
+    @property
+    def items_per_second(self) -> float:
+        """Throughput over the stage's wall time."""
+        if self.started_at is None or self.finished_at is None:
+            return 0.0
+        elapsed = self.finished_at - self.started_at
+        return self.processed / elapsed if elapsed else 0.0
+
+    @property
+    def utilisation(self) -> float:
+        """Share of the worker time spent on items rather than waiting on the queues."""
+        if self.started_at is None or self.finished_at is None:
+            return 0.0
+        elapsed = (self.finished_at - self.started_at) * self.workers
+        return self.busy_seconds / elapsed if elapsed else 0.0
+
+
+@dataclass
+class Stage:
+    """`func` takes an item and returns the item for the next stage, or None to drop it."""
+
+    name: str
+    func: Callable[[Any], Any]
+    workers: int = 1
+    queue_size: int = 4
+
+
+@dataclass
+class StagedPipeline:
+    """
+    Stages connected by bounded queues, each drained by its own worker threads.
+    A full queue blocks the stage feeding it, so a slow stage holds back the
+    ones before it instead of letting downloaded files pile up in memory.
+    An item that fails is logged and dropped, the rest carry on.
+    """
+
+    stages: List[Stage]
+    counters: Dict[str, StageCounter] = field(default_factory=dict)
+    errors: List[Exception] = field(default_factory=list)
+
+    def run(self, items: Iterable) -> Dict[str, StageCounter]:
+        queues = [Queue(maxsize=stage.queue_size) for stage in self.stages]
+        queues.append(None)
+        self.counters = {
+            stage.name: StageCounter(name=stage.name, workers=stage.workers)
+            for stage in self.stages
+        }
+
+        threads = []
+        for i, stage in enumerate(self.stages):
+            remaining = {"workers": stage.workers}
+            for _ in range(stage.workers):
+                thread = Thread(
+                    target=self.work,
+                    args=(stage, queues[i], queues[i + 1], remaining),
+                    name=f"{stage.name}-worker",
+                    daemon=True,
+                )
+                thread.start()
+                threads.append(thread)
+
+        for item in items:
+            queues[0].put(item)
+        queues[0].put(_DONE)
+
+        for thread in threads:
+            thread.join()
+
+        self.log_counters()
+        return self.counters
+
+    def work(self, stage: Stage, inbox: Queue, outbox: Optional[Queue], remaining: dict) -> None:
+        counter = self.counters[stage.name]
+        while True:
+            item = inbox.get()
+            if item is _DONE:
+                # let the other workers of this stage see it, the last one forwards it.
+                inbox.put(_DONE)
+                with counter.lock:
+                    remaining["workers"] -= 1
+                    last = remaining["workers"] == 0
+                    counter.finished_at = perf_counter()
+                if last and outbox is not None:
+                    outbox.put(_DONE)
+                return
+
+            with counter.lock:
+                if counter.started_at is None:
+                    counter.started_at = perf_counter()
+
+            start = perf_counter()
+            try:
+                result = stage.func(item)
+            except Exception as e:
+                counter.record(perf_counter() - start, "failed")
+                logging.error(f"Stage {stage.name} failed on {item}: {e}")
+                self.errors.append(e)
+                continue
+
+            if result is None:
+                counter.record(perf_counter() - start, "dropped")
+                continue
+
+            counter.record(perf_counter() - start, "processed")
+            if outbox is not None:
+                outbox.put(result)
+
+    def log_counters(self) -> None:
+        for counter in self.counters.values():
+            logging.info(
+                f"Stage {counter.name}: {counter.processed} processed, {counter.dropped} dropped, "
+                f"{counter.failed} failed, {counter.items_per_second:.2f} items/s "
+                f"with {counter.workers} workers ({counter.utilisation:.0%} busy)"
+            )
+
+
+DEFAULT_STAGE_WORKERS = {"discover": 2, "download": 4, "parse": 2, "mark": 2, "upload": 4}
+
+
+def stage_workers_from_env() -> Dict[str, int]:
+    """SALES_SYNC_STAGE_WORKERS, e.g. "download=8,parse=2", over the defaults."""
+    workers = dict(DEFAULT_STAGE_WORKERS)
+    for pair in filter(None, os.environ.get("SALES_SYNC_STAGE_WORKERS", "").split(",")):
+        name, count = pair.split("=")
+        workers[name.strip()] = int(count)
+    return workers
+
+
+@dataclass
+class SalesfileStages:
+    """The per file steps of sales_sync as pipeline stages.
+
+    discover resolves the drive_metadata uuid, file type and parent folder,
+    download fetches the bytes, parse builds the dataframe, mark stores the
+    content hash and drops duplicates, and upload writes the salesfiles blob.
+    Marking comes before the upload so duplicate rows are never uploaded.
+    A file resumed at mark or upload gets its stashed frame in discover and
+    skips the stages before it.
+    """
+
+    psql: "PostgresExporter"
+    gdrive: "GoogleDrive"
+    az: "AzureBlobStorage"
+    file_format: str = "csv"
+    ledger: ProcessingLedger = field(default_factory=ProcessingLedger)
+
+    def __post_init__(self):
+        self.local = local()
+
+    def ledgered(self, name: str) -> Callable:
+        """The stage method `name`, with each run written to the ledger."""
+        func = getattr(self, name)
+
+        def run(item):
+            if self.resumed_past(name, item):
+                return item
+            file_id = item.id if hasattr(item, "id") else item["id"]
+            try:
+                with self.ledger.stage(file_id, name, source="sales_sync"):
+                    return func(item)
+            except Exception:
+                if name in RESUMABLE_STAGES:
+                    stash_on_failure(self.az, file_id, item["dataframe"])
+                raise
+
+        return run
+
+    @staticmethod
+    def resumed_past(name: str, item) -> bool:
+        """Whether a resumed file already finished stage `name`."""
+        if not isinstance(item, dict) or "resumed_at" not in item:
+            return False
+        stages = ["download", "parse"] + list(RESUMABLE_STAGES)
+        return name in stages and stages.index(name) < stages.index(item["resumed_at"])
+
+    def drive(self) -> "GoogleDrive":
+        """A GoogleDrive per worker thread, sharing credentials and caches."""
+        if not hasattr(self.local, "gdrive"):
+            gdrive = copy.copy(self.gdrive)
+            gdrive.drive_service = self.gdrive.build_drive_service()
+            self.local.gdrive = gdrive
+        return self.local.gdrive
+
+    def discover(self, file) -> dict:
+        gdrive = self.drive()
+        uuid = self.psql.get_uuid_from_table(
+            table_name="drive_metadata",
+            schema="sales_leads",
+            look_up_val=file.id,
+            look_up_column="id",
+        )
+        parent_folder = gdrive.get_parent_folder(file.id)
+        parent_name = gdrive.get_parent_folder_name(parent_folder[0])
+        item = {
+            "id": file.id,
+            "name": file.name,
+            "drive_metadata_uuid": uuid["uuid"].values[0],
+            "file_ext": gdrive.get_file_type(file.id),
+            "parent_name": parent_name.replace(" ", "_").lower().strip(),
+        }
+        dataframe = resumed_salesfile(self.az, file)
+        if dataframe is not None:
+            item["dataframe"] = dataframe
+            item["resumed_at"] = file.stage
+        return item
+
+    def download(self, item: dict) -> dict:
+        item["stream"] = self.drive().get_stream_object(item["id"])
+        record(bytes=item["stream"].getbuffer().nbytes)
+        return item
+
+    def parse(self, item: dict) -> dict:
+        item["dataframe"] = self.psql.parse_salesfile(
+            item.pop("stream"),
+            item["file_ext"],
+            item["drive_metadata_uuid"],
+            file_name=item["name"],
+        )
+        record(rows=item["dataframe"].shape[0])
+        return item
+
+    def mark(self, item: dict) -> Optional[dict]:
+        if self.psql.mark_duplicate_content(item["id"], item["dataframe"]):
+            logging.info(f"{item['name']} has the same rows as an earlier file, skipping")
+            if "resumed_at" in item:
+                self.az.delete_stashed_salesfile(item["id"])
+            return None
+        return item
+
+    def upload(self, item: dict) -> dict:
+        self.az.upload_dataframe(
+            dataframe=item["dataframe"],
+            container_name=f"salesfiles/{item['parent_name']}",
+            blob_name=self.az.salesfile_blob_name(item["name"], self.file_format),
+            file_id=item["id"],
+            file_format=self.file_format,
+        )
+        del item["dataframe"]
+        if "resumed_at" in item:
+            self.az.delete_stashed_salesfile(item["id"])
+        return item
+
+    def pipeline(self, workers: Optional[Dict[str, int]] = None) -> StagedPipeline:
+        workers = workers or stage_workers_from_env()
+        return StagedPipeline(
+            stages=[
+                Stage(name=name, func=self.ledgered(name), workers=workers[name])
+                for name in ["discover", "download", "parse", "mark", "upload"]
+            ]
+        )
+
+
+def run_staged_sales_sync(
+    psql: "PostgresExporter",
+    gdrive: "GoogleDrive",
+    az: "AzureBlobStorage",
+    files_to_process: pd.DataFrame,
+    file_format: str = "csv",
+    workers: Optional[Dict[str, int]] = None,
+    ledger: Optional[ProcessingLedger] = None,
+) -> Dict[str, StageCounter]:
+    pipeline = SalesfileStages(
+        psql, gdrive, az, file_format=file_format, ledger=ledger or ProcessingLedger()
+    ).pipeline(workers)
+    counters = pipeline.run(files_to_process.itertuples())
+    if pipeline.errors:
+        raise pipeline.errors[0]
+    return counters
@@ -0,0 +1,110 @@
+from time import sleep
+from typing import TYPE_CHECKING, Optional
+import logging
+
+import pandas as pd
+
+from ..data.ledger import ProcessingLedger
+
+if TYPE_CHECKING:
+    from ..data.azure import AzureBlobStorage, PostgresExporter
+    from ..google_drive.drive import GoogleDrive
+
+# stages that run on the parsed frame. A file that failed at one of them is
+# resumed from the frame stashed by AzureBlobStorage.stash_salesfile.
+RESUMABLE_STAGES = ("mark", "upload")
+
+
+def process_salesfiles(
+    psql: "PostgresExporter",
+    gdrive: "GoogleDrive",
+    az: "AzureBlobStorage",
+    files_to_process: pd.DataFrame,
+    file_format: str = "csv",
+    upload_delay_seconds: float = 5,
+    ledger: Optional[ProcessingLedger] = None,
+) -> None:
+    """Downloads, parses and uploads each file to salesfiles/<parent folder>, one at a time.
+    Files from ProcessingLedger.failed_files carry the `stage` they failed at
+    and skip the stages that already finished."""
+    ledger = ledger or ProcessingLedger()
+    errors = []
+    for file in files_to_process.itertuples():
+        logging.info(f"Processing file: {file.name}")
+        try:
+            process_salesfile(
+                psql, gdrive, az, file, file_format, upload_delay_seconds, ledger
+            )
+        except Exception as e:
+            # ledgered as failed, the next sales_sync run picks it up again.
+            logging.error(f"Failed to process {file.name}: {e}")
+            errors.append(e)
+
+    if errors:
+        raise errors[0]
+
+
+def resumed_salesfile(az: "AzureBlobStorage", file) -> Optional[pd.DataFrame]:
+    """The stashed frame of a file that failed at mark or upload. None for a
+    new file, or when nothing was stashed and it has to start over."""
+    stage = getattr(file, "stage", None)
+    if stage not in RESUMABLE_STAGES:
+        return None
+    dataframe = az.read_stashed_salesfile(file.id)
+    if dataframe is not None:
+        logging.info(f"Resuming {file.name} at {stage}")
+    return dataframe
+
+
+def stash_on_failure(az: "AzureBlobStorage", file_id: str, dataframe: pd.DataFrame) -> None:
+    try:
+        az.stash_salesfile(file_id, dataframe)
+    except Exception as e:
+        logging.error(f"Could not stash {file_id}, its resume starts over: {e}")
+
+
+def process_salesfile(
+    psql: "PostgresExporter",
+    gdrive: "GoogleDrive",
+    az: "AzureBlobStorage",
+    file,
+    file_format: str,
+    upload_delay_seconds: float,
+    ledger: ProcessingLedger,
+) -> None:
+    dataframe = resumed_salesfile(az, file)
+    resumed = dataframe is not None
+    if not resumed:
+        with ledger.stage(file.id, "process", source="sales_sync"):
+            dataframe = psql.process_file(file.id, gdrive)
+
+    try:
+        # a file that failed at upload was already marked.
+        if not (resumed and file.stage == "upload"):
+            with ledger.stage(file.id, "mark", source="sales_sync"):
+                duplicate = psql.mark_duplicate_content(file.id, dataframe)
+            if duplicate:
+                logging.info(f"{file.name} has the same rows as an earlier file, skipping")
+                if resumed:
+                    az.delete_stashed_salesfile(file.id)
+                return None
+
+        blob_name = az.salesfile_blob_name(file.name, file_format)
+        with ledger.stage(file.id, "upload", source="sales_sync", blob_name=blob_name):
+            parent_folder = gdrive.get_parent_folder(file.id)
+            parent_name = gdrive.get_parent_folder_name(parent_folder[0])
+            parent_name = parent_name.replace(" ", "_").lower().strip()
+            sleep(upload_delay_seconds)
+            az.upload_dataframe(
+                dataframe=dataframe,
+                container_name=f"salesfiles/{parent_name}",
+                blob_name=blob_name,
+                file_id=file.id,
+                file_format=file_format,
+            )
+    except Exception:
+        stash_on_failure(az, file.id, dataframe)
+        raise
+
+    if resumed:
+        az.delete_stashed_salesfile(file.id)
@@ -0,0 +1 @@
+from .notifier import SlackNotifier, get_notifier
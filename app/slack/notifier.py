@@ -0,0 +1,101 @@
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+from time import sleep
+import logging
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# slack caps a single message at 50 blocks.
+MAX_BLOCKS_PER_MESSAGE = 50
+
+
+@dataclass
+class SlackNotifier:
+    webhook: str
+    max_workers: int = 4
+    timeout: int = 10
+    max_retries: int = 5
+    backoff_seconds: float = 1.0
+    session: Optional[requests.Session] = None
+
+    def __post_init__(self):
+        if self.session is None:
+            self.session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=1, pool_maxsize=self.max_workers
+            )
+            self.session.mount("https://", adapter)
+            self.session.mount("http://", adapter)
+
+    def post(self, payload: dict) -> bool:
+        """Posts a single payload, retrying with backoff on 429 and 5xx."""
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = self.session.post(
+                    self.webhook, json=payload, timeout=self.timeout
+                )
+            except requests.RequestException as e:
+                logging.error(f"Failed to send slack notification: {e}")
+                response = None
+
+            if response is not None and response.status_code == 200:
+                return True
+
+            if response is not None and response.status_code < 500 and response.status_code != 429:
+                logging.error(f"Failed to send slack notification: {response.status_code}")
+                return False
+
+            if attempt == self.max_retries:
+                break
+
+            wait = self.backoff_seconds * 2**attempt
+            if response is not None and response.headers.get("Retry-After"):
+                wait = max(wait, float(response.headers["Retry-After"]))
+            logging.info(f"Slack rate limited, retrying in {wait} seconds")
+            sleep(wait)
+
+        logging.error("Failed to send slack notification after retries")
+        return False
+
+    def flush(self, messages: List[str], aggregate: Optional[bool] = False) -> List[bool]:
+        """Sends the messages and returns whether each one was delivered.
+        The notifier is shared by the process, so the batch belongs to the caller.
+
+        Args:
+            aggregate (bool): combine the messages into block messages
+                instead of posting each one separately.
+        """
+        if not messages:
+            return []
+
+        if aggregate:
+            results = []
+            for i in range(0, len(messages), MAX_BLOCKS_PER_MESSAGE):
+                chunk = messages[i : i + MAX_BLOCKS_PER_MESSAGE]
+                blocks = [
+                    {"type": "section", "text": {"type": "mrkdwn", "text": message}}
+                    for message in chunk
+                ]
+                delivered = self.post({"text": chunk[0], "blocks": blocks})
+                results.extend([delivered] * len(chunk))
+        else:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                results = list(
+                    executor.map(lambda message: self.post({"text": message}), messages)
+                )
+
+        logging.info(f"Sent {sum(results)} of {len(results)} slack notifications")
+        return results
+
+
+_notifiers: Dict[str, SlackNotifier] = {}
+
+
+def get_notifier(webhook: str) -> SlackNotifier:
+    """Returns a notifier per webhook so the session is reused across calls.
+    It holds no messages, concurrent callers each pass their own to flush()."""
+    if webhook not in _notifiers:
+        _notifiers[webhook] = SlackNotifier(webhook=webhook)
+    return _notifiers[webhook]
@@ -0,0 +1,107 @@
+"""Parse time, memory and load throughput of the object dtype path against the
+arrow backend (PIPELINE_DTYPE_BACKEND=pyarrow).
+
+python -m benchmarks.bench_dtype_backend --rows 200000
+python -m benchmarks.bench_dtype_backend --rows 200000 --load
+
+--load writes into bench.leads, a copy of sales_leads.leads, so it needs a
+migrated database configured through the PSQL_* settings.
+"""
+import argparse
+import io
+import os
+import tracemalloc
+from time import perf_counter
+
+import pandas as pd
+from sqlalchemy import text
+
+from app import PostgresExporter
+from app.data.azure import contact_fingerprints, normalize_contact_ids
+from app.data.backend import dtype_backend_kwargs
+from benchmarks.synthetic import make_zoominfo_frame
+
+BACKENDS = {"object": None, "pyarrow": "pyarrow"}
+
+
+def measure(func):
+    tracemalloc.start()
+    start = perf_counter()
+    result = func()
+    seconds = perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, seconds, peak
+
+
+def bench_parse(data: bytes, dtype_backend) -> pd.DataFrame:
+    df, seconds, peak = measure(
+        lambda: pd.read_csv(io.BytesIO(data), **dtype_backend_kwargs(dtype_backend))
+    )
+    frame_bytes = df.memory_usage(deep=True).sum()
+    rows_per_second = len(df) / seconds
+    print(f"  parse:  {seconds:.3f}s ({rows_per_second:,.0f} rows/s), peak {peak / 1024**2:.1f} MiB")
+    print(f"  frame:  {frame_bytes / 1024**2:.1f} MiB")
+    return df
+
+
+def bench_load(df: pd.DataFrame, dtype_backend) -> None:
+    psql = PostgresExporter(
+        username=os.environ.get("PSQL_USERNAME"),
+        password=os.environ.get("PSQL_PASSWORD"),
+        host=os.environ.get("PSQL_SERVER"),
+        port=os.environ.get("PSQL_PORT"),
+        database=os.environ.get("PSQL_DATABASE"),
+        dtype_backend=dtype_backend,
+    )
+    with psql.engine.begin() as conn:
+        conn.execute(text("CREATE SCHEMA IF NOT EXISTS bench"))
+        conn.execute(text("DROP TABLE IF EXISTS bench.leads"))
+        conn.execute(text("CREATE TABLE bench.leads (LIKE sales_leads.leads INCLUDING ALL)"))
+
+    df = psql._clean_column_names(df)
+    df["zoominfo_contact_id"] = normalize_contact_ids(df["zoominfo_contact_id"])
+    df["contact_fingerprint"] = contact_fingerprints(df)
+    df = df.drop_duplicates(subset="contact_fingerprint", keep="first")
+
+    _, seconds, peak = measure(
+        lambda: psql.insert_raw_data(
+            dataset=df,
+            table_name="leads",
+            schema="bench",
+            upsert_on="contact_fingerprint",
+            keep_on_conflict=LEAD_FIRST_SEEN_COLUMNS,
+            chunksize=1000,
+        )
+    )
+    print(f"  load:   {seconds:.3f}s ({len(df) / seconds:,.0f} rows/s), peak {peak / 1024**2:.1f} MiB")
+
+    query = "SELECT * FROM bench.leads"
+    read, seconds, peak = measure(
+        lambda: pd.read_sql(query, psql.engine, **dtype_backend_kwargs(dtype_backend))
+    )
+    print(f"  read:   {seconds:.3f}s ({len(read) / seconds:,.0f} rows/s), peak {peak / 1024**2:.1f} MiB")
+
+    with psql.engine.begin() as conn:
+        conn.execute(text("DROP TABLE bench.leads"))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--load", action="store_true")
+    args = parser.parse_args()
+
+    source = make_zoominfo_frame(args.rows, seed=1)
+    data = source.to_csv(index=False).encode()
+    print(f"{args.rows} rows, {len(data) / 1024**2:.1f} MiB csv")
+
+    for name, dtype_backend in BACKENDS.items():
+        print(f"{name}:")
+        df = bench_parse(data, dtype_backend)
+        if args.load:
+            bench_load(df, dtype_backend)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,346 @@
+"""Wall time, api calls and peak RSS per stage of one full run: sales_sync,
+the zi search blob trigger for every uploaded blob, then the outbox drain.
+
+The functions run as deployed, through function_app, against local stand-ins:
+drive, sheets and the slack webhook are served by benchmarks.fake_drive, blob
+storage is Azurite and postgres is the docker-compose.local.yml database
+migrated to head (PSQL_* default to its settings), e.g.
+
+docker compose -f docker-compose.local.yml up -d
+docker run -d -p 10000:10000 mcr.microsoft.com/azure-storage/azurite azurite-blob --blobHost 0.0.0.0
+alembic upgrade head
+python -m benchmarks.bench_e2e --files 10 --rows 20000 --city-files 2 --history 200000
+
+Each run drops new files (named bench_<run>_*), so runs can be repeated
+against the same database. --reset empties the sales_leads tables first and
+only works against a local database.
+"""
+import argparse
+import base64
+import json
+import logging
+import os
+import resource
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+from threading import Event, Thread
+from time import perf_counter
+from types import SimpleNamespace
+from typing import Callable, Dict, List
+
+import pandas as pd
+from sqlalchemy import text
+
+from benchmarks.bench_sales_sync_engine import AZURITE
+from benchmarks.fake_drive import FOLDER, SPREADSHEET, FakeDriveServer, FakeFile, fake_service_account_info
+from benchmarks.history import ensure_shopify_view, require_local, seed_history
+from benchmarks.synthetic import make_city_search_frame, make_zoominfo_frame
+
+PARENT_FOLDER = "bench-parent"
+CONFIG_FOLDER = "bench-config-folder"
+OUTPUT_FOLDER = "bench-output-folder"
+CONFIG_NAME = "Bench Quick Mail Config"
+PSQL_DEFAULTS = {
+    "PSQL_USERNAME": "root",
+    "PSQL_PASSWORD": "root",
+    "PSQL_SERVER": "localhost",
+    "PSQL_PORT": "5432",
+    "PSQL_DATABASE": "postgres",
+}
+RESET_TABLES = [
+    "outbox",
+    "ingest_checkpoints",
+    "file_processing_ledger",
+    "sheet_row_fingerprints",
+    "spreadsheet_ids",
+    "sync_state",
+    "quick_mail_config",
+    "drive_metadata_metrics",
+    "tracking",
+    "lead_sightings",
+    "leads",
+    "city_search_enriched",
+    "city_search",
+    "drive_metadata",
+]
+
+
+def current_rss() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        # peak so far rather than current, the best there is off linux.
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class RssSampler(Thread):
+    """Samples the resident set size so the peak of any time window can be read back."""
+
+    def __init__(self, interval_seconds: float = 0.05):
+        super().__init__(daemon=True)
+        self.interval_seconds = interval_seconds
+        self.samples = []
+        self.stopped = Event()
+
+    def run(self) -> None:
+        while not self.stopped.is_set():
+            self.samples.append((perf_counter(), current_rss()))
+            self.stopped.wait(self.interval_seconds)
+
+    def peak(self, start: float, end: float) -> int:
+        return max((rss for at, rss in self.samples if start <= at <= end), default=current_rss())
+
+
+class StageCollector(logging.Handler):
+    """Keeps the app.metrics json lines, stamped with when each stage ended."""
+
+    def __init__(self):
+        super().__init__()
+        self.stages = []
+
+    def emit(self, record: logging.LogRecord) -> None:
+        metrics = json.loads(record.getMessage())
+        metrics["ended_at"] = perf_counter()
+        self.stages.append(metrics)
+
+
+class BenchBlob:
+    """The parts of func.InputStream the blob trigger reads."""
+
+    def __init__(self, name: str, data: bytes):
+        self.name = name
+        self.length = len(data)
+        self.data = data
+
+    def read(self, size: int = -1) -> bytes:
+        return self.data
+
+
+def build_drive(args, run: str) -> Dict[str, FakeFile]:
+    """The watched folder tree with this run's drops, the config sheet listing
+    every zi search drop and the output folder."""
+    files = {
+        PARENT_FOLDER: FakeFile("Sales Files", mime_type=FOLDER),
+        "bench-zi-search": FakeFile("ZI Search", mime_type=FOLDER, parents=[PARENT_FOLDER]),
+        "bench-city-search": FakeFile("City Search", mime_type=FOLDER, parents=[PARENT_FOLDER]),
+        CONFIG_FOLDER: FakeFile("Config", mime_type=FOLDER),
+        OUTPUT_FOLDER: FakeFile("Quick Mail Output", mime_type=FOLDER),
+    }
+    seed = int(run, 16)
+    config_rows = [["filename", "hubspot_owner", "zi_search"]]
+    for i in range(args.files):
+        name = f"bench_{run}_{i}.csv"
+        frame = make_zoominfo_frame(
+            args.rows, duplicate_rate=args.duplicate_rate, seed=seed + i
+        ).drop(columns=["drive_metadata_uuid"])
+        files[f"bench-zi-{run}-{i}"] = FakeFile(
+            name, data=frame.to_csv(index=False).encode(), parents=["bench-zi-search"]
+        )
+        config_rows.append([name, "Bench Owner", "synthetic"])
+    for i in range(args.city_files):
+        frame = make_city_search_frame(args.rows, duplicate_rate=args.duplicate_rate, seed=seed + i)
+        files[f"bench-city-{run}-{i}"] = FakeFile(
+            f"bench_{run}_city_{i}.csv",
+            data=frame.to_csv(index=False).encode(),
+            parents=["bench-city-search"],
+        )
+
+    # a new modified time, so sales_sync picks up this run's config rows.
+    files["bench-config"] = FakeFile(
+        CONFIG_NAME,
+        mime_type=SPREADSHEET,
+        parents=[CONFIG_FOLDER],
+        modified_time=datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
+        tabs={"Sheet1": config_rows},
+    )
+    return files
+
+
+def configure_environment(server: FakeDriveServer, args) -> None:
+    for key, value in PSQL_DEFAULTS.items():
+        os.environ.setdefault(key, value)
+    service_account = json.dumps(fake_service_account_info(server.token_uri))
+    os.environ.update(
+        {
+            "SENTRY_DSN": "",
+            "SERVICE_ACCOUNT": base64.b64encode(service_account.encode()).decode(),
+            "DRIVE_API_URL": server.api_url,
+            "GOOGLE_API_URL": server.base_url,
+            "SLACK_WEBHOOK": server.slack_url,
+            "SalesSyncBlogTrigger": os.environ.get("AZURITE_CONNECTION_STRING", AZURITE),
+            "PARENT_FOLDER": PARENT_FOLDER,
+            "QUICK_MAIL_CONFIG_NAME": CONFIG_NAME,
+            "QUICK_MAIL_CONFIG_FOLDER_ID": CONFIG_FOLDER,
+            "QUICK_MAIL_OUTPUT_PARENT_FOLDER_ID": OUTPUT_FOLDER,
+            "SALES_SYNC_ENGINE": args.engine,
+            "SALESFILES_FORMAT": args.format,
+        }
+    )
+
+
+def user_function(function) -> Callable:
+    """The python function behind an azure functions decorator."""
+    if hasattr(function, "build"):
+        return function.build().get_user_function()
+    return function
+
+
+def reset_tables(psql) -> None:
+    require_local(psql)
+    tables = ", ".join(f"sales_leads.{table}" for table in RESET_TABLES)
+    with psql.engine.begin() as connection:
+        connection.execute(text(f"TRUNCATE {tables} CASCADE"))
+
+
+def pending_outbox_events(psql) -> int:
+    with psql.engine.connect() as connection:
+        return connection.execute(
+            text("SELECT count(*) FROM sales_leads.outbox WHERE status = 'pending' AND attempts < 5")
+        ).scalar()
+
+
+def report(phases: List[dict], collector: StageCollector, sampler: RssSampler, server: FakeDriveServer) -> None:
+    mib = 1024**2
+    print(f"\n{'phase':<24}{'seconds':>10}{'google calls':>14}{'peak rss MiB':>14}")
+    for phase in phases:
+        print(
+            f"{phase['phase']:<24}{phase['seconds']:>10.2f}"
+            f"{sum(phase['calls'].values()):>14}{phase['peak_rss'] / mib:>14.1f}"
+        )
+
+    stages = {}
+    for metrics in collector.stages:
+        stage = stages.setdefault(
+            metrics["stage"],
+            {"count": 0, "seconds": 0.0, "max_seconds": 0.0, "rows": 0, "api_calls": 0, "peak_rss": 0, "errors": 0},
+        )
+        seconds = metrics["duration_seconds"]
+        stage["count"] += 1
+        stage["seconds"] += seconds
+        stage["max_seconds"] = max(stage["max_seconds"], seconds)
+        stage["rows"] += metrics["rows"]
+        stage["api_calls"] += metrics["api_calls"]
+        stage["errors"] += metrics["error"] is not None
+        stage["peak_rss"] = max(
+            stage["peak_rss"], sampler.peak(metrics["ended_at"] - seconds, metrics["ended_at"])
+        )
+
+    print(
+        f"\n{'stage':<44}{'runs':>6}{'seconds':>10}{'max':>9}{'rows':>11}"
+        f"{'api calls':>11}{'peak rss MiB':>14}{'errors':>8}"
+    )
+    for name, stage in sorted(stages.items(), key=lambda item: -item[1]["seconds"]):
+        print(
+            f"{name[:43]:<44}{stage['count']:>6}{stage['seconds']:>10.2f}{stage['max_seconds']:>9.2f}"
+            f"{stage['rows']:>11}{stage['api_calls']:>11}{stage['peak_rss'] / mib:>14.1f}{stage['errors']:>8}"
+        )
+
+    print(f"\n{'endpoint':<44}{'calls':>8}")
+    for endpoint, calls in server.calls.most_common():
+        print(f"{endpoint:<44}{calls:>8}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=5, help="zi search drops")
+    parser.add_argument("--city-files", type=int, default=1, help="city search drops")
+    parser.add_argument("--rows", type=int, default=10_000, help="rows per drop")
+    parser.add_argument("--history", type=int, default=0, help="earlier leads already in the database")
+    parser.add_argument("--tracked-rate", type=float, default=0.5, help="share of the history already posted")
+    parser.add_argument("--duplicate-rate", type=float, default=0.1)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds per google api request")
+    parser.add_argument("--engine", default="sync", choices=["sync", "staged", "async"])
+    parser.add_argument("--format", default="csv", choices=["csv", "parquet"])
+    parser.add_argument("--reset", action="store_true", help="empty the sales_leads tables first")
+    args = parser.parse_args()
+
+    run = uuid.uuid4().hex[:8]
+    server = FakeDriveServer(build_drive(args, run), latency_seconds=args.latency).start()
+    configure_environment(server, args)
+
+    # function_app reads the environment (sentry, logging) when it is imported.
+    import function_app
+    from app import AzureBlobStorage, PostgresExporter
+
+    collector = StageCollector()
+    logging.getLogger("app.metrics").addHandler(collector)
+    sampler = RssSampler()
+    sampler.start()
+
+    psql = PostgresExporter(
+        username=os.environ["PSQL_USERNAME"],
+        password=os.environ["PSQL_PASSWORD"],
+        host=os.environ["PSQL_SERVER"],
+        port=os.environ["PSQL_PORT"],
+        database=os.environ["PSQL_DATABASE"],
+    )
+    az = AzureBlobStorage(connection_string=os.environ["SalesSyncBlogTrigger"])
+    try:
+        az.blob_service_client.create_container("salesfiles")
+    except Exception:
+        pass
+
+    if args.reset:
+        reset_tables(psql)
+    ensure_shopify_view(psql)
+
+    phases = []
+
+    def phase(name: str, func: Callable) -> None:
+        calls_before = Counter(server.calls)
+        start = perf_counter()
+        func()
+        end = perf_counter()
+        phases.append(
+            {
+                "phase": name,
+                "seconds": end - start,
+                "calls": server.calls - calls_before,
+                "peak_rss": sampler.peak(start, end),
+            }
+        )
+
+    if args.history:
+        phase("seed history", lambda: seed_history(psql, args.history, tracked_rate=args.tracked_rate))
+
+    timer = SimpleNamespace(past_due=False)
+    phase("sales_sync", lambda: user_function(function_app.sales_sync)(timer))
+
+    zi_files = [
+        file for file_id, file in server.files.items() if file_id.startswith(f"bench-zi-{run}")
+    ]
+    blob_names = {
+        f"zi_search/{AzureBlobStorage.salesfile_blob_name(file.name, args.format)}" for file in zi_files
+    }
+    blobs = [blob.name for blob in az.list_blobs("salesfiles") if blob.name in blob_names]
+    print(f"run {run}: {len(blobs)} of {len(zi_files)} zi search drops reached salesfiles")
+
+    def ingest() -> None:
+        for blob_name in blobs:
+            data = az.get_blob_from_container("salesfiles", blob_name).readall()
+            function_app.ingest_zi_search_blob(BenchBlob(f"salesfiles/{blob_name}", data))
+
+    phase("zi search blob trigger", ingest)
+
+    def drain() -> None:
+        drain_outbox = user_function(function_app.OutboxDrain)
+        for _ in range(20):
+            if not pending_outbox_events(psql):
+                break
+            drain_outbox(timer)
+
+    phase("outbox drain", drain)
+
+    sampler.stopped.set()
+    server.shutdown()
+    print(
+        f"{args.files} zi search and {args.city_files} city search drops x {args.rows} rows, "
+        f"{args.history} history rows, {args.engine} engine, {args.latency}s google latency"
+    )
+    report(phases, collector, sampler, server)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""Execution time and buffer use of each production query against a generated
+history, with EXPLAIN (ANALYZE, BUFFERS).
+
+python -m benchmarks.history --scale 1m
+python -m benchmarks.bench_queries --scale 1m
+
+Each run is appended to benchmarks/results/query_runs.jsonl (plans included)
+and compared with the previous run of the same scale.
+"""
+import argparse
+import json
+import statistics
+import subprocess
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional
+
+from app import SalesTransformations
+from benchmarks.history import SCALES, bench_psql
+from benchmarks.queries import explain, production_queries, sample_files
+
+RESULTS = Path(__file__).parent / "results" / "query_runs.jsonl"
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def previous_runs(path: Path, scale: str) -> dict:
+    """The latest stored result per query for the scale."""
+    runs = {}
+    if path.exists():
+        with open(path) as f:
+            for line in f:
+                result = json.loads(line)
+                if result["scale"] == scale:
+                    runs[result["query"]] = result
+    return runs
+
+
+def measure(psql, query: str, repeat: int) -> dict:
+    """Median execution over `repeat` warm runs, with the plan of the last one."""
+    plans = [explain(psql, query) for _ in range(repeat)]
+    plan = plans[-1]
+    root = plan["Plan"]
+    return {
+        "execution_ms": statistics.median(p["Execution Time"] for p in plans),
+        "planning_ms": statistics.median(p["Planning Time"] for p in plans),
+        "shared_hit_blocks": root.get("Shared Hit Blocks", 0),
+        "shared_read_blocks": root.get("Shared Read Blocks", 0),
+        "temp_written_blocks": root.get("Temp Written Blocks", 0),
+        "rows": root.get("Actual Rows", 0),
+        "total_cost": root["Total Cost"],
+        "plan": plan,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scale", default="10k", choices=list(SCALES), help="the seeded history size")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", type=Path, default=RESULTS)
+    parser.add_argument("--query", action="append", help="only these queries")
+    args = parser.parse_args()
+
+    psql = bench_psql()
+    st = SalesTransformations(engine=psql.engine)
+    queries = production_queries(psql, st, sample_files(psql))
+    if args.query:
+        queries = {name: query for name, query in queries.items() if name in args.query}
+
+    previous = previous_runs(args.output, args.scale)
+    run_at = datetime.now(timezone.utc).isoformat()
+    commit = git_commit()
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+
+    print(f"{'query':<40}{'exec ms':>10}{'plan ms':>9}{'hit':>10}{'read':>9}{'rows':>9}{'vs last':>9}")
+    with open(args.output, "a") as out:
+        for name, query in queries.items():
+            result = {"run_at": run_at, "commit": commit, "scale": args.scale, "query": name}
+            result.update(measure(psql, query, args.repeat))
+            out.write(json.dumps(result) + "\n")
+
+            last = previous.get(name)
+            change = (
+                f"{result['execution_ms'] / last['execution_ms']:>8.2f}x"
+                if last and last["execution_ms"]
+                else f"{'-':>9}"
+            )
+            print(
+                f"{name:<40}{result['execution_ms']:>10.1f}{result['planning_ms']:>9.1f}"
+                f"{result['shared_hit_blocks']:>10}{result['shared_read_blocks']:>9}{result['rows']:>9}{change}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""Wall time of the sync and async salesfiles engines against local stand-ins.
+
+Drive is served by benchmarks.fake_drive (with --latency per request), blob
+storage is Azurite and postgres is a migrated local database from the
+PSQL_* settings, e.g.
+
+docker run -d -p 10000:10000 mcr.microsoft.com/azure-storage/azurite azurite-blob --blobHost 0.0.0.0
+python -m benchmarks.bench_sales_sync_engine --files 20 --rows 20000 --latency 0.2
+"""
+import argparse
+import os
+import uuid
+from time import perf_counter
+
+import pandas as pd
+from sqlalchemy import text
+
+from app import AzureBlobStorage, GoogleDrive, PostgresExporter
+from app.pipeline import process_salesfiles
+from app.pipeline.async_engine import run_async_sales_sync
+from benchmarks.fake_drive import FakeDriveServer, FakeFile, fake_service_account_info
+from benchmarks.synthetic import make_zoominfo_frame
+
+AZURITE = (
+    "DefaultEndpointsProtocol=http;AccountName=devstoreaccount1;"
+    "AccountKey=Eby8vdM02xNOcqFlqUwJPLlmEtlCDXJ1OUzFT50uSRZ6IFsuFq2UVErCz4I6tq/K1SZFPTOtr/KBHBeksoGMGw==;"
+    "BlobEndpoint=http://127.0.0.1:10000/devstoreaccount1;"
+)
+
+
+def register_files(psql: PostgresExporter, files: dict) -> pd.DataFrame:
+    rows = pd.DataFrame(
+        [{"id": file_id, "name": file.name, "fileextension": "csv"} for file_id, file in files.items()]
+    )
+    with psql.engine.begin() as connection:
+        for row in rows.itertuples():
+            connection.execute(
+                text(
+                    f"""
+                    INSERT INTO sales_leads.drive_metadata (id, name, fileextension, created_at)
+                    VALUES ('{row.id}', '{row.name}', 'csv', CURRENT_TIMESTAMP)
+                    """
+                )
+            )
+    return rows
+
+
+def reset_files(psql: PostgresExporter, ids: list, delete: bool = False) -> None:
+    id_list = ", ".join(f"'{file_id}'" for file_id in ids)
+    with psql.engine.begin() as connection:
+        if delete:
+            connection.execute(text(f"DELETE FROM sales_leads.drive_metadata WHERE id IN ({id_list})"))
+        else:
+            connection.execute(
+                text(
+                    f"""UPDATE sales_leads.drive_metadata SET content_hash = NULL, duplicate_of = NULL
+                    WHERE id IN ({id_list})"""
+                )
+            )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=20)
+    parser.add_argument("--rows", type=int, default=20_000)
+    parser.add_argument("--latency", type=float, default=0.1, help="seconds per drive request")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--format", default="csv", choices=["csv", "parquet"])
+    args = parser.parse_args()
+
+    folder_id = "bench-folder"
+    files = {
+        folder_id: FakeFile(name="bench", mime_type="application/vnd.google-apps.folder"),
+    }
+    for i in range(args.files):
+        frame = make_zoominfo_frame(args.rows, seed=i).drop(columns=["drive_metadata_uuid"])
+        files[f"bench-{uuid.uuid4()}"] = FakeFile(
+            name=f"bench_{i}.csv", data=frame.to_csv(index=False).encode(), parents=[folder_id]
+        )
+
+    server = FakeDriveServer(files, latency_seconds=args.latency).start()
+    os.environ["DRIVE_API_URL"] = server.api_url
+    gdrive = GoogleDrive(creds=fake_service_account_info(server.token_uri))
+    psql = PostgresExporter(
+        username=os.environ.get("PSQL_USERNAME"),
+        password=os.environ.get("PSQL_PASSWORD"),
+        host=os.environ.get("PSQL_SERVER"),
+        port=os.environ.get("PSQL_PORT"),
+        database=os.environ.get("PSQL_DATABASE"),
+    )
+    az = AzureBlobStorage(connection_string=os.environ.get("AZURITE_CONNECTION_STRING", AZURITE))
+    try:
+        az.blob_service_client.create_container("salesfiles")
+    except Exception:
+        pass
+
+    file_ids = [file_id for file_id in files if file_id != folder_id]
+    files_to_process = register_files(psql, {file_id: files[file_id] for file_id in file_ids})
+    try:
+        start = perf_counter()
+        process_salesfiles(
+            psql, gdrive, az, files_to_process, file_format=args.format, upload_delay_seconds=0
+        )
+        sync_seconds = perf_counter() - start
+
+        reset_files(psql, file_ids)
+        start = perf_counter()
+        run_async_sales_sync(
+            psql,
+            gdrive,
+            az,
+            files_to_process,
+            file_format=args.format,
+            concurrency=args.concurrency,
+            upload_delay_seconds=0,
+        )
+        async_seconds = perf_counter() - start
+    finally:
+        reset_files(psql, file_ids, delete=True)
+        server.shutdown()
+
+    print(f"{args.files} files x {args.rows} rows, {args.latency}s drive latency")
+    print(f"sync:   {sync_seconds:.2f}s ({args.files / sync_seconds:.2f} files/s)")
+    print(f"async:  {async_seconds:.2f}s ({args.files / async_seconds:.2f} files/s, concurrency {args.concurrency})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""Memory, build/lookup time and false positive rate of TrackedEmailFilter.
+
+python -m benchmarks.bench_tracked_email_filter --tracked 1000000 --probes 1000000
+"""
+import argparse
+from time import perf_counter
+
+import numpy as np
+import pandas as pd
+
+from app.data.email_filter import TrackedEmailFilter
+
+
+def make_emails(n: int, prefix: str, seed: int) -> pd.Series:
+    rng = np.random.default_rng(seed)
+    ids = rng.integers(0, np.iinfo(np.int64).max, size=n)
+    return pd.Series([f"{prefix}.{i}@example.com" for i in ids], dtype=object)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tracked", type=int, default=1_000_000)
+    parser.add_argument("--probes", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    tracked = make_emails(args.tracked, "tracked", seed=1)
+    unseen = make_emails(args.probes, "unseen", seed=2)
+
+    start = perf_counter()
+    email_filter = TrackedEmailFilter.from_emails(tracked)
+    build_seconds = perf_counter() - start
+
+    start = perf_counter()
+    hits = email_filter.contains(tracked.sample(min(args.probes, args.tracked), random_state=3))
+    false_positives = email_filter.contains(unseen)
+    lookup_seconds = perf_counter() - start
+
+    print(f"tracked emails:        {args.tracked}")
+    print(f"memory:                {email_filter.memory_bytes / 1024**2:.2f} MiB")
+    print(f"build time:            {build_seconds:.3f}s")
+    print(f"lookup time:           {lookup_seconds:.3f}s for {hits.size + false_positives.size} probes")
+    print(f"true positive rate:    {hits.mean():.6f}")
+    print(f"false positive rate:   {false_positives.mean():.9f} ({false_positives.sum()} of {args.probes})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,382 @@
+"""A stand-in for the drive v3, sheets v4 and slack endpoints the functions call, served locally.
+
+Point the clients at it with DRIVE_API_URL=<server.api_url>,
+GOOGLE_API_URL=<server.base_url> and SLACK_WEBHOOK=<server.slack_url>, and
+build the credentials from fake_service_account_info(<server.token_uri>).
+Every call is counted per endpoint in `server.calls`.
+"""
+from collections import Counter
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread
+from time import sleep
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlparse
+import hashlib
+import json
+import re
+import uuid
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+FOLDER = "application/vnd.google-apps.folder"
+SPREADSHEET = "application/vnd.google-apps.spreadsheet"
+FAKE_TIME = "2030-01-01T00:00:00.000Z"
+
+
+@dataclass
+class FakeFile:
+    name: str
+    data: bytes = b""
+    parents: list = field(default_factory=list)
+    mime_type: str = "text/csv"
+    modified_time: str = FAKE_TIME
+    # spreadsheets only, rows of each tab by title in sheet order.
+    tabs: Optional[Dict[str, List[list]]] = None
+
+    def metadata(self, file_id: str) -> dict:
+        extension = self.name.rsplit(".", 1)[-1] if "." in self.name else None
+        user = {
+            "kind": "drive#user",
+            "displayName": "Bench",
+            "me": True,
+            "permissionId": "0",
+            "emailAddress": "bench@example.com",
+            "photoLink": "",
+        }
+        metadata = {
+            "id": file_id,
+            "name": self.name,
+            "mimeType": self.mime_type,
+            "parents": self.parents,
+            "createdTime": self.modified_time,
+            "modifiedTime": self.modified_time,
+            "owners": [user],
+            "lastModifyingUser": user,
+        }
+        if self.mime_type not in (FOLDER, SPREADSHEET):
+            metadata["fileExtension"] = extension
+            metadata["md5Checksum"] = hashlib.md5(self.data).hexdigest()
+        return metadata
+
+
+def fake_service_account_info(token_uri: str) -> dict:
+    """Service account json with a throwaway key, its tokens come from the fake server."""
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    pem = key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    ).decode()
+    return {
+        "type": "service_account",
+        "project_id": "bench",
+        "private_key_id": "bench",
+        "private_key": pem,
+        "client_email": "bench@bench.iam.gserviceaccount.com",
+        "client_id": "0",
+        "token_uri": token_uri,
+    }
+
+
+def matches_query(file: FakeFile, q: str) -> bool:
+    """The parts of the drive query language the app uses: parents, name and mimeType."""
+    for parent in re.findall(r"['\"]([^'\"]+)['\"]\s+in\s+parents", q) + re.findall(
+        r"parents\s+in\s+['\"]([^'\"]+)['\"]", q
+    ):
+        if parent not in file.parents:
+            return False
+    values = {"name": file.name, "mimeType": file.mime_type}
+    for key, operator, value in re.findall(r"\b(name|mimeType)\s*(!=|=)\s*['\"]([^'\"]*)['\"]", q):
+        if (values[key] == value) != (operator == "="):
+            return False
+    return True
+
+
+def column_index(letters: str) -> int:
+    index = 0
+    for letter in letters:
+        index = index * 26 + ord(letter) - ord("A") + 1
+    return max(index - 1, 0)
+
+
+class FakeDriveServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, files: Dict[str, FakeFile], latency_seconds: float = 0.0, port: int = 0):
+        super().__init__(("127.0.0.1", port), FakeDriveHandler)
+        self.files = files
+        self.latency_seconds = latency_seconds
+        self.requests = 0
+        self.calls = Counter()
+        self.slack_messages = []
+        self.lock = Lock()
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    @property
+    def api_url(self) -> str:
+        return f"{self.base_url}/drive/v3/"
+
+    @property
+    def token_uri(self) -> str:
+        return f"{self.base_url}/token"
+
+    @property
+    def slack_url(self) -> str:
+        return f"{self.base_url}/slack"
+
+    def start(self) -> "FakeDriveServer":
+        Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def add_file(self, file: FakeFile, file_id: Optional[str] = None) -> str:
+        file_id = file_id or f"fake-{uuid.uuid4()}"
+        if file.mime_type == SPREADSHEET and file.tabs is None:
+            file.tabs = {"Sheet1": []}
+        self.files[file_id] = file
+        return file_id
+
+    def sheet_range(self, spreadsheet: FakeFile, a1: str) -> Tuple[str, int, int]:
+        """Tab title and zero based start row and column of an A1 range."""
+        title, _, cells = a1.rpartition("!")
+        if not title:
+            if re.fullmatch(r"[A-Z]+\d*(:[A-Z]+\d*)?", a1):
+                title = f"'{next(iter(spreadsheet.tabs))}'"
+            else:
+                title, cells = a1, "A1"
+        title = title.strip("'").replace("''", "'")
+        start = re.match(r"([A-Z]*)(\d*)", cells.split(":")[0])
+        row = int(start.group(2)) - 1 if start.group(2) else 0
+        return title, row, column_index(start.group(1))
+
+    def write_values(self, spreadsheet: FakeFile, a1: str, values: List[list]) -> int:
+        title, row, column = self.sheet_range(spreadsheet, a1)
+        rows = spreadsheet.tabs.setdefault(title, [])
+        for i, value_row in enumerate(values):
+            while len(rows) <= row + i:
+                rows.append([])
+            target = rows[row + i]
+            if len(target) < column + len(value_row):
+                target.extend([""] * (column + len(value_row) - len(target)))
+            target[column : column + len(value_row)] = [str(value) for value in value_row]
+        return len(values)
+
+    def sheet_metadata(self, spreadsheet_id: str, spreadsheet: FakeFile) -> dict:
+        sheets = []
+        for index, (title, rows) in enumerate(spreadsheet.tabs.items()):
+            sheets.append(
+                {
+                    "properties": {
+                        "sheetId": index,
+                        "title": title,
+                        "index": index,
+                        "sheetType": "GRID",
+                        "gridProperties": {
+                            "rowCount": max(len(rows), 1000),
+                            "columnCount": max((len(row) for row in rows), default=26),
+                        },
+                    }
+                }
+            )
+        return {
+            "spreadsheetId": spreadsheet_id,
+            "properties": {"title": spreadsheet.name, "locale": "en_US", "timeZone": "Etc/GMT"},
+            "sheets": sheets,
+            "spreadsheetUrl": f"https://docs.google.com/spreadsheets/d/{spreadsheet_id}",
+        }
+
+    def batch_update(self, spreadsheet: FakeFile, requests: List[dict]) -> List[dict]:
+        replies = []
+        titles = list(spreadsheet.tabs)
+        for request in requests:
+            if "addSheet" in request:
+                title = request["addSheet"]["properties"]["title"]
+                spreadsheet.tabs.setdefault(title, [])
+                properties = dict(request["addSheet"]["properties"])
+                properties.update(sheetId=list(spreadsheet.tabs).index(title), index=len(titles))
+                replies.append({"addSheet": {"properties": properties}})
+            elif "deleteSheet" in request:
+                spreadsheet.tabs.pop(titles[request["deleteSheet"]["sheetId"]], None)
+                replies.append({})
+            else:
+                replies.append({})
+        return replies
+
+
+class FakeDriveHandler(BaseHTTPRequestHandler):
+    server: FakeDriveServer
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+    def send(self, status: int, body: bytes, content_type: str = "application/json") -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_json(self, body: dict, status: int = 200) -> None:
+        self.send(status, json.dumps(body).encode())
+
+    def not_found(self) -> None:
+        self.send_json({"error": {"code": 404, "message": "Not found", "status": "NOT_FOUND"}}, 404)
+
+    def read_body(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        try:
+            return json.loads(body) if body else {}
+        except ValueError:
+            return {}
+
+    def count(self, call: str) -> None:
+        with self.server.lock:
+            self.server.requests += 1
+            self.server.calls[call] += 1
+        sleep(self.server.latency_seconds)
+
+    def do_GET(self) -> None:
+        self.route("GET")
+
+    def do_POST(self) -> None:
+        self.route("POST")
+
+    def do_PUT(self) -> None:
+        self.route("PUT")
+
+    def do_PATCH(self) -> None:
+        self.route("PATCH")
+
+    def route(self, method: str) -> None:
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        body = self.read_body() if method != "GET" else {}
+        if url.path == "/token":
+            token = {"access_token": "bench", "expires_in": 3600, "token_type": "Bearer"}
+            return self.send_json(token)
+        if url.path == "/slack":
+            self.count("slack webhook")
+            self.server.slack_messages.append(body)
+            return self.send(200, b"ok", "text/plain")
+
+        # googleapiclient sends drive calls under /drive/v3/, gspread under /drive/v3/ too.
+        parts = [unquote(part) for part in url.path.strip("/").split("/")]
+        if parts[:3] == ["drive", "v3", "files"]:
+            return self.drive(method, parts[3:], query, body)
+        if parts[:2] == ["v4", "spreadsheets"] and len(parts) > 2:
+            return self.sheets(method, parts[2:], query, body)
+        self.not_found()
+
+    def drive(self, method: str, parts: list, query: dict, body: dict) -> None:
+        files = self.server.files
+        if not parts:
+            if method == "POST":
+                self.count("drive files.create")
+                file = FakeFile(
+                    name=body.get("name", "Untitled"),
+                    parents=body.get("parents", []),
+                    mime_type=body.get("mimeType", "application/octet-stream"),
+                )
+                with self.server.lock:
+                    file_id = self.server.add_file(file)
+                return self.send_json(file.metadata(file_id))
+
+            self.count("drive files.list")
+            q = query.get("q", [""])[0]
+            with self.server.lock:
+                found = [
+                    file.metadata(file_id)
+                    for file_id, file in list(files.items())
+                    if matches_query(file, q)
+                ]
+            for metadata in found:
+                metadata["title"] = metadata["name"]
+            return self.send_json({"kind": "drive#fileList", "files": found})
+
+        file_id = parts[0]
+        file: Optional[FakeFile] = files.get(file_id)
+        if file is None:
+            self.count("drive files.get")
+            return self.not_found()
+
+        if method == "PATCH":
+            self.count("drive files.update")
+            with self.server.lock:
+                removed = query.get("removeParents", [""])[0].split(",")
+                file.parents = [parent for parent in file.parents if parent not in removed]
+                file.parents += [parent for parent in query.get("addParents", [""])[0].split(",") if parent]
+                if "name" in body:
+                    file.name = body["name"]
+            return self.send_json(file.metadata(file_id))
+
+        if query.get("alt") == ["media"]:
+            self.count("drive files.get_media")
+            return self.send(200, file.data, file.mime_type)
+        self.count("drive files.get")
+        self.send_json(file.metadata(file_id))
+
+    def sheets(self, method: str, parts: list, query: dict, body: dict) -> None:
+        spreadsheet_id, _, action = parts[0].partition(":")
+        spreadsheet: Optional[FakeFile] = self.server.files.get(spreadsheet_id)
+        if spreadsheet is None or spreadsheet.tabs is None:
+            self.count("sheets spreadsheets.get")
+            return self.not_found()
+
+        server = self.server
+        if len(parts) == 1:
+            if action == "batchUpdate":
+                self.count("sheets spreadsheets.batchUpdate")
+                with server.lock:
+                    replies = server.batch_update(spreadsheet, body.get("requests", []))
+                return self.send_json({"spreadsheetId": spreadsheet_id, "replies": replies})
+            self.count("sheets spreadsheets.get")
+            with server.lock:
+                metadata = server.sheet_metadata(spreadsheet_id, spreadsheet)
+            return self.send_json(metadata)
+
+        a1, action = "/".join(parts[2:]), ""
+        for suffix in (":append", ":clear"):
+            if a1.endswith(suffix):
+                a1, action = a1[: -len(suffix)], suffix[1:]
+        if parts[1].startswith("values:"):
+            action = parts[1].partition(":")[2]
+            self.count(f"sheets values.{action}")
+            with server.lock:
+                if action == "batchClear":
+                    for a1 in body.get("ranges", []):
+                        spreadsheet.tabs[server.sheet_range(spreadsheet, a1)[0]] = []
+                    return self.send_json({"spreadsheetId": spreadsheet_id})
+                if action == "batchUpdate":
+                    rows = sum(
+                        server.write_values(spreadsheet, data["range"], data.get("values", []))
+                        for data in body.get("data", [])
+                    )
+                    return self.send_json({"spreadsheetId": spreadsheet_id, "totalUpdatedRows": rows})
+            return self.not_found()
+
+        self.count(f"sheets values.{action or ('update' if method == 'PUT' else 'get')}")
+        with server.lock:
+            title, row, column = server.sheet_range(spreadsheet, a1)
+            rows = spreadsheet.tabs.setdefault(title, [])
+            if action == "append":
+                written = server.write_values(spreadsheet, f"'{title}'!A{len(rows) + 1}", body.get("values", []))
+                return self.send_json({"spreadsheetId": spreadsheet_id, "updates": {"updatedRows": written}})
+            if action == "clear":
+                spreadsheet.tabs[title] = []
+                return self.send_json({"spreadsheetId": spreadsheet_id, "clearedRange": a1})
+            if method == "PUT":
+                written = server.write_values(spreadsheet, a1, body.get("values", []))
+                return self.send_json({"spreadsheetId": spreadsheet_id, "updatedRows": written})
+
+            values = [list(value_row[column:]) for value_row in rows[row:]]
+        if query.get("majorDimension") == ["COLUMNS"]:
+            width = max((len(value_row) for value_row in values), default=0)
+            values = [
+                [value_row[i] if i < len(value_row) else "" for value_row in values]
+                for i in range(width)
+            ]
+        self.send_json({"range": a1, "majorDimension": "ROWS", "values": values})
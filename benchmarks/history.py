@@ -0,0 +1,408 @@
+"""Earlier leads, tracking and city search rows for the benchmarks, so the
+dedupe and metrics queries run against a backlog instead of an empty schema.
+
+seed_history() loads ZoomInfo frames through insert_leads (the e2e harness
+uses it). seed_scale() generates a whole history inside postgres at
+10k/1m/10m leads and swaps dm_shopify.sales_customer_view for a view over a
+generated customer table, e.g.
+
+python -m benchmarks.history --scale 1m
+
+Everything seeded hangs off drive_metadata rows whose id starts with
+bench-history- or bench-scale-, and only a local database is accepted.
+"""
+import argparse
+import logging
+import os
+import uuid
+from dataclasses import dataclass
+from time import perf_counter
+
+import numpy as np
+from sqlalchemy import text
+
+from app import PostgresExporter
+from benchmarks.synthetic import make_zoominfo_frame
+
+HISTORY_CHUNK_ROWS = 50_000
+SCALES = {"10k": 10_000, "1m": 1_000_000, "10m": 10_000_000}
+JOB_TITLES = "ARRAY['Owner', 'Office Manager', 'Facilities Director', 'Operations Manager', 'CFO']"
+CITY_SEARCH_TYPES = "ARRAY['Cleaning service', 'Janitorial service', 'Carpet cleaning service', 'Maid service']"
+
+
+def require_local(psql: PostgresExporter) -> None:
+    if psql.engine.url.host not in ("localhost", "127.0.0.1"):
+        raise SystemExit(f"benchmark data only goes into a local database, not {psql.engine.url.host}")
+
+
+def ensure_shopify_view(psql: PostgresExporter) -> None:
+    """The customer view the lead queries join, as the preview migration creates it."""
+    with psql.engine.begin() as connection:
+        exists = connection.execute(
+            text("SELECT to_regclass('dm_shopify.sales_customer_view') IS NOT NULL")
+        ).scalar()
+        if not exists:
+            connection.execute(text("CREATE SCHEMA IF NOT EXISTS dm_shopify"))
+            connection.execute(
+                text("CREATE VIEW dm_shopify.sales_customer_view AS SELECT 'test' AS email")
+            )
+
+
+def seed_history(
+    psql: PostgresExporter,
+    rows: int,
+    tracked_rate: float = 0.5,
+    seed: int = 1000,
+) -> int:
+    """Loads `rows` earlier ZoomInfo leads in files of HISTORY_CHUNK_ROWS rows and
+    marks `tracked_rate` of them as posted. Returns the number of files seeded."""
+    require_local(psql)
+    files = 0
+    for offset in range(0, rows, HISTORY_CHUNK_ROWS):
+        drive_metadata_uuid = str(uuid.uuid4())
+        with psql.engine.begin() as connection:
+            connection.execute(
+                text(
+                    f"""
+                    INSERT INTO sales_leads.drive_metadata
+                    (uuid, id, name, fileextension, file_type, config_file_uuid, has_been_processed, created_at)
+                    VALUES ('{drive_metadata_uuid}', 'bench-history-{drive_metadata_uuid}',
+                            'bench_history_{files}.csv', 'csv', 'zi_search', gen_random_uuid(), true,
+                            CURRENT_TIMESTAMP - INTERVAL '30 days')
+                    """
+                )
+            )
+        frame = make_zoominfo_frame(
+            min(HISTORY_CHUNK_ROWS, rows - offset),
+            seed=seed + files,
+            drive_metadata_uuid=drive_metadata_uuid,
+        )
+        psql.insert_leads(dataset=frame)
+        with psql.engine.begin() as connection:
+            connection.execute(
+                text(
+                    f"""
+                    INSERT INTO sales_leads.tracking (lead_uuid, status, email_address, created_at)
+                    SELECT uuid, 'posted', email_address, created_at
+                    FROM sales_leads.leads
+                    WHERE drive_metadata_uuid = '{drive_metadata_uuid}'
+                    AND email_address IS NOT NULL
+                    AND random() < {float(np.clip(tracked_rate, 0, 1))}
+                    """
+                )
+            )
+        files += 1
+    return files
+
+
+@dataclass
+class HistoryShape:
+    """Sizes and rates of a generated history, everything scales off `leads`."""
+
+    leads: int
+    rows_per_file: int = 5000
+    # share of rows reusing an email already seen in an earlier row (another contact id).
+    duplicate_email_rate: float = 0.15
+    null_email_rate: float = 0.05
+    tracked_rate: float = 0.6
+    shopify_rate: float = 0.03
+    city_search_ratio: float = 0.5
+    enriched_ratio: float = 0.1
+    franchise_rate: float = 0.05
+    franchises: int = 200
+    seed: float = 0.42
+
+    @property
+    def city_search_rows(self) -> int:
+        return max(1, int(self.leads * self.city_search_ratio))
+
+    @property
+    def enriched_rows(self) -> int:
+        return max(1, int(self.leads * self.enriched_ratio))
+
+    def files(self, rows: int) -> int:
+        return max(1, -(-rows // self.rows_per_file))
+
+
+def reused_id(rate: float) -> str:
+    """SQL for the row's own id, or with probability `rate` an earlier row's id."""
+    return f"CASE WHEN i > 1 AND random() < {rate} THEN 1 + floor(random() * (i - 1))::bigint ELSE i END"
+
+
+def files_cte(kind: str) -> str:
+    return f"""
+    WITH files AS (
+        SELECT uuid, created_at, row_number() OVER (ORDER BY created_at, id) AS n
+        FROM sales_leads.drive_metadata
+        WHERE id LIKE 'bench-scale-{kind}-%'
+    )"""
+
+
+def scale_statements(shape: HistoryShape) -> dict:
+    """The generating statements by table, in load order."""
+    zi_files = shape.files(shape.leads)
+    city_files = shape.files(shape.city_search_rows)
+    statements = {}
+
+    statements["drive_metadata"] = " ; ".join(
+        f"""
+        INSERT INTO sales_leads.drive_metadata
+        (id, name, fileextension, parents, file_type, config_file_uuid, hubspot_owner, zi_search,
+         has_been_processed, has_posted_on_slack, md5checksum, created_at)
+        SELECT 'bench-scale-{kind}-' || i
+             , 'bench_scale_{kind}_' || i || '.csv'
+             , 'csv'
+             , '[''bench-scale-{kind}'']'
+             , '{kind}'::file_type_enum
+             , {"gen_random_uuid()" if kind == "zi_search" else "NULL::uuid"}
+             , 'Bench Owner'
+             , 'synthetic'
+             , true
+             , true
+             , md5('{kind}' || i)
+             , CURRENT_TIMESTAMP - ({files} - i) * INTERVAL '1 hour'
+        FROM generate_series(1, {files}) AS i
+        """
+        for kind, files in (("zi_search", zi_files), ("city_search", city_files))
+    )
+
+    statements["leads"] = f"""
+    {files_cte("zi_search")}
+    INSERT INTO sales_leads.leads
+    (drive_metadata_uuid, zoominfo_contact_id, first_name, last_name, job_title, job_function,
+     direct_phone_number, mobile_phone, email_address, email_domain, company_name, company_country,
+     linkedin_contact_profile_url, query_name, contact_fingerprint, created_at)
+    SELECT f.uuid
+         , c.i::text
+         , 'First' || (c.i % 997)
+         , 'Last' || (c.i % 4999)
+         , ({JOB_TITLES})[1 + c.i % 5]
+         , 'Operations'
+         , (2000000000 + c.i)::text
+         , CASE WHEN c.i % 3 = 0 THEN (3000000000 + c.i)::text END
+         , c.email
+         , split_part(c.email, '@', 2)
+         , 'Company ' || (c.email_id % 20000) || ' LLC'
+         , CASE WHEN c.i % 10 = 0 THEN 'Canada' ELSE 'United States' END
+         , 'https://www.linkedin.com/in/contact' || c.i
+         , 'synthetic'
+         , md5(lower(trim(coalesce(c.email, ''))) || '|' || c.i::text)
+         , f.created_at
+    FROM (
+        SELECT i, email_id
+             , CASE WHEN random() >= {shape.null_email_rate}
+                    THEN 'contact' || email_id || '@company' || (email_id % 20000) || '.com' END AS email
+        FROM (
+            SELECT i, {reused_id(shape.duplicate_email_rate)} AS email_id
+            FROM generate_series(1, {shape.leads}) AS i
+        ) ids
+    ) c
+    JOIN files f
+      ON f.n = (c.i - 1) / {shape.rows_per_file} + 1
+    """
+
+    statements["city_search_franchises"] = f"""
+    INSERT INTO sales_leads.city_search_franchises (franchise_name, domain_name, created_at)
+    SELECT 'Bench Franchise ' || i, 'https://www.benchfranchise' || i || '.com', CURRENT_TIMESTAMP
+    FROM generate_series(1, {shape.franchises}) AS i
+    """
+
+    statements["city_search"] = f"""
+    {files_cte("city_search")}
+    INSERT INTO sales_leads.city_search
+    (drive_metadata_uuid, type, phone, title, dataid, rating, placeid, reviews, website, position,
+     address, keyword_keyword, gpscoordinates_latitude, gpscoordinates_longitude, emails_0, emails_1, created_at)
+    SELECT f.uuid
+         , ({CITY_SEARCH_TYPES})[1 + p.place_id % 4]
+         , (2000000000 + p.place_id)::text
+         , 'Place ' || p.place_id || ' Cleaning'
+         , '0x' || to_hex(p.place_id)
+         , (3 + (p.place_id % 5) / 2.0)::text
+         , 'ChIJ' || p.place_id
+         , (p.place_id % 500)::text
+         , CASE WHEN random() < {shape.franchise_rate}
+                THEN 'https://www.benchfranchise' || (1 + p.place_id % {shape.franchises}) || '.com/locations/' || p.place_id
+                ELSE 'https://www.place' || p.place_id || '.com/' END
+         , (1 + p.i % 100)::text
+         , (p.place_id % 9999) || ' Main St'
+         , 'cleaning'
+         , (25 + (p.place_id % 2300) / 100.0)::text
+         , (-122 + (p.place_id % 5200) / 100.0)::text
+         , 'info' || p.place_id || '@example.com'
+         , CASE WHEN p.place_id % 2 = 0 THEN 'sales' || p.place_id || '@example.com' END
+         , f.created_at
+    FROM (
+        SELECT i, {reused_id(shape.duplicate_email_rate)} AS place_id
+        FROM generate_series(1, {shape.city_search_rows}) AS i
+    ) p
+    JOIN files f
+      ON f.n = (p.i - 1) / {shape.rows_per_file} + 1
+    """
+
+    statements["city_search_enriched"] = f"""
+    {files_cte("city_search")}
+    INSERT INTO sales_leads.city_search_enriched
+    (drive_metadata_uuid, first_name, last_name, main_point_of_contact_email, main_contact_linkedin,
+     generic_contact_email, company_name, website, phone, created_at)
+    SELECT f.uuid
+         , 'First' || (e.i % 997)
+         , 'Last' || (e.i % 4999)
+         , CASE WHEN e.i % 3 <> 0 THEN 'owner' || e.email_id || '@place' || e.email_id || '.com' END
+         , 'https://www.linkedin.com/in/owner' || e.i
+         , 'info' || e.email_id || '@example.com'
+         , 'Place ' || e.email_id || ' Cleaning'
+         , 'https://www.place' || e.email_id || '.com/'
+         , (2000000000 + e.email_id)::text
+         , f.created_at
+    FROM (
+        SELECT i, {reused_id(shape.duplicate_email_rate)} AS email_id
+        FROM generate_series(1, {shape.enriched_rows}) AS i
+    ) e
+    JOIN files f
+      ON f.n = (e.i - 1) / {max(1, shape.rows_per_file // 5)} % (SELECT count(*) FROM files) + 1
+    """
+
+    statements["tracking"] = f"""
+    INSERT INTO sales_leads.tracking (lead_uuid, status, email_address, created_at)
+    SELECT l.uuid
+         , (CASE WHEN random() < 0.05 THEN 'emailed' ELSE 'posted' END)::status_enum
+         , l.email_address
+         , l.created_at + INTERVAL '10 minutes'
+    FROM sales_leads.leads l
+    INNER JOIN sales_leads.drive_metadata d
+      ON d.uuid = l.drive_metadata_uuid
+    WHERE d.id LIKE 'bench-scale-zi_search-%'
+    AND l.email_address IS NOT NULL
+    AND random() < {shape.tracked_rate}
+    ;
+    INSERT INTO sales_leads.tracking (city_search_lead_uuid, status, email_address, created_at)
+    SELECT c.uuid
+         , 'posted'::status_enum
+         , COALESCE(c.main_point_of_contact_email, c.generic_contact_email)
+         , c.created_at + INTERVAL '10 minutes'
+    FROM sales_leads.city_search_enriched c
+    INNER JOIN sales_leads.drive_metadata d
+      ON d.uuid = c.drive_metadata_uuid
+    WHERE d.id LIKE 'bench-scale-city_search-%'
+    AND random() < {shape.tracked_rate}
+    """
+
+    # a view over a plain customer table, emails not indexed as nothing
+    # guarantees that on the real view.
+    statements["sales_customer_view"] = f"""
+    CREATE SCHEMA IF NOT EXISTS dm_shopify
+    ;
+    CREATE TABLE IF NOT EXISTS dm_shopify.bench_customers (
+        customer_id bigserial PRIMARY KEY
+      , email varchar(255)
+    )
+    ;
+    INSERT INTO dm_shopify.bench_customers (email)
+    SELECT email_address
+    FROM sales_leads.leads
+    WHERE email_address IS NOT NULL
+    AND random() < {shape.shopify_rate}
+    UNION ALL
+    SELECT 'customer' || i || '@shop.example.com'
+    FROM generate_series(1, {max(1, int(shape.leads * shape.shopify_rate))}) AS i
+    ;
+    DROP VIEW IF EXISTS dm_shopify.sales_customer_view
+    ;
+    CREATE VIEW dm_shopify.sales_customer_view AS
+    SELECT email FROM dm_shopify.bench_customers
+    """
+    return statements
+
+
+def clear_scale(psql: PostgresExporter) -> None:
+    """Removes a generated history, dependents first."""
+    require_local(psql)
+    bench_files = "SELECT uuid FROM sales_leads.drive_metadata WHERE id LIKE 'bench-scale-%'"
+    statements = [
+        f"""DELETE FROM sales_leads.tracking WHERE lead_uuid IN
+            (SELECT uuid FROM sales_leads.leads WHERE drive_metadata_uuid IN ({bench_files}))""",
+        f"""DELETE FROM sales_leads.tracking WHERE city_search_lead_uuid IN
+            (SELECT uuid FROM sales_leads.city_search_enriched WHERE drive_metadata_uuid IN ({bench_files}))""",
+        f"DELETE FROM sales_leads.lead_sightings WHERE drive_metadata_uuid IN ({bench_files})",
+        f"DELETE FROM sales_leads.leads WHERE drive_metadata_uuid IN ({bench_files})",
+        f"DELETE FROM sales_leads.city_search WHERE drive_metadata_uuid IN ({bench_files})",
+        f"DELETE FROM sales_leads.city_search_enriched WHERE drive_metadata_uuid IN ({bench_files})",
+        f"DELETE FROM sales_leads.drive_metadata_metrics WHERE drive_metadata_uuid IN ({bench_files})",
+        "DELETE FROM sales_leads.drive_metadata WHERE id LIKE 'bench-scale-%'",
+        "DELETE FROM sales_leads.city_search_franchises WHERE franchise_name LIKE 'Bench Franchise %'",
+        "DROP TABLE IF EXISTS dm_shopify.bench_customers CASCADE",
+    ]
+    with psql.engine.begin() as connection:
+        for statement in statements:
+            connection.execute(text(statement))
+    # dropping the customer table took its view along.
+    ensure_shopify_view(psql)
+
+
+def seed_scale(psql: PostgresExporter, shape: HistoryShape) -> dict:
+    """Replaces any generated history with one of `shape` and returns the
+    seconds each table took. The per file metrics are rebuilt by the app's
+    own backfill and the tables analyzed, so plans see the new sizes."""
+    require_local(psql)
+    clear_scale(psql)
+    timings = {}
+    with psql.engine.begin() as connection:
+        connection.execute(text(f"SELECT setseed({shape.seed})"))
+        for table, statement in scale_statements(shape).items():
+            start = perf_counter()
+            for part in statement.split(";"):
+                if part.strip():
+                    connection.execute(text(part))
+            timings[table] = perf_counter() - start
+            logging.info(f"Generated {table} in {timings[table]:.1f}s")
+
+    start = perf_counter()
+    psql.backfill_drive_metadata_metrics()
+    timings["drive_metadata_metrics"] = perf_counter() - start
+
+    with psql.engine.begin() as connection:
+        for table in ("drive_metadata", "leads", "tracking", "city_search", "city_search_enriched",
+                      "city_search_franchises", "drive_metadata_metrics"):
+            connection.execute(text(f"ANALYZE sales_leads.{table}"))
+        connection.execute(text("ANALYZE dm_shopify.bench_customers"))
+    return timings
+
+
+def bench_psql() -> PostgresExporter:
+    """PostgresExporter from the PSQL_* settings, defaulting to docker-compose.local.yml."""
+    return PostgresExporter(
+        username=os.environ.get("PSQL_USERNAME", "root"),
+        password=os.environ.get("PSQL_PASSWORD", "root"),
+        host=os.environ.get("PSQL_SERVER", "localhost"),
+        port=os.environ.get("PSQL_PORT", "5432"),
+        database=os.environ.get("PSQL_DATABASE", "postgres"),
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scale", default="10k", choices=list(SCALES))
+    parser.add_argument("--duplicate-email-rate", type=float, default=0.15)
+    parser.add_argument("--tracked-rate", type=float, default=0.6)
+    parser.add_argument("--shopify-rate", type=float, default=0.03)
+    parser.add_argument("--clear", action="store_true", help="only remove a generated history")
+    args = parser.parse_args()
+
+    psql = bench_psql()
+    if args.clear:
+        clear_scale(psql)
+        return
+
+    shape = HistoryShape(
+        leads=SCALES[args.scale],
+        duplicate_email_rate=args.duplicate_email_rate,
+        tracked_rate=args.tracked_rate,
+        shopify_rate=args.shopify_rate,
+    )
+    timings = seed_scale(psql, shape)
+    for table, seconds in timings.items():
+        print(f"{table:<28}{seconds:>8.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+"""Plan regression guard for the production queries.
+
+Plans every query of benchmarks/queries.py with EXPLAIN (FORMAT JSON) against
+a seeded local database, nothing is executed, and flags
+
+- sequential scans on tables above --large-rows,
+- nested loops over city_search_franchises,
+- a total cost more than --cost-threshold above benchmarks/plan_baseline.json.
+
+python -m benchmarks.history --scale 1m
+python -m benchmarks.plan_guard --scale 1m --update-baseline   # accept the current plans
+python -m benchmarks.plan_guard --scale 1m                     # exit 1 on a regression
+
+Findings already present in the baseline are accepted, so only plans that
+flip after a change are reported.
+
+Every *_query builder of PostgresExporter, SalesTransformations and
+ProcessingLedger has to be in the catalogue. Every other function of app/ or
+function_app.py holding a SQL statement has to be in EXEMPT, with the reason
+it isn't planned, so a new inline statement fails the guard until it is
+either planned or exempted.
+"""
+import argparse
+import ast
+import inspect
+import json
+import re
+import sys
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List
+
+from sqlalchemy import text
+
+from app import PostgresExporter, ProcessingLedger, SalesTransformations
+from benchmarks.history import SCALES, bench_psql
+from benchmarks.queries import explain, production_queries, sample_files
+
+BASELINE = Path(__file__).parent / "plan_baseline.json"
+FRANCHISES = "city_search_franchises"
+ROOT = Path(__file__).resolve().parent.parent
+SOURCES = [*sorted((ROOT / "app").rglob("*.py")), ROOT / "function_app.py"]
+SQL_STATEMENT = re.compile(
+    r"^\s*(SELECT|INSERT|UPDATE|DELETE|WITH|CREATE|ALTER|DROP|TRUNCATE|COPY|ANALYZE|VACUUM|SET|LOCK)\s"
+)
+
+# functions whose statements aren't planned, by qualified name.
+DDL = "DDL or a staging table"
+MAINTENANCE = "one-off maintenance"
+CONFIG = "the config sync, a few hundred rows"
+BY_KEY = "a lookup or write by id, uuid or primary key"
+EXEMPT = {
+    "AzureExporter.scale_database": MAINTENANCE,
+    "PostgresExporter.check_if_schema_exists": DDL,
+    "PostgresExporter.copy_dataframe": DDL,
+    "PostgresExporter.clear_ingest_checkpoints": BY_KEY,
+    "PostgresExporter.insert_leads_checkpointed": BY_KEY,
+    "PostgresExporter.check_if_record_exists": BY_KEY,
+    "PostgresExporter.get_uuid_from_table": BY_KEY,
+    "PostgresExporter._increment_metrics_query": "a fragment of the tracking queries, planned with them",
+    "PostgresExporter.backfill_drive_metadata_metrics": MAINTENANCE,
+    "PostgresExporter.get_sync_state": CONFIG,
+    "PostgresExporter.set_sync_state": CONFIG,
+    "PostgresExporter.merge_config_rows": CONFIG,
+    "PostgresExporter.update_config_metadata": CONFIG,
+    "PostgresExporter.get_and_post_missing_config": CONFIG,
+    "PostgresExporter.update_drive_table_slack_posted": BY_KEY,
+    "PostgresExporter.upsert_franchise_data": DDL,
+    "PostgresExporter.sync_franchise_data": CONFIG,
+    "PostgresExporter.get_missing_file_types": CONFIG,
+    "PostgresExporter.update_file_types": DDL,
+    "PostgresExporter.update_file_has_been_processed": BY_KEY,
+    "PostgresExporter.update_files_have_been_processed": BY_KEY,
+    "PostgresExporter.get_processed_file_ids": BY_KEY,
+    "PostgresExporter.check_if_file_has_been_processed": BY_KEY,
+    "PostgresExporter.change_file_ext_name_to_csv": BY_KEY,
+    "PostgresExporter.get_columns_from_table": "information_schema",
+    "PostgresExporter.enqueue_outbox_event": BY_KEY,
+    "PostgresExporter.release_outbox_event": BY_KEY,
+    "PostgresExporter.complete_outbox_event": BY_KEY,
+    "PostgresExporter.fail_outbox_event": BY_KEY,
+    "TrackedEmailFilter.refresh": "a full read of two small tables",
+    "SheetFingerprintIndex.get": BY_KEY,
+    "SheetFingerprintIndex.add": BY_KEY,
+    "SheetFingerprintIndex.clear": BY_KEY,
+    "ProcessingLedger.start": BY_KEY,
+    "ProcessingLedger.finish": BY_KEY,
+    "SpreadsheetIdCache.get": BY_KEY,
+    "SpreadsheetIdCache.set": BY_KEY,
+    "SpreadsheetIdCache.invalidate": BY_KEY,
+    "SalesTransformations.post_city_search_data_to_google_sheet": BY_KEY,
+    "AsyncSalesSync.download_and_parse": BY_KEY,
+}
+
+
+def query_builders() -> List[str]:
+    """The public *_query builders of the classes, which the catalogue has to cover."""
+    return [
+        name
+        for cls in (PostgresExporter, SalesTransformations, ProcessingLedger)
+        for name, _ in inspect.getmembers(cls, inspect.isfunction)
+        if name.endswith("_query") and not name.startswith("_")
+    ]
+
+
+class StatementFinder(ast.NodeVisitor):
+    """Collects the string and f-string literals that are SQL statements, by
+    the qualified name of the function holding them. Docstrings are skipped."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.scope: List[str] = []
+        self.docstrings = set()
+        self.statements: Dict[str, List[str]] = {}
+
+    def visit_scope(self, node: ast.AST) -> None:
+        body = getattr(node, "body", [])
+        if body and isinstance(body[0], ast.Expr) and isinstance(body[0].value, ast.Constant):
+            self.docstrings.add(id(body[0].value))
+        self.scope.append(getattr(node, "name", ""))
+        self.generic_visit(node)
+        self.scope.pop()
+
+    visit_Module = visit_ClassDef = visit_FunctionDef = visit_AsyncFunctionDef = visit_scope
+
+    def visit_Constant(self, node: ast.Constant) -> None:
+        if isinstance(node.value, str) and id(node) not in self.docstrings:
+            self.found(node, node.value)
+
+    def visit_JoinedStr(self, node: ast.JoinedStr) -> None:
+        # only the leading text matters, the interpolated values are left out.
+        self.found(node, "".join(v.value for v in node.values if isinstance(v, ast.Constant)))
+
+    def found(self, node: ast.AST, literal: str) -> None:
+        if SQL_STATEMENT.match(literal):
+            name = ".".join(part for part in self.scope if part) or self.path.name
+            location = f"{self.path.relative_to(ROOT)}:{node.lineno}"
+            self.statements.setdefault(name, []).append(location)
+
+
+def sql_statements(sources: Iterable[Path] = SOURCES) -> Dict[str, List[str]]:
+    """The locations of the SQL statements in `sources`, by the qualified name
+    of the function holding them."""
+    statements = {}
+    for path in sources:
+        finder = StatementFinder(path)
+        finder.visit(ast.parse(path.read_text(), filename=str(path)))
+        for name, locations in finder.statements.items():
+            statements.setdefault(name, []).extend(locations)
+    return statements
+
+
+def unplanned_statements(planned: Iterable[str]) -> List[str]:
+    """Statements neither built by a planned *_query builder nor in EXEMPT, and
+    EXEMPT entries that no longer hold a statement."""
+    planned = set(planned)
+    statements = sql_statements()
+    problems = [
+        f"{name}: SQL at {', '.join(locations)} is neither planned nor in EXEMPT"
+        for name, locations in statements.items()
+        if name.rsplit(".", 1)[-1] not in planned and name not in EXEMPT
+    ]
+    problems.extend(
+        f"{name}: in EXEMPT but holds no SQL statement, remove it"
+        for name in EXEMPT
+        if name not in statements
+    )
+    return problems
+
+
+def table_rows(psql: PostgresExporter) -> Dict[str, int]:
+    with psql.engine.connect() as connection:
+        rows = connection.execute(
+            text(
+                """
+                SELECT c.relname, c.reltuples::bigint
+                FROM pg_class c
+                INNER JOIN pg_namespace n
+                  ON n.oid = c.relnamespace
+                WHERE c.relkind IN ('r', 'p', 'm')
+                  AND n.nspname NOT IN ('pg_catalog', 'information_schema')
+                """
+            )
+        ).fetchall()
+    return {name: tuples for name, tuples in rows}
+
+
+def nodes(plan: dict) -> Iterator[dict]:
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from nodes(child)
+
+
+def findings(plan: dict, rows: Dict[str, int], large_rows: int) -> List[str]:
+    found = []
+    for node in nodes(plan["Plan"]):
+        relation = node.get("Relation Name")
+        if node["Node Type"] == "Seq Scan" and rows.get(relation, 0) >= large_rows:
+            found.append(f"seq scan on {relation} ({rows[relation]} rows)")
+        if node["Node Type"] == "Nested Loop" and any(
+            child.get("Relation Name") == FRANCHISES for child in nodes(node)
+        ):
+            found.append(f"nested loop over {FRANCHISES}")
+    return sorted(set(found))
+
+
+def load_baseline(path: Path) -> dict:
+    if not path.exists():
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scale", default="10k", choices=list(SCALES), help="the seeded history size")
+    parser.add_argument("--baseline", type=Path, default=BASELINE)
+    parser.add_argument("--large-rows", type=int, default=10_000, help="tables a seq scan is flagged on")
+    parser.add_argument("--cost-threshold", type=float, default=0.25, help="allowed relative cost increase")
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args()
+
+    psql = bench_psql()
+    st = SalesTransformations(engine=psql.engine)
+    queries = production_queries(psql, st, sample_files(psql))
+    rows = table_rows(psql)
+    baseline = load_baseline(args.baseline)
+    accepted = baseline.get(args.scale, {})
+
+    plans, regressions = {}, []
+    for builder in query_builders():
+        if builder not in queries:
+            regressions.append(f"{builder}: not in benchmarks/queries.py, its plan is unchecked")
+    regressions.extend(unplanned_statements(queries))
+
+    for name, query in queries.items():
+        plan = explain(psql, query, analyze=False)
+        cost = plan["Plan"]["Total Cost"]
+        found = findings(plan, rows, args.large_rows)
+        plans[name] = {"total_cost": cost, "findings": found}
+
+        previous = accepted.get(name)
+        if previous is None:
+            regressions.extend(f"{name}: {finding}" for finding in found)
+            print(f"{name:<40}{cost:>14.1f}{'new':>10}")
+            continue
+        regressions.extend(
+            f"{name}: {finding}" for finding in found if finding not in previous["findings"]
+        )
+        change = cost / previous["total_cost"] - 1 if previous["total_cost"] else 0
+        if change > args.cost_threshold:
+            regressions.append(
+                f"{name}: cost {previous['total_cost']:.1f} -> {cost:.1f} (+{change:.0%})"
+            )
+        print(f"{name:<40}{cost:>14.1f}{change:>+10.0%}")
+
+    if args.update_baseline:
+        baseline[args.scale] = plans
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"baseline for {args.scale} written to {args.baseline}")
+        return
+
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""The production queries of PostgresExporter, SalesTransformations and
+ProcessingLedger, built by their own *_query methods for files picked out of
+the seeded history."""
+from typing import Dict
+
+import pandas as pd
+from sqlalchemy import text
+
+from app import PostgresExporter, ProcessingLedger, SalesTransformations
+
+
+def sample_files(psql: PostgresExporter) -> dict:
+    """The largest zi search and city search files, and the ids of the latest
+    drop, which is what a sales_sync run works on."""
+    with psql.engine.connect() as connection:
+        zi_search = connection.execute(
+            text(
+                """
+                SELECT d.uuid, d.id, d.name
+                FROM sales_leads.drive_metadata d
+                INNER JOIN sales_leads.leads l
+                  ON l.drive_metadata_uuid = d.uuid
+                WHERE d.file_type = 'zi_search'
+                GROUP BY d.uuid, d.id, d.name
+                ORDER BY count(*) DESC
+                LIMIT 1
+                """
+            )
+        ).mappings().first()
+        city_search = connection.execute(
+            text(
+                """
+                SELECT d.uuid, d.id, d.name
+                FROM sales_leads.drive_metadata d
+                INNER JOIN sales_leads.city_search c
+                  ON c.drive_metadata_uuid = d.uuid
+                WHERE d.file_type = 'city_search'
+                GROUP BY d.uuid, d.id, d.name
+                ORDER BY count(*) DESC
+                LIMIT 1
+                """
+            )
+        ).mappings().first()
+        latest_ids = connection.execute(
+            text("SELECT id FROM sales_leads.drive_metadata ORDER BY created_at DESC LIMIT 50")
+        ).scalars().all()
+    if zi_search is None or city_search is None:
+        raise SystemExit("no seeded history, run python -m benchmarks.history first")
+
+    sample_rows = pd.read_sql(
+        f"SELECT * FROM sales_leads.leads WHERE drive_metadata_uuid = '{zi_search['uuid']}' LIMIT 1000",
+        psql.engine,
+    )
+    return {
+        "zi_search": dict(zi_search),
+        "city_search": dict(city_search),
+        "latest_ids": list(latest_ids),
+        "sample_rows": sample_rows,
+    }
+
+
+def production_queries(
+    psql: PostgresExporter, st: SalesTransformations, sample: dict
+) -> Dict[str, str]:
+    zi_search, city_search = sample["zi_search"], sample["city_search"]
+    ledger = ProcessingLedger(engine=psql.engine)
+    return {
+        "new_zi_search_lead_query": st.new_zi_search_lead_query(zi_search["name"]),
+        "new_zi_search_batch_lead_query": st.new_zi_search_batch_lead_query(sample["latest_ids"]),
+        "new_city_search_lead_query": st.new_city_search_lead_query(city_search["id"]),
+        "city_search_output_query": st.city_search_output_query(city_search["id"]),
+        "tracking_query": psql.tracking_query(zi_search["uuid"]),
+        "shopify_tracking_query": psql.shopify_tracking_query(zi_search["uuid"]),
+        "city_search_tracking_query": psql.city_search_tracking_query(city_search["uuid"]),
+        "city_search_shopify_tracking_query": psql.city_search_shopify_tracking_query(city_search["uuid"]),
+        "slack_channel_metrics_query": psql.slack_channel_metrics_query(zi_search["uuid"]),
+        "files_to_process_query": psql.files_to_process_query(sample["latest_ids"]),
+        "duplicate_files_query": psql.duplicate_files_query(sample["latest_ids"]),
+        "duplicate_content_query": psql.duplicate_content_query(zi_search["id"], sample["sample_rows"]),
+        "lead_sightings_query": psql.lead_sightings_query(
+            sample["sample_rows"][["contact_fingerprint", "drive_metadata_uuid"]]
+        ),
+        "ingest_checkpoint_query": psql.ingest_checkpoint_query(zi_search["id"], sample["sample_rows"].shape[0]),
+        "claim_outbox_events_query": psql.claim_outbox_events_query(),
+        "expire_outbox_events_query": psql.expire_outbox_events_query(),
+        "unwritten_sheet_events_query": psql.unwritten_sheet_events_query([zi_search["uuid"]]),
+        "failed_files_query": ledger.failed_files_query("sales_sync"),
+        "latency_report_query": ledger.latency_report_query(),
+    }
+
+
+def explain(psql: PostgresExporter, query: str, analyze: bool = True) -> dict:
+    """The json plan of the query. With analyze it really runs, inside a
+    transaction that is rolled back, so the tracking updates change nothing."""
+    options = "ANALYZE, BUFFERS, FORMAT JSON" if analyze else "FORMAT JSON"
+    with psql.engine.connect() as connection:
+        transaction = connection.begin()
+        try:
+            plan = connection.execute(text(f"EXPLAIN ({options}) {query.strip().rstrip(';')}")).scalar()
+        finally:
+            transaction.rollback()
+    return plan[0]
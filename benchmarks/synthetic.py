@@ -0,0 +1,121 @@
+"""Synthetic ZoomInfo and city search exports shaped like the files dropped in the salesfiles drive."""
+from typing import Optional
+import uuid
+
+import numpy as np
+import pandas as pd
+
+FIRST_NAMES = ["James", "Mary", "Robert", "Patricia", "John", "Jennifer", "Michael", "Linda"]
+LAST_NAMES = ["Smith", "Johnson", "Williams", "Brown", "Jones", "Garcia", "Miller", "Davis"]
+JOB_TITLES = ["Owner", "Office Manager", "Facilities Director", "Operations Manager", "CFO"]
+STATES = ["TX", "CA", "FL", "NY", "IL", "OH", "GA", "NC"]
+INDUSTRIES = ["Hospitality", "Retail", "Healthcare", "Education", "Real Estate"]
+
+
+def make_zoominfo_frame(
+    rows: int,
+    duplicate_rate: float = 0.1,
+    null_rate: float = 0.05,
+    seed: Optional[int] = 0,
+    drive_metadata_uuid: Optional[str] = None,
+) -> pd.DataFrame:
+    """A ZoomInfo export with raw headers, as process_file would read it.
+
+    `duplicate_rate` of the rows repeat a contact seen earlier in the frame,
+    `null_rate` of the optional fields are blank.
+    """
+    rng = np.random.default_rng(seed)
+    unique = max(1, int(rows * (1 - duplicate_rate)))
+    contact_ids = rng.integers(10**8, 10**9, size=unique)
+    contacts = np.concatenate([contact_ids, rng.choice(contact_ids, size=rows - unique)])
+    rng.shuffle(contacts)
+
+    first = rng.choice(FIRST_NAMES, size=rows)
+    last = rng.choice(LAST_NAMES, size=rows)
+    domain = pd.Series(contacts % 5000).map("company{}.com".format)
+
+    df = pd.DataFrame(
+        {
+            "ZoomInfo Contact ID": contacts.astype(str),
+            "Last Name": last,
+            "First Name": first,
+            "Job Title": rng.choice(JOB_TITLES, size=rows),
+            "Direct Phone Number": pd.Series(rng.integers(2000000000, 9999999999, size=rows)).astype(str),
+            "Email Address": (
+                pd.Series(first).str.lower() + "." + pd.Series(contacts).astype(str) + "@" + domain
+            ),
+            "Email Domain": domain,
+            "Person City": rng.choice(["Austin", "Dallas", "Miami", "Chicago"], size=rows),
+            "Person State": rng.choice(STATES, size=rows),
+            "Company Name": pd.Series(contacts % 5000).map("Company {} LLC".format),
+            "Website": "www." + domain,
+            "Employees": rng.integers(1, 5000, size=rows).astype(str),
+            "Primary Industry": rng.choice(INDUSTRIES, size=rows),
+            "Company State": rng.choice(STATES, size=rows),
+            "Company Zip Code": pd.Series(rng.integers(10000, 99999, size=rows)).astype(str),
+            "Company Country": "United States",
+            "Query Name": "synthetic",
+        }
+    )
+
+    optional = ["Job Title", "Direct Phone Number", "Person City", "Employees"]
+    for column in optional:
+        df.loc[rng.random(rows) < null_rate, column] = np.nan
+
+    df["drive_metadata_uuid"] = drive_metadata_uuid or str(uuid.uuid4())
+    return df
+
+
+CITY_SEARCH_TYPES = ["Cleaning service", "Janitorial service", "Carpet cleaning service", "Maid service"]
+
+
+def make_city_search_frame(
+    rows: int,
+    duplicate_rate: float = 0.1,
+    null_rate: float = 0.05,
+    seed: Optional[int] = 0,
+    franchise_domains: Optional[list] = None,
+) -> pd.DataFrame:
+    """A google maps city search export with raw headers, as process_file would read it.
+
+    `duplicate_rate` of the rows repeat a place seen earlier in the frame,
+    rows on one of `franchise_domains` come out as franchise rows.
+    """
+    rng = np.random.default_rng(seed)
+    unique = max(1, int(rows * (1 - duplicate_rate)))
+    place_ids = rng.integers(10**11, 10**12, size=unique)
+    places = np.concatenate([place_ids, rng.choice(place_ids, size=rows - unique)])
+    rng.shuffle(places)
+
+    domain = pd.Series(places % 20000).map("https://www.place{}.com/".format)
+    if franchise_domains:
+        is_franchise = rng.random(rows) < 0.1
+        domain[is_franchise] = rng.choice(franchise_domains, size=is_franchise.sum())
+
+    df = pd.DataFrame(
+        {
+            "type": rng.choice(CITY_SEARCH_TYPES, size=rows),
+            "phone": pd.Series(rng.integers(2000000000, 9999999999, size=rows)).astype(str),
+            "title": pd.Series(places % 20000).map("Place {} Cleaning".format),
+            "dataId": pd.Series(places).map("0x{:x}".format),
+            "rating": rng.choice(["3.5", "4.0", "4.5", "5.0"], size=rows),
+            "placeId": pd.Series(places).map("ChIJ{}".format),
+            "reviews": rng.integers(0, 500, size=rows).astype(str),
+            "website": domain,
+            "position": rng.integers(1, 100, size=rows).astype(str),
+            "thumbnail": "",
+            "address": rng.integers(1, 9999, size=rows).astype(str) + " Main St",
+            "keyword.ll": "@30.2672,-97.7431,14z",
+            "keyword.keyword": "cleaning",
+            "gpsCoordinates.latitude": rng.uniform(25, 48, size=rows).round(6).astype(str),
+            "gpsCoordinates.longitude": rng.uniform(-122, -70, size=rows).round(6).astype(str),
+            "serviceOptions.0": "Onsite services",
+            "emails.0": pd.Series(places).map("info{}@example.com".format),
+            "emails.1": pd.Series(places).map("sales{}@example.com".format),
+        }
+    )
+
+    for column in ["phone", "website", "emails.0", "emails.1"]:
+        df.loc[rng.random(rows) < null_rate, column] = np.nan
+
+    return df
@@ -0,0 +1,116 @@
+import argparse
+import logging
+import os
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+import pandas as pd
+
+from app import (
+    AzureBlobStorage,
+    PostgresExporter,
+    ProcessingLedger,
+    ingest_queue_name,
+    load_local_settings_as_env_vars,
+)
+
+load_dotenv()
+
+logging.basicConfig(level=logging.INFO)
+
+settings_files = {
+    "preview": "local.settings.dev.json",
+    "pre_prod": "local.settings.pre_prod.json",
+    "prod": "local.settings.json",
+}
+
+
+def load_settings() -> None:
+    environment = os.environ.get("FUNCTIONS_ENVIRONMENT")
+    if environment in settings_files:
+        logging.info(f"Loading {environment} settings")
+        load_local_settings_as_env_vars(
+            Path(__file__).parent.joinpath(settings_files[environment])
+        )
+
+
+def create_psql() -> PostgresExporter:
+    return PostgresExporter(
+        username=os.environ.get("PSQL_USERNAME"),
+        password=os.environ.get("PSQL_PASSWORD"),
+        host=os.environ.get("PSQL_SERVER"),
+        port=os.environ.get("PSQL_PORT"),
+        database=os.environ.get("PSQL_DATABASE"),
+    )
+
+
+def backfill_metrics(args: argparse.Namespace) -> None:
+    psql = create_psql()
+    psql.backfill_drive_metadata_metrics()
+    logging.info("Backfilled sales_leads.drive_metadata_metrics")
+
+
+def ledger_report(args: argparse.Namespace) -> None:
+    ledger = ProcessingLedger(engine=create_psql().engine)
+    with pd.option_context("display.width", 200, "display.max_columns", None):
+        print(f"Stage latency over the last {args.days} days")
+        print(ledger.latency_report(days=args.days).to_string(index=False))
+        for source in ["sales_sync", "zi_search_blob"]:
+            failed = ledger.failed_files(source=source, max_attempts=args.max_attempts)
+            print(f"\nFailed or stuck {source} files: {failed.shape[0]}")
+            if not failed.empty:
+                print(failed.to_string(index=False))
+
+
+def resume_ingest(args: argparse.Namespace) -> None:
+    """Re-runs the ingest of failed files from the uploaded blob rather than
+    going back to drive, through the ingest queue with ZI_SEARCH_INGEST=queue
+    and the blob trigger otherwise."""
+    ledger = ProcessingLedger(engine=create_psql().engine)
+    az = AzureBlobStorage(
+        connection_string=os.environ.get("SalesSyncBlogTrigger"),
+        ingest_queue_name=ingest_queue_name(),
+    )
+    failed = ledger.failed_files(source="zi_search_blob", max_attempts=args.max_attempts)
+    for file in failed.itertuples():
+        logging.info(f"Resuming {file.name} from {file.stage} ({file.error})")
+        if az.queue_client is not None:
+            container_name, blob_name = file.blob_name.rsplit("/", 1)
+            az.enqueue_salesfile(container_name, blob_name, file.id)
+        else:
+            container_name, blob_name = file.blob_name.split("/", 1)
+            az.retrigger_blob(container_name, blob_name)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="HaneySalesSync maintenance commands")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    subparsers.add_parser(
+        "backfill-metrics",
+        help="rebuild the per file slack metrics counters from the tracking table",
+    ).set_defaults(func=backfill_metrics)
+
+    report = subparsers.add_parser(
+        "ledger-report",
+        help="p50/p95 stage latency per file type and the failed or stuck files",
+    )
+    report.add_argument("--days", type=int, default=7)
+    report.add_argument("--max-attempts", type=int, default=3)
+    report.set_defaults(func=ledger_report)
+
+    resume = subparsers.add_parser(
+        "resume-ingest",
+        help="re-run the blob ingest of files whose ledger shows a failed or stuck load",
+    )
+    resume.add_argument("--max-attempts", type=int, default=3)
+    resume.set_defaults(func=resume_ingest)
+
+    args = parser.parse_args()
+    load_settings()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""normalizing zoominfo contact ids
+
+Revision ID: 2d7f6b1e0a93
+Revises: 9a4e7c13b5f0
+Create Date: 2026-10-19 21:14:37.502816
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2d7f6b1e0a93'
+down_revision: Union[str, None] = '9a4e7c13b5f0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # databases that ran 3c8d5a0f9e12 before it normalised the ids hold some
+    # as "123.0". They are normalised as normalize_contact_ids() in
+    # app/data/azure.py does and fingerprinted again. A contact that then
+    # matches another row is collapsed onto the first row, as in 3c8d5a0f9e12,
+    # and archived in its tables so its downgrade restores it. The tables are
+    # created here when the earlier 3c8d5a0f9e12 ran without them.
+    op.execute(
+        """
+        CREATE TABLE IF NOT EXISTS sales_leads.lead_contact_id_backup AS
+        SELECT uuid, zoominfo_contact_id
+        FROM sales_leads.leads
+        WITH NO DATA;
+
+        CREATE TABLE IF NOT EXISTS sales_leads.collapsed_leads AS
+        SELECT *, CAST(NULL AS uuid) AS keeper_uuid
+        FROM sales_leads.leads
+        WITH NO DATA;
+
+        CREATE TABLE IF NOT EXISTS sales_leads.collapsed_lead_tracking (
+            tracking_uuid uuid PRIMARY KEY,
+            lead_uuid uuid NOT NULL
+        );
+        """
+    )
+
+    op.execute(
+        """
+        CREATE TEMPORARY TABLE renormalized AS
+        SELECT uuid
+        , created_at
+        , regexp_replace(trim(zoominfo_contact_id), '\\.0$', '') AS contact_id
+        , CASE
+            WHEN coalesce(email_address, '') <> '' OR regexp_replace(trim(zoominfo_contact_id), '\\.0$', '') <> ''
+            THEN md5(lower(trim(coalesce(email_address, ''))) || '|' || regexp_replace(trim(zoominfo_contact_id), '\\.0$', ''))
+          END AS contact_fingerprint
+        FROM sales_leads.leads
+        WHERE zoominfo_contact_id IS DISTINCT FROM regexp_replace(trim(zoominfo_contact_id), '\\.0$', '');
+
+        INSERT INTO sales_leads.lead_contact_id_backup (uuid, zoominfo_contact_id)
+        SELECT l.uuid, l.zoominfo_contact_id
+        FROM sales_leads.leads l
+        INNER JOIN renormalized r
+          ON r.uuid = l.uuid
+        WHERE NOT EXISTS (
+            SELECT 1 FROM sales_leads.lead_contact_id_backup b WHERE b.uuid = l.uuid
+        );
+
+        CREATE TEMPORARY TABLE lead_keepers AS
+        SELECT uuid
+        , FIRST_VALUE(uuid) OVER (PARTITION BY contact_fingerprint ORDER BY created_at, uuid) AS keeper_uuid
+        FROM (
+            SELECT uuid, created_at, contact_fingerprint
+            FROM renormalized
+            WHERE contact_fingerprint IS NOT NULL
+            UNION ALL
+            SELECT l.uuid, l.created_at, l.contact_fingerprint
+            FROM sales_leads.leads l
+            WHERE l.contact_fingerprint IN (SELECT contact_fingerprint FROM renormalized)
+            AND l.uuid NOT IN (SELECT uuid FROM renormalized)
+        ) contacts;
+
+        UPDATE sales_leads.lead_sightings s
+        SET lead_uuid = k.keeper_uuid
+        FROM lead_keepers k
+        WHERE s.lead_uuid = k.uuid
+        AND k.uuid <> k.keeper_uuid;
+
+        INSERT INTO sales_leads.collapsed_lead_tracking (tracking_uuid, lead_uuid)
+        SELECT t.uuid, t.lead_uuid
+        FROM sales_leads.tracking t
+        INNER JOIN lead_keepers k
+          ON k.uuid = t.lead_uuid
+        WHERE k.uuid <> k.keeper_uuid;
+
+        UPDATE sales_leads.tracking t
+        SET lead_uuid = k.keeper_uuid
+        FROM lead_keepers k
+        WHERE t.lead_uuid = k.uuid
+        AND k.uuid <> k.keeper_uuid;
+
+        INSERT INTO sales_leads.collapsed_leads
+        SELECT l.*, k.keeper_uuid
+        FROM sales_leads.leads l
+        INNER JOIN lead_keepers k
+          ON k.uuid = l.uuid
+        WHERE k.uuid <> k.keeper_uuid;
+
+        DELETE FROM sales_leads.leads l
+        USING lead_keepers k
+        WHERE l.uuid = k.uuid
+        AND k.uuid <> k.keeper_uuid;
+
+        UPDATE sales_leads.leads l
+        SET zoominfo_contact_id = r.contact_id
+          , contact_fingerprint = r.contact_fingerprint
+        FROM renormalized r
+        WHERE l.uuid = r.uuid;
+
+        DROP TABLE lead_keepers;
+        DROP TABLE renormalized;
+        """
+    )
+
+
+def downgrade() -> None:
+    # the original ids and collapsed rows are restored by the downgrade of 3c8d5a0f9e12.
+    pass
@@ -0,0 +1,163 @@
+"""adding lead contact fingerprints and lead_sightings table
+
+Revision ID: 3c8d5a0f9e12
+Revises: e6f2b18d4c07
+Create Date: 2026-10-19 16:45:09.318260
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3c8d5a0f9e12'
+down_revision: Union[str, None] = 'e6f2b18d4c07'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "leads",
+        sa.Column("contact_fingerprint", sa.String(32), nullable=True),
+        schema="sales_leads",
+    )
+
+    op.create_table(
+        "lead_sightings",
+        sa.Column(
+            "uuid",
+            sa.dialects.postgresql.UUID(),
+            primary_key=True,
+            server_default=sa.text("gen_random_uuid()"),
+        ),
+        sa.Column(
+            "lead_uuid", sa.dialects.postgresql.UUID(), sa.ForeignKey("sales_leads.leads.uuid"), nullable=False
+        ),
+        sa.Column(
+            "drive_metadata_uuid", sa.dialects.postgresql.UUID(), sa.ForeignKey("sales_leads.drive_metadata.uuid"), nullable=False
+        ),
+        sa.Column("created_at", sa.DateTime, nullable=False),
+        sa.Index("lead_sightings_lead_uuid_idx", "lead_uuid"),
+        sa.Index("lead_sightings_drive_metadata_uuid_idx", "drive_metadata_uuid"),
+        schema="sales_leads",
+    )
+
+    # the original ids and the collapsed rows are kept, so downgrade() can restore them.
+    op.execute(
+        """
+        CREATE TABLE sales_leads.lead_contact_id_backup AS
+        SELECT uuid, zoominfo_contact_id
+        FROM sales_leads.leads
+        WHERE zoominfo_contact_id IS DISTINCT FROM regexp_replace(trim(zoominfo_contact_id), '\\.0$', '');
+
+        CREATE TABLE sales_leads.collapsed_leads AS
+        SELECT *, CAST(NULL AS uuid) AS keeper_uuid
+        FROM sales_leads.leads
+        WITH NO DATA;
+
+        CREATE TABLE sales_leads.collapsed_lead_tracking (
+            tracking_uuid uuid PRIMARY KEY,
+            lead_uuid uuid NOT NULL
+        );
+        """
+    )
+
+    # ids normalised as normalize_contact_ids() does and fingerprinted as
+    # contact_fingerprints() does, both in app/data/azure.py.
+    op.execute(
+        """
+        UPDATE sales_leads.leads
+        SET zoominfo_contact_id = regexp_replace(trim(zoominfo_contact_id), '\\.0$', '')
+        WHERE uuid IN (SELECT uuid FROM sales_leads.lead_contact_id_backup);
+
+        UPDATE sales_leads.leads
+        SET contact_fingerprint = md5(lower(trim(coalesce(email_address, ''))) || '|' || coalesce(zoominfo_contact_id, ''))
+        WHERE coalesce(email_address, '') <> ''
+        OR coalesce(zoominfo_contact_id, '') <> '';
+        """
+    )
+
+    # collapse existing duplicates onto the first row per contact, as
+    # insert_leads keeps a contact on the file it was first seen in. Every
+    # row is recorded as a sighting and tracking is pointed at the kept row.
+    op.execute(
+        """
+        CREATE TEMPORARY TABLE lead_keepers AS
+        SELECT uuid
+        , FIRST_VALUE(uuid) OVER (PARTITION BY contact_fingerprint ORDER BY created_at, uuid) AS keeper_uuid
+        FROM sales_leads.leads
+        WHERE contact_fingerprint IS NOT NULL;
+
+        INSERT INTO sales_leads.lead_sightings (lead_uuid, drive_metadata_uuid, created_at)
+        SELECT COALESCE(k.keeper_uuid, l.uuid), l.drive_metadata_uuid, l.created_at
+        FROM sales_leads.leads l
+        LEFT JOIN lead_keepers k
+          ON k.uuid = l.uuid;
+
+        INSERT INTO sales_leads.collapsed_lead_tracking (tracking_uuid, lead_uuid)
+        SELECT t.uuid, t.lead_uuid
+        FROM sales_leads.tracking t
+        INNER JOIN lead_keepers k
+          ON k.uuid = t.lead_uuid
+        WHERE k.uuid <> k.keeper_uuid;
+
+        UPDATE sales_leads.tracking t
+        SET lead_uuid = k.keeper_uuid
+        FROM lead_keepers k
+        WHERE t.lead_uuid = k.uuid
+        AND k.uuid <> k.keeper_uuid;
+
+        INSERT INTO sales_leads.collapsed_leads
+        SELECT l.*, k.keeper_uuid
+        FROM sales_leads.leads l
+        INNER JOIN lead_keepers k
+          ON k.uuid = l.uuid
+        WHERE k.uuid <> k.keeper_uuid;
+
+        DELETE FROM sales_leads.leads l
+        USING lead_keepers k
+        WHERE l.uuid = k.uuid
+        AND k.uuid <> k.keeper_uuid;
+
+        DROP TABLE lead_keepers;
+        """
+    )
+
+    op.create_index(
+        "leads_contact_fingerprint_idx",
+        "leads",
+        ["contact_fingerprint"],
+        unique=True,
+        schema="sales_leads",
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("leads_contact_fingerprint_idx", table_name="leads", schema="sales_leads")
+    # collapsed rows back with their tracking, and the ids as they were loaded.
+    op.execute(
+        """
+        ALTER TABLE sales_leads.collapsed_leads DROP COLUMN keeper_uuid;
+
+        INSERT INTO sales_leads.leads
+        SELECT * FROM sales_leads.collapsed_leads;
+
+        UPDATE sales_leads.tracking t
+        SET lead_uuid = c.lead_uuid
+        FROM sales_leads.collapsed_lead_tracking c
+        WHERE t.uuid = c.tracking_uuid;
+
+        UPDATE sales_leads.leads l
+        SET zoominfo_contact_id = b.zoominfo_contact_id
+        FROM sales_leads.lead_contact_id_backup b
+        WHERE l.uuid = b.uuid;
+        """
+    )
+    op.drop_table("collapsed_lead_tracking", schema="sales_leads")
+    op.drop_table("collapsed_leads", schema="sales_leads")
+    op.drop_table("lead_contact_id_backup", schema="sales_leads")
+    op.drop_table("lead_sightings", schema="sales_leads")
+    op.drop_column("leads", "contact_fingerprint", schema="sales_leads")
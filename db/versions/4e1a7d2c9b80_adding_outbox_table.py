@@ -0,0 +1,69 @@
+"""adding outbox table
+
+Revision ID: 4e1a7d2c9b80
+Revises: bcb3ef4caf9a
+Create Date: 2026-10-19 10:03:18.551902
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4e1a7d2c9b80'
+down_revision: Union[str, None] = 'bcb3ef4caf9a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    outbox_status_enum = sa.dialects.postgresql.ENUM(
+        "pending",
+        "processing",
+        "done",
+        "failed",
+        name="outbox_status_enum",
+        create_type=False,
+    )
+    outbox_status_enum.create(op.get_bind())
+
+    op.create_table(
+        "outbox",
+        sa.Column(
+            "uuid",
+            sa.dialects.postgresql.UUID(),
+            primary_key=True,
+            server_default=sa.text("gen_random_uuid()"),
+        ),
+        sa.Column("event_type", sa.String(55), nullable=False),
+        sa.Column("payload", sa.dialects.postgresql.JSONB(), nullable=False),
+        sa.Column("status", outbox_status_enum, nullable=False, server_default="pending"),
+        sa.Column("attempts", sa.Integer, nullable=False, server_default="0"),
+        sa.Column("last_error", sa.Text, nullable=True),
+        sa.Column("created_at", sa.DateTime, nullable=False),
+        sa.Column("locked_at", sa.DateTime, nullable=True),
+        sa.Column("processed_at", sa.DateTime, nullable=True),
+        schema="sales_leads",
+    )
+    op.create_index(
+        "outbox_status_created_at_idx",
+        "outbox",
+        ["status", "created_at"],
+        schema="sales_leads",
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("outbox_status_created_at_idx", table_name="outbox", schema="sales_leads")
+    op.drop_table("outbox", schema="sales_leads")
+    outbox_status_enum = sa.dialects.postgresql.ENUM(
+        "pending",
+        "processing",
+        "done",
+        "failed",
+        name="outbox_status_enum",
+        create_type=False,
+    )
+    outbox_status_enum.drop(op.get_bind())
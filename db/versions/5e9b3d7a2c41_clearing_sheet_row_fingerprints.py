@@ -0,0 +1,29 @@
+"""clearing sheet_row_fingerprints
+
+Revision ID: 5e9b3d7a2c41
+Revises: c4e8a2f61d05
+Create Date: 2026-10-19 23:41:07.502318
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5e9b3d7a2c41'
+down_revision: Union[str, None] = 'c4e8a2f61d05'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # the fingerprints now hash cells as the sheet stores them. Cleared sheets
+    # are read back and reseeded on their next diff write, so none are appended twice.
+    op.execute("DELETE FROM sales_leads.sheet_row_fingerprints;")
+
+
+def downgrade() -> None:
+    # the index reseeds itself from the sheets either way.
+    op.execute("DELETE FROM sales_leads.sheet_row_fingerprints;")
@@ -0,0 +1,59 @@
+"""adding file processing ledger
+
+Revision ID: 5f1c2a9d8b47
+Revises: 3c8d5a0f9e12
+Create Date: 2026-10-19 18:02:11.417305
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5f1c2a9d8b47'
+down_revision: Union[str, None] = '3c8d5a0f9e12'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "file_processing_ledger",
+        sa.Column(
+            "uuid",
+            sa.dialects.postgresql.UUID(),
+            primary_key=True,
+            server_default=sa.text("gen_random_uuid()"),
+        ),
+        sa.Column("file_id", sa.String(512), nullable=False),
+        sa.Column("source", sa.String(50), nullable=False),
+        sa.Column("stage", sa.String(50), nullable=False),
+        sa.Column("blob_name", sa.String(1024), nullable=True),
+        sa.Column("started_at", sa.DateTime, nullable=False),
+        sa.Column("finished_at", sa.DateTime, nullable=True),
+        sa.Column("rows", sa.BigInteger, nullable=True),
+        sa.Column("bytes", sa.BigInteger, nullable=True),
+        sa.Column("api_calls", sa.Integer, nullable=True),
+        sa.Column("error", sa.Text, nullable=True),
+        schema="sales_leads",
+    )
+    op.create_index(
+        "file_processing_ledger_file_idx",
+        "file_processing_ledger",
+        ["file_id", "started_at"],
+        schema="sales_leads",
+    )
+    op.create_index(
+        "file_processing_ledger_started_at_idx",
+        "file_processing_ledger",
+        ["started_at"],
+        schema="sales_leads",
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("file_processing_ledger_started_at_idx", table_name="file_processing_ledger", schema="sales_leads")
+    op.drop_index("file_processing_ledger_file_idx", table_name="file_processing_ledger", schema="sales_leads")
+    op.drop_table("file_processing_ledger", schema="sales_leads")
@@ -0,0 +1,46 @@
+"""adding quick_mail_config and sync_state tables
+
+Revision ID: 7b0e93a5c6d1
+Revises: d52c8e1f7a34
+Create Date: 2026-10-19 13:58:22.640587
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7b0e93a5c6d1'
+down_revision: Union[str, None] = 'd52c8e1f7a34'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # last applied copy of the quick mail config sheet.
+    op.create_table(
+        "quick_mail_config",
+        sa.Column("filename", sa.String(255), primary_key=True),
+        sa.Column("hubspot_owner", sa.String(255)),
+        sa.Column("zi_search", sa.String(255)),
+        sa.Column("row_hash", sa.String(40), nullable=False),
+        sa.Column("updated_at", sa.DateTime, nullable=False),
+        schema="sales_leads",
+    )
+
+    # drive revision and content hash of the sheets we sync from.
+    op.create_table(
+        "sync_state",
+        sa.Column("name", sa.String(255), primary_key=True),
+        sa.Column("modified_time", sa.String(55)),
+        sa.Column("content_hash", sa.String(40)),
+        sa.Column("updated_at", sa.DateTime, nullable=False),
+        schema="sales_leads",
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("sync_state", schema="sales_leads")
+    op.drop_table("quick_mail_config", schema="sales_leads")
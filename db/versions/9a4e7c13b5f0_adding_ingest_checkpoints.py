@@ -0,0 +1,34 @@
+"""adding ingest checkpoints
+
+Revision ID: 9a4e7c13b5f0
+Revises: 5f1c2a9d8b47
+Create Date: 2026-10-19 18:47:52.093118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9a4e7c13b5f0'
+down_revision: Union[str, None] = '5f1c2a9d8b47'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "ingest_checkpoints",
+        sa.Column("file_id", sa.String(512), primary_key=True),
+        sa.Column("chunk_offset", sa.BigInteger, primary_key=True),
+        sa.Column("chunk_rows", sa.BigInteger, nullable=False),
+        sa.Column("total_rows", sa.BigInteger, nullable=False),
+        sa.Column("created_at", sa.DateTime, nullable=False),
+        schema="sales_leads",
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("ingest_checkpoints", schema="sales_leads")
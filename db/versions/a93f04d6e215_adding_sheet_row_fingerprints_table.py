@@ -0,0 +1,33 @@
+"""adding sheet_row_fingerprints table
+
+Revision ID: a93f04d6e215
+Revises: 4e1a7d2c9b80
+Create Date: 2026-10-19 11:27:05.930114
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a93f04d6e215'
+down_revision: Union[str, None] = '4e1a7d2c9b80'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "sheet_row_fingerprints",
+        sa.Column("spreadsheet_id", sa.String(255), primary_key=True),
+        sa.Column("worksheet_id", sa.String(55), primary_key=True),
+        sa.Column("fingerprint", sa.String(40), primary_key=True),
+        sa.Column("created_at", sa.DateTime, nullable=False),
+        schema="sales_leads",
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("sheet_row_fingerprints", schema="sales_leads")
@@ -0,0 +1,40 @@
+"""adding drive_metadata_metrics table
+
+Revision ID: bcb3ef4caf9a
+Revises: 62634693b64a
+Create Date: 2026-10-19 09:12:41.204113
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'bcb3ef4caf9a'
+down_revision: Union[str, None] = '62634693b64a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # per file counters, maintained by the tracking table updates
+    # so the slack metrics don't need to aggregate the tracking history.
+    op.create_table(
+        "drive_metadata_metrics",
+        sa.Column(
+            "drive_metadata_uuid",
+            sa.dialects.postgresql.UUID(),
+            sa.ForeignKey("sales_leads.drive_metadata.uuid"),
+            primary_key=True,
+        ),
+        sa.Column("number_of_posted_leads", sa.Integer, nullable=False, server_default="0"),
+        sa.Column("number_of_shopify_customers", sa.Integer, nullable=False, server_default="0"),
+        sa.Column("updated_at", sa.DateTime, nullable=True),
+        schema="sales_leads",
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("drive_metadata_metrics", schema="sales_leads")
@@ -0,0 +1,36 @@
+"""nulling blank quick_mail_config values
+
+Revision ID: c4e8a2f61d05
+Revises: 2d7f6b1e0a93
+Create Date: 2026-10-19 23:02:41.118093
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4e8a2f61d05'
+down_revision: Union[str, None] = '2d7f6b1e0a93'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # merge_config_rows stored blank cells as the strings "nan" and "None".
+    op.execute(
+        """
+        UPDATE sales_leads.quick_mail_config
+        SET hubspot_owner = NULLIF(NULLIF(hubspot_owner, 'nan'), 'None')
+          , zi_search = NULLIF(NULLIF(zi_search, 'nan'), 'None')
+        WHERE hubspot_owner IN ('nan', 'None')
+        OR zi_search IN ('nan', 'None');
+        """
+    )
+
+
+def downgrade() -> None:
+    # NULL is what the blank cells meant.
+    pass
@@ -0,0 +1,33 @@
+"""adding spreadsheet_ids table
+
+Revision ID: d52c8e1f7a34
+Revises: a93f04d6e215
+Create Date: 2026-10-19 12:40:51.117306
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd52c8e1f7a34'
+down_revision: Union[str, None] = 'a93f04d6e215'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "spreadsheet_ids",
+        sa.Column("spreadsheet_name", sa.String(255), primary_key=True),
+        sa.Column("folder_id", sa.String(255), primary_key=True),
+        sa.Column("spreadsheet_id", sa.String(255), nullable=False),
+        sa.Column("updated_at", sa.DateTime, nullable=False),
+        schema="sales_leads",
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("spreadsheet_ids", schema="sales_leads")
@@ -0,0 +1,51 @@
+"""adding content hash columns to drive_metadata
+
+Revision ID: e6f2b18d4c07
+Revises: 7b0e93a5c6d1
+Create Date: 2026-10-19 15:21:36.004871
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e6f2b18d4c07'
+down_revision: Union[str, None] = '7b0e93a5c6d1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "drive_metadata",
+        sa.Column("md5checksum", sa.String(512), nullable=True),
+        schema="sales_leads",
+    )
+    op.add_column(
+        "drive_metadata",
+        sa.Column("content_hash", sa.String(40), nullable=True),
+        schema="sales_leads",
+    )
+    op.add_column(
+        "drive_metadata",
+        sa.Column(
+            "duplicate_of",
+            sa.dialects.postgresql.UUID(),
+            sa.ForeignKey("sales_leads.drive_metadata.uuid"),
+            nullable=True,
+        ),
+        schema="sales_leads",
+    )
+    op.create_index("md5checksum_idx", "drive_metadata", ["md5checksum"], schema="sales_leads")
+    op.create_index("content_hash_idx", "drive_metadata", ["content_hash"], schema="sales_leads")
+
+
+def downgrade() -> None:
+    op.drop_index("content_hash_idx", table_name="drive_metadata", schema="sales_leads")
+    op.drop_index("md5checksum_idx", table_name="drive_metadata", schema="sales_leads")
+    op.drop_column("drive_metadata", "duplicate_of", schema="sales_leads")
+    op.drop_column("drive_metadata", "content_hash", schema="sales_leads")
+    op.drop_column("drive_metadata", "md5checksum", schema="sales_leads")
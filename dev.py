@@ -97,7 +97,6 @@ if __name__ == "__main__":
         logging.info('Checking if files exist in database')
         
         file_dataframe_all = file_dataframe_all.reset_index(drop=True)
-        file_dataframe_all = file_dataframe_all[~file_dataframe_all['name'].str.contains('Copy of Marga-050224-University-Person-67.csv')]
         file_dataframe_new = psql.check_if_record_exists(
             table_name="drive_metadata",
             schema="sales_leads",
@@ -126,6 +125,11 @@ if __name__ == "__main__":
         psql.get_and_post_missing_config(slack_webhook=os.environ.get("SLACK_WEBHOOK"))
         
         
+        if not file_dataframe_new.empty:
+            duplicate_files = psql.mark_duplicate_files(file_dataframe_new["id"].tolist())
+            if not duplicate_files.empty:
+                logging.info(f"Skipping duplicate content: {duplicate_files['name'].tolist()}")
+
         if not file_dataframe_new.empty:
             logging.info("Processing new files")
             files_to_process = psql.get_files_to_process(
@@ -135,6 +139,9 @@ if __name__ == "__main__":
             for file in files_to_process.itertuples():
                 logging.info(f"Processing file: {file.name}")
                 dataframe = psql.process_file(file.id, gdrive)
+                if psql.mark_duplicate_content(file.id, dataframe):
+                    logging.info(f"{file.name} has the same rows as an earlier file, skipping")
+                    continue
                 parent_folder = gdrive.get_parent_folder(file.id)
                 parent_name = gdrive.get_parent_folder_name(parent_folder[0])
                 parent_name = parent_name.replace(" ", "_").lower().strip()
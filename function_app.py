@@ -10,6 +10,7 @@ import sentry_sdk
 from sentry_sdk.integrations.serverless import serverless_function
 from time import sleep
 from pathlib import Path
+from contextlib import ExitStack
 import io
 
 logging.basicConfig(
@@ -22,10 +23,13 @@ logger = logging.getLogger(__name__)
 # Add this line back!
 app = func.FunctionApp()
 
+from app.instrumentation import instrumented, record, traces_sampler
+
+# head based sampling, see traces_sampler. profiles are a share of the sampled traces.
 sentry_sdk.init(
     dsn=os.environ["SENTRY_DSN"],
-    traces_sample_rate=1.0,
-    profiles_sample_rate=1.0,
+    traces_sampler=traces_sampler,
+    profiles_sample_rate=float(os.environ.get("SENTRY_PROFILES_SAMPLE_RATE", 0.1)),
 )
 def initialize_services():
     """Initialize all required services"""
@@ -35,6 +39,10 @@ def initialize_services():
         SalesTransformations,
         create_gdrive_service,
         AzureBlobStorage,
+        SheetFingerprintIndex,
+        SpreadsheetIdCache,
+        ProcessingLedger,
+        ingest_queue_name,
     )
     
     services = {}
@@ -62,8 +70,14 @@ def initialize_services():
         raise
     
     try:
-        services['az'] = AzureBlobStorage(connection_string=os.environ.get("SalesSyncBlogTrigger"))
+        services['az'] = AzureBlobStorage(
+            connection_string=os.environ.get("SalesSyncBlogTrigger"),
+            ingest_queue_name=ingest_queue_name(),
+        )
+        services['gdrive'].fingerprint_index = SheetFingerprintIndex(engine=services['psql'].engine)
+        services['gdrive'].spreadsheet_cache = SpreadsheetIdCache(engine=services['psql'].engine)
         services['st'] = SalesTransformations(engine=services['psql'].engine, google_api=services['gdrive'])
+        services['ledger'] = ProcessingLedger(engine=services['psql'].engine)
         services['sheet_week'] = f"Week {pd.Timestamp('today').isocalendar().week}"
         logger.info("All services initialized successfully")
     except Exception as e:
@@ -78,6 +92,7 @@ def initialize_services():
     run_on_startup=False,
     use_monitor=True,
 )
+@instrumented("sales_sync")
 def sales_sync(GoogleSalesSync: func.TimerRequest) -> None:
     from app import (
     GoogleDrive,
@@ -90,6 +105,7 @@ def sales_sync(GoogleSalesSync: func.TimerRequest) -> None:
     gdrive = services['gdrive']
     psql = services['psql']
     az = services['az']
+    processed_ids, error = [], None
      
     if GoogleSalesSync.past_due:
         logger.info("The timer is past due!")
@@ -103,8 +119,9 @@ def sales_sync(GoogleSalesSync: func.TimerRequest) -> None:
             all_child_modified_files, record_path=None
         )
         logger.info(f"Number of files edited: {file_dataframe_all.shape[0]}")
-        file_config = gdrive.get_file_config(
-            os.environ.get("QUICK_MAIL_CONFIG_NAME"),
+        psql.sync_file_config(
+            gdrive,
+            spreadsheet_name=os.environ.get("QUICK_MAIL_CONFIG_NAME"),
             folder_id=os.environ.get("QUICK_MAIL_CONFIG_FOLDER_ID"),
         )
         
@@ -136,31 +153,58 @@ def sales_sync(GoogleSalesSync: func.TimerRequest) -> None:
         if not missing_file_types.empty:
             psql.update_file_types(missing_file_types[["uuid", "file_type"]])
 
-        psql.update_config_metadata(file_config)
+        psql.update_config_metadata()
         psql.get_and_post_missing_config(slack_webhook=os.environ.get("SLACK_WEBHOOK"))
 
+        if not file_dataframe_new.empty:
+            duplicate_files = psql.mark_duplicate_files(file_dataframe_new["id"].tolist())
+            if not duplicate_files.empty:
+                logger.info(f"Skipping duplicate content: {duplicate_files['name'].tolist()}")
+
         if not file_dataframe_new.empty:
             logger.info("Processing new files")
             files_to_process = psql.get_files_to_process(
                 file_dataframe_new["id"].tolist()
             )
 
-            for file in files_to_process.itertuples():
-                logger.info(f"Processing file: {file.name}")
-                dataframe = psql.process_file(file.id, gdrive)
-                parent_folder = gdrive.get_parent_folder(file.id)
-                parent_name = gdrive.get_parent_folder_name(parent_folder[0])
-                parent_name = parent_name.replace(" ", "_").lower().strip()
-                sleep(5)
-                az.upload_dataframe(
-                    dataframe=dataframe,
-                    container_name=f"salesfiles/{parent_name}",
-                    blob_name=file.name.replace("xlsx", "csv"),
-                    file_id=file.id,
-                )
+            processed_ids = files_to_process["id"].tolist()
+            # a failing new file must not keep the earlier failures from being resumed.
+            try:
+                run_salesfile_engine(services, files_to_process)
+            except Exception as e:
+                error = e
     else:
         logger.info("No files to process")
 
+    # files whose last run failed or got stuck, retried up to max_attempts times from
+    # the stage they failed at. The files just run are retried from the next invocation on.
+    failed_files = services['ledger'].failed_files(source="sales_sync")
+    failed_files = failed_files[~failed_files["id"].isin(processed_ids)]
+    if not failed_files.empty:
+        logger.info(f"Resuming failed files: {failed_files[['name', 'stage', 'error']].to_dict('records')}")
+        run_salesfile_engine(services, failed_files)
+    if error is not None:
+        raise error
+
+
+def run_salesfile_engine(services: dict, files_to_process: pd.DataFrame) -> None:
+    """Downloads, parses and uploads the files to salesfiles with the SALES_SYNC_ENGINE engine."""
+    from app.pipeline import process_salesfiles, run_staged_sales_sync
+
+    psql, gdrive, az, ledger = services['psql'], services['gdrive'], services['az'], services['ledger']
+    file_format = os.environ.get("SALESFILES_FORMAT", "csv")
+    # SALES_SYNC_ENGINE=async overlaps the drive, blob and postgres calls across files,
+    # staged runs each step on its own workers behind bounded queues.
+    engine = os.environ.get("SALES_SYNC_ENGINE", "sync")
+    if engine == "async":
+        from app.pipeline.async_engine import run_async_sales_sync
+
+        run_async_sales_sync(psql, gdrive, az, files_to_process, file_format=file_format, ledger=ledger)
+    elif engine == "staged":
+        run_staged_sales_sync(psql, gdrive, az, files_to_process, file_format=file_format, ledger=ledger)
+    else:
+        process_salesfiles(psql, gdrive, az, files_to_process, file_format=file_format, ledger=ledger)
+
 @app.blob_trigger(
     arg_name="myblob",
     path="salesfiles/zi_search/{name}.csv",
@@ -169,73 +213,398 @@ def sales_sync(GoogleSalesSync: func.TimerRequest) -> None:
     
 )
 def ZiSearchBlobTrigger(myblob: func.InputStream):
+    ingest_zi_search_blob(myblob)
+
+
+@app.blob_trigger(
+    arg_name="myblob",
+    path="salesfiles/zi_search/{name}.parquet",
+    connection="SalesSyncBlogTrigger",
+    use_monitor=True,
+)
+def ZiSearchParquetBlobTrigger(myblob: func.InputStream):
+    ingest_zi_search_blob(myblob)
+
+
+@instrumented("ingest_zi_search_blob")
+def ingest_zi_search_blob(myblob: func.InputStream):
     logger.info(
         f"Python blob trigger function processed blob"
         f"Name: {myblob.name}"
         f"Blob Size: {myblob.length} bytes"
     )
-    from app import (
-    GoogleDrive,
-    PostgresExporter,
-    SalesTransformations,
-    create_gdrive_service,
-    AzureBlobStorage,
-)
+    from app import ingest_queue_name
+
+    if ingest_queue_name():
+        logger.info(f"ZI_SEARCH_INGEST=queue, {myblob.name} is ingested by ZiSearchQueueTrigger")
+        return None
 
     services = initialize_services()
-    gdrive = services['gdrive']
-    psql = services['psql']
     az = services['az']
-    st = services['st']
-    sheet_week = services['sheet_week']
 
     blob_name_without_container = myblob.name.replace("salesfiles/", "")
     blob_metadata = az.get_blob_metadata(container_name='salesfiles', blob_name=blob_name_without_container)
     
     file_id = blob_metadata["metadata"]["file_id"]
+    ingest_zi_search_file(services, blob_name=myblob.name, file_id=file_id, read=myblob.read)
+
+
+# ZI_SEARCH_INGEST_QUEUE, filled by sales_sync when ZI_SEARCH_INGEST=queue.
+# batchSize and the polling interval are set in host.json.
+@app.queue_trigger(
+    arg_name="msg",
+    queue_name="zi-search-ingest",
+    connection="SalesSyncBlogTrigger",
+)
+@instrumented("ingest_zi_search_message")
+def ZiSearchQueueTrigger(msg: func.QueueMessage) -> None:
+    message = msg.get_json()
+    logger.info(f"Ingest message for {message['blob_name']} ({message.get('rows')} rows), dequeue count {msg.dequeue_count}")
+
+    services = initialize_services()
+    container_name, blob_name = message["blob_name"].split("/", 1)
+    ingest_zi_search_file(
+        services,
+        blob_name=message["blob_name"],
+        file_id=message["file_id"],
+        read=lambda: services['az'].get_blob_from_container(container_name, blob_name).readall(),
+        rows=message.get("rows"),
+    )
 
-    file_name = az.split_and_return_blob_name(myblob.name)
+
+def ingest_zi_search_file(services: dict, blob_name: str, file_id: str, read, rows: int = None) -> None:
+    """Loads a zi search salesfile and queues its sheet and slack updates.
+    `read` returns the blob bytes, it is only called for files not processed yet."""
+    from app import get_tracked_email_filter
+
+    psql = services['psql']
+    az = services['az']
+    st = services['st']
+    sheet_week = services['sheet_week']
+    ledger = services['ledger']
+
+    # parquet blobs keep the drive file name, e.g. leads.xlsx.parquet
+    file_name = az.split_and_return_blob_name(blob_name).removesuffix(".parquet")
 
     has_file_been_processed = psql.check_if_file_has_been_processed(file_id=file_id)
 
     if not has_file_been_processed:
         
          
-        blob_str = myblob.read().decode()
         logger.info(f"Processing file: {file_name}")
-        df = pd.read_csv(io.StringIO(blob_str))
-        psql.insert_raw_data(dataset=df, table_name="leads", schema="sales_leads")
-        psql.update_file_has_been_processed(file_id=file_id)
-        logger.info(f'Processing file_id {file_id}')
-        
-        
-        new_lead_data_zi = st.get_new_zi_search_lead_data(file_name=file_name)
-
-        if new_lead_data_zi.shape[0] == 0:
-            logger.info(f'{file_name} emails have all been tracked and sent previously')
-
-        if not new_lead_data_zi.empty:
-            sheet_data = st.create_google_lead_data_frame(new_lead_data_zi)
-            uuid = new_lead_data_zi["drive_metadata_uuid"].values[0]
-            logger.info(f"uuid: {uuid} for {file_name}")
-
-            logger.info(f"Writing {file_name} to google sheet")
-            gdrive.write_to_google_sheet(
-                dataframe=sheet_data,
-                spreadsheet_name=f"Quick Mail Output - {sheet_week}",
-                target_sheet=file_name,
-                folder_id=os.environ.get("QUICK_MAIL_OUTPUT_PARENT_FOLDER_ID"),
+        lead_columns = set(psql.get_columns_from_table("leads", "sales_leads"))
+        with ledger.stage(file_id, "read_blob", source="zi_search_blob", blob_name=blob_name):
+            data = read()
+            df = az.read_salesfile(
+                data,
+                blob_name=blob_name,
+                usecols=lambda column: psql._clean_column_name(column) in lead_columns,
+                dtype_backend=psql.dtype_backend,
+            )
+            record(rows=df.shape[0], bytes=len(data))
+        if rows is not None and rows != df.shape[0]:
+            logger.warning(f"{blob_name} has {df.shape[0]} rows, {rows} were uploaded")
+
+        # cheap in-memory check before the dedupe query, the raw rows are loaded either way.
+        candidates = get_tracked_email_filter(psql.engine).prefilter(
+            psql._clean_column_names(df.copy())
+        )
+        logger.info(f"{candidates.shape[0]} of {df.shape[0]} rows may be new leads")
+
+        # leads load in checkpointed chunks, a retry resumes after the last committed one.
+        with ledger.stage(file_id, "load_chunks", source="zi_search_blob", blob_name=blob_name):
+            psql.insert_leads_checkpointed(dataset=df, file_id=file_id)
+
+        # the processed flag, tracking and the deferred side effects commit together,
+        # the sheet write and slack post are done by OutboxDrain.
+        with ledger.stage(file_id, "load", source="zi_search_blob", blob_name=blob_name), \
+                psql.engine.begin() as connection:
+            psql.update_file_has_been_processed(file_id=file_id, connection=connection)
+            psql.clear_ingest_checkpoints(file_id=file_id, connection=connection)
+            logger.info(f'Processing file_id {file_id}')
+            
+            
+            uuid = None
+            if not candidates.empty:
+                # one sheet event per streamed chunk, so no more than a chunk is held.
+                for chunk in st.stream_new_zi_search_lead_data(file_name=file_name, connection=connection):
+                    if not chunk.empty:
+                        uuid = chunk["drive_metadata_uuid"].values[0]
+                        enqueue_sheet_chunk(
+                            psql, st.create_google_lead_data_frame(chunk), file_name, uuid, sheet_week, connection
+                        )
+
+            if uuid is None:
+                logger.info(f'{file_name} emails have all been tracked and sent previously')
+
+            if uuid is not None:
+                logger.info(f"uuid: {uuid} for {file_name}")
+
+                psql.update_tracking_table(uuid, connection=connection)
+                logger.info("Updated tracking table")
+
+                psql.update_tracking_table_shopify_customer(drive_metadata_uuid=uuid, connection=connection)
+                logger.info("Updated tracking table for shopify customer")
+
+                psql.enqueue_outbox_event(
+                    event_type="slack_metrics",
+                    payload={"drive_metadata_uuid": uuid},
+                    connection=connection,
+                )
+                logger.info(f"Queued google sheet and slack events for {file_name}")
+
+
+@app.schedule(
+    schedule="30 * * * * *",
+    arg_name="BatchTimer",
+    run_on_startup=False,
+    use_monitor=False,
+)
+@instrumented("zi_search_batch_ingest")
+def ZiSearchBatchIngest(BatchTimer: func.TimerRequest) -> None:
+    """With ZI_SEARCH_INGEST=batch, ingests the files queued by sales_sync
+    ZI_SEARCH_BATCH_SIZE at a time."""
+    if os.environ.get("ZI_SEARCH_INGEST") != "batch":
+        return None
+
+    services = initialize_services()
+    az = services['az']
+    messages = az.receive_salesfile_messages(
+        max_messages=int(os.environ.get("ZI_SEARCH_BATCH_SIZE", 20))
+    )
+    # same limit as maxDequeueCount for ZiSearchQueueTrigger in host.json
+    for message in [m for m in messages if m.dequeue_count > 5]:
+        az.poison_salesfile_message(message)
+    messages = [m for m in messages if m.dequeue_count <= 5]
+    if not messages:
+        return None
+
+    logger.info(f"Ingesting a batch of {len(messages)} files")
+    # the messages of files that failed stay on the queue, they come back after the
+    # visibility timeout and are poisoned after 5 dequeues.
+    failed = ingest_zi_search_batch(services, [json.loads(message.content) for message in messages])
+    for message in messages:
+        if json.loads(message.content)["file_id"] not in failed:
+            az.delete_salesfile_message(message)
+
+
+def ingest_zi_search_batch(services: dict, files: list) -> set:
+    """ingest_zi_search_file for many files at once. The leads of all files are
+    loaded in one bulk insert and deduped with one query over the batch, and
+    every tab is queued in the same transaction so OutboxDrain writes them in
+    one sheets batch.
+
+    A file that can't be read is left out of the batch. If the batch load
+    fails, its files are ingested one at a time. Returns the ids of the files
+    that failed."""
+    psql = services['psql']
+    az = services['az']
+    ledger = services['ledger']
+
+    files = list({file["file_id"]: file for file in files}.values())
+    processed = psql.get_processed_file_ids([file["file_id"] for file in files])
+    files = [file for file in files if file["file_id"] not in processed]
+    if not files:
+        return set()
+
+    lead_columns = set(psql.get_columns_from_table("leads", "sales_leads"))
+    failed, blobs, frames = set(), {}, []
+    for file in files:
+        container_name, blob_name = file["blob_name"].split("/", 1)
+        try:
+            with ledger.stage(file["file_id"], "read_blob", source="zi_search_blob", blob_name=file["blob_name"]):
+                data = az.get_blob_from_container(container_name, blob_name).readall()
+                df = az.read_salesfile(
+                    data,
+                    blob_name=file["blob_name"],
+                    usecols=lambda column: psql._clean_column_name(column) in lead_columns,
+                    dtype_backend=psql.dtype_backend,
+                )
+                record(rows=df.shape[0], bytes=len(data))
+        except Exception as e:
+            logger.error(f"Could not read {file['blob_name']}, leaving it out of the batch: {e}")
+            failed.add(file["file_id"])
+            continue
+        if file.get("rows") is not None and file["rows"] != df.shape[0]:
+            logger.warning(f"{file['blob_name']} has {df.shape[0]} rows, {file['rows']} were uploaded")
+        blobs[file["file_id"]] = data
+        frames.append(df)
+
+    files = [file for file in files if file["file_id"] not in failed]
+    if not files:
+        return failed
+
+    try:
+        load_zi_search_batch(services, files, frames)
+    except Exception as e:
+        logger.error(f"Batch load of {len(files)} files failed, ingesting them one at a time: {e}")
+        for file in files:
+            try:
+                ingest_zi_search_file(
+                    services,
+                    blob_name=file["blob_name"],
+                    file_id=file["file_id"],
+                    read=lambda data=blobs[file["file_id"]]: data,
+                    rows=file.get("rows"),
+                )
+            except Exception as e:
+                logger.error(f"Could not ingest {file['blob_name']}: {e}")
+                failed.add(file["file_id"])
+    return failed
+
+
+def load_zi_search_batch(services: dict, files: list, frames: list) -> None:
+    """Loads the parsed `frames` of `files` and queues their sheet and slack
+    updates in one transaction."""
+    from app import get_tracked_email_filter
+
+    psql = services['psql']
+    st = services['st']
+    sheet_week = services['sheet_week']
+    ledger = services['ledger']
+
+    dataset = pd.concat(frames, ignore_index=True)
+    file_ids = [file["file_id"] for file in files]
+    candidates = get_tracked_email_filter(psql.engine).prefilter(
+        psql._clean_column_names(dataset.copy())
+    )
+    logger.info(f"{candidates.shape[0]} of {dataset.shape[0]} rows in {len(files)} files may be new leads")
+
+    # one transaction for the batch, a failure leaves every file unprocessed.
+    with ExitStack() as stack:
+        for file in files:
+            stack.enter_context(
+                ledger.stage(file["file_id"], "batch_load", source="zi_search_blob", blob_name=file["blob_name"])
             )
-            logger.info("Wrote data to google sheet")
+        connection = stack.enter_context(psql.engine.begin())
 
-            psql.update_tracking_table(uuid)
-            logger.info("Updated tracking table")
+        psql.insert_leads(dataset=dataset, connection=connection)
+        psql.update_files_have_been_processed(file_ids, connection=connection)
 
-            psql.update_tracking_table_shopify_customer(drive_metadata_uuid=uuid)
-            logger.info("Updated tracking table for shopify customer")
+        sheet_uuids = set()
+        if not candidates.empty:
+            # one sheet event per file and streamed chunk, so no more than a chunk is held.
+            for chunk in st.stream_new_zi_search_batch_lead_data(file_ids, connection=connection):
+                for (uuid, file_name), leads in chunk.groupby(["drive_metadata_uuid", "file_name"]):
+                    enqueue_sheet_chunk(
+                        psql, st.create_google_lead_data_frame(leads), file_name, uuid, sheet_week, connection
+                    )
+                    sheet_uuids.add(uuid)
 
-            slack_df = psql.get_slack_channel_metrics_zi_search(drive_metadata_uuid=uuid)
-            psql.send_update_slack_metrics(
-                slack_webhook=os.environ.get("SLACK_WEBHOOK"), slack_df=slack_df
+        for file in files:
+            psql.clear_ingest_checkpoints(file_id=file["file_id"], connection=connection)
+
+        for uuid in sheet_uuids:
+            psql.update_tracking_table(uuid, connection=connection)
+            psql.update_tracking_table_shopify_customer(drive_metadata_uuid=uuid, connection=connection)
+            psql.enqueue_outbox_event(
+                event_type="slack_metrics",
+                payload={"drive_metadata_uuid": uuid},
+                connection=connection,
             )
+        logger.info(f"Queued google sheet and slack events for {len(sheet_uuids)} of {len(files)} files")
+
+
+def enqueue_sheet_chunk(psql, sheet_data: pd.DataFrame, file_name: str, uuid, sheet_week: str, connection) -> None:
+    """Queues a chunk of a file's sheet rows, OutboxDrain appends the chunks of a tab together."""
+    psql.enqueue_outbox_event(
+        event_type="google_sheet",
+        payload={
+            "spreadsheet_name": f"Quick Mail Output - {sheet_week}",
+            "target_sheet": file_name,
+            "folder_id": os.environ.get("QUICK_MAIL_OUTPUT_PARENT_FOLDER_ID"),
+            "drive_metadata_uuid": str(uuid),
+            "data": json.loads(sheet_data.to_json(orient="split", index=False)),
+        },
+        connection=connection,
+    )
+
+
+def handle_slack_metrics_event(services: dict, payload: dict) -> None:
+    psql = services['psql']
+    slack_df = psql.get_slack_channel_metrics_zi_search(
+        drive_metadata_uuid=payload["drive_metadata_uuid"]
+    )
+    psql.send_update_slack_metrics(
+        slack_webhook=os.environ.get("SLACK_WEBHOOK"), slack_df=slack_df
+    )
+
+
+outbox_handlers = {
+    "slack_metrics": handle_slack_metrics_event,
+}
+
+
+def drain_google_sheet_events(services: dict, events: pd.DataFrame) -> None:
+    """Sends every pending tab write in one batch per spreadsheet."""
+    from app.google_drive.sheets import SheetWriteScheduler
+
+    psql = services['psql']
+    scheduler = SheetWriteScheduler(gdrive=services['gdrive'])
+    for event in events.itertuples():
+        payload = event.payload if isinstance(event.payload, dict) else json.loads(event.payload)
+        scheduler.queue(
+            dataframe=pd.DataFrame(payload["data"]["data"], columns=payload["data"]["columns"]),
+            spreadsheet_name=payload["spreadsheet_name"],
+            target_sheet=payload["target_sheet"],
+            folder_id=payload["folder_id"],
+        )
+
+    try:
+        scheduler.flush()
+    except Exception as e:
+        logger.error(f"Outbox google sheet batch failed: {e}")
+        for event in events.itertuples():
+            psql.fail_outbox_event(event.uuid, error=str(e))
+        return
+
+    for event in events.itertuples():
+        psql.complete_outbox_event(event.uuid)
+
+
+@app.schedule(
+    schedule="0 * * * * *",
+    arg_name="OutboxTimer",
+    run_on_startup=False,
+    use_monitor=False,
+)
+@instrumented("outbox_drain")
+def OutboxDrain(OutboxTimer: func.TimerRequest) -> None:
+    services = initialize_services()
+    psql = services['psql']
+
+    events = psql.claim_outbox_events(
+        batch_size=int(os.environ.get("OUTBOX_BATCH_SIZE", 50))
+    )
+    if events.empty:
+        return
+
+    logger.info(f"Draining {events.shape[0]} outbox events")
+    sheet_events = events[events["event_type"] == "google_sheet"]
+    if not sheet_events.empty:
+        drain_google_sheet_events(services, sheet_events)
+
+    other_events = events[events["event_type"] != "google_sheet"]
+    payloads = [
+        event.payload if isinstance(event.payload, dict) else json.loads(event.payload)
+        for event in other_events.itertuples()
+    ]
+    # the slack post waits until the file's sheet rows are written.
+    unwritten = psql.get_unwritten_sheet_events(
+        list({payload["drive_metadata_uuid"] for payload in payloads if "drive_metadata_uuid" in payload})
+    ).set_index("drive_metadata_uuid")["failed"].to_dict()
 
+    for event, payload in zip(other_events.itertuples(), payloads):
+        uuid = payload.get("drive_metadata_uuid")
+        if event.event_type == "slack_metrics" and uuid in unwritten:
+            if unwritten[uuid]:
+                psql.fail_outbox_event(event.uuid, error="the google sheet write failed")
+            else:
+                psql.release_outbox_event(event.uuid)
+            continue
+        try:
+            outbox_handlers[event.event_type](services, payload)
+            psql.complete_outbox_event(event.uuid)
+        except Exception as e:
+            logger.error(f"Outbox event {event.uuid} ({event.event_type}) failed: {e}")
+            psql.fail_outbox_event(event.uuid, error=str(e))
@@ -271,14 +271,9 @@ def ZiSearchBlobTrigger(myblob: func.InputStream):
 
 #     has_file_been_processed = psql.check_if_file_has_been_processed(file_id=file_id)
 
-#     logging.info("Getting franchise data")
-#     franchise_df = gdrive.get_franchise_data(
-#         file_id=os.environ.get("FRANCHISE_MASTER_LIST_FILE_ID")
-
-#     )
-#     logging.info("Upserting franchise data")
-#     psql.upsert_franchise_data(
-#         dataframe=franchise_df, temp_table_name="temp_franchise_data"
+#     logging.info("Syncing franchise data")
+#     psql.sync_franchise_data(
+#         gdrive, file_id=os.environ.get("FRANCHISE_MASTER_LIST_FILE_ID")
 #     )
 #     if not has_file_been_processed:
 #         blob_bytes = myblob.read()
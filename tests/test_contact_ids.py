@@ -0,0 +1,63 @@
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+from app.data.azure import contact_fingerprints, normalize_contact_ids
+
+
+def test_normalize_contact_ids_matches_across_dtypes():
+    as_int = normalize_contact_ids(pd.Series([123, 456]))
+    as_float = normalize_contact_ids(pd.Series([123.0, 456.0]))
+    as_str = normalize_contact_ids(pd.Series([" 123 ", "456.0"]))
+
+    assert as_int.tolist() == ["123", "456"]
+    assert as_float.tolist() == as_int.tolist()
+    assert as_str.tolist() == as_int.tolist()
+
+
+def test_normalize_contact_ids_keeps_blanks_and_index():
+    contact_ids = normalize_contact_ids(pd.Series([np.nan, 7.0, None], index=[3, 4, 5]))
+
+    assert contact_ids.tolist() == [None, "7", None]
+    assert contact_ids.index.tolist() == [3, 4, 5]
+
+
+def test_normalize_contact_ids_only_drops_a_trailing_zero_decimal():
+    assert normalize_contact_ids(pd.Series(["120.0", "12.05", "100"])).tolist() == [
+        "120",
+        "12.05",
+        "100",
+    ]
+
+
+def test_contact_fingerprints_match_the_migration_backfill():
+    dataset = pd.DataFrame(
+        {"email_address": [" Jane@Example.com "], "zoominfo_contact_id": ["123"]}
+    )
+
+    expected = hashlib.md5("jane@example.com|123".encode()).hexdigest()
+    assert contact_fingerprints(dataset).tolist() == [expected]
+
+
+def test_contact_fingerprints_ignore_the_contact_id_dtype():
+    emails = ["jane@example.com", "john@example.com"]
+    as_float = pd.DataFrame({"email_address": emails, "zoominfo_contact_id": [123.0, np.nan]})
+    as_int = pd.DataFrame({"email_address": emails, "zoominfo_contact_id": ["123", None]})
+    as_float["zoominfo_contact_id"] = normalize_contact_ids(as_float["zoominfo_contact_id"])
+
+    assert contact_fingerprints(as_float).tolist() == contact_fingerprints(as_int).tolist()
+
+
+def test_contact_fingerprints_are_nan_without_email_or_contact_id():
+    dataset = pd.DataFrame(
+        {
+            "email_address": [None, "", "jane@example.com"],
+            "zoominfo_contact_id": [None, "42", None],
+        }
+    )
+
+    fingerprints = contact_fingerprints(dataset)
+    assert pd.isna(fingerprints.iloc[0])
+    assert fingerprints.iloc[1] == hashlib.md5("|42".encode()).hexdigest()
+    assert fingerprints.iloc[2] == hashlib.md5("jane@example.com|".encode()).hexdigest()
@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+
+from app.data.email_filter import TrackedEmailFilter
+
+
+def test_contains_finds_only_added_emails():
+    email_filter = TrackedEmailFilter.from_emails(["jane@example.com", "john@example.com"])
+
+    contains = email_filter.contains(pd.Series(["john@example.com", "new@example.com"]))
+    assert contains.tolist() == [True, False]
+
+
+def test_contains_on_an_empty_filter():
+    contains = TrackedEmailFilter().contains(pd.Series(["jane@example.com"]))
+
+    assert contains.tolist() == [False]
+
+
+def test_emails_are_compared_exactly():
+    email_filter = TrackedEmailFilter.from_emails(["jane@example.com"])
+
+    assert email_filter.contains(pd.Series(["Jane@example.com"])).tolist() == [False]
+
+
+def test_add_keeps_hashes_sorted_and_unique():
+    email_filter = TrackedEmailFilter.from_emails(["b@example.com", "a@example.com"])
+    email_filter.add(["a@example.com", "c@example.com"])
+
+    assert email_filter.hashes.size == 3
+    assert np.all(email_filter.hashes[1:] > email_filter.hashes[:-1])
+    assert email_filter.memory_bytes == 3 * 8
+
+
+def test_prefilter_keeps_rows_that_may_be_new_leads():
+    email_filter = TrackedEmailFilter.from_emails(["tracked@example.com"])
+    dataframe = pd.DataFrame(
+        {
+            "email_address": ["tracked@example.com", "new@example.com", None, "", "nan"],
+            "row": [1, 2, 3, 4, 5],
+        }
+    )
+
+    assert email_filter.prefilter(dataframe)["row"].tolist() == [2]
+
+
+def test_prefilter_without_the_email_column_is_empty():
+    dataframe = pd.DataFrame({"company": ["Acme"]})
+
+    assert TrackedEmailFilter().prefilter(dataframe).empty
@@ -0,0 +1,68 @@
+import numpy as np
+import pandas as pd
+
+from app.data.fingerprints import (
+    SheetFingerprintIndex,
+    fingerprint_rows,
+    sheet_cell,
+    sheet_values_to_frame,
+)
+
+
+def test_fingerprint_rows_are_stable_and_keep_the_index():
+    dataframe = pd.DataFrame({"a": [1, 2], "b": ["x", "y"]}, index=[10, 11])
+
+    fingerprints = fingerprint_rows(dataframe)
+    assert fingerprints.index.tolist() == [10, 11]
+    assert fingerprints.tolist() == fingerprint_rows(dataframe.copy()).tolist()
+    assert fingerprints.iloc[0] != fingerprints.iloc[1]
+
+
+def test_fingerprint_rows_treat_missing_values_as_blank():
+    with_nan = pd.DataFrame({"a": ["x"], "b": [np.nan]})
+    with_blank = pd.DataFrame({"a": ["x"], "b": [""]})
+
+    assert fingerprint_rows(with_nan).tolist() == fingerprint_rows(with_blank).tolist()
+
+
+def test_fingerprint_rows_depend_on_column_boundaries():
+    joined = pd.DataFrame({"a": ["ab"], "b": ["c"]})
+    split = pd.DataFrame({"a": ["a"], "b": ["bc"]})
+
+    assert fingerprint_rows(joined).tolist() != fingerprint_rows(split).tolist()
+
+
+def test_sheet_cell_normalises_numbers_dates_and_booleans():
+    assert sheet_cell(1234) == sheet_cell(1234.0) == sheet_cell("1234") == "1234"
+    assert sheet_cell(12.5) == sheet_cell("12.5") == "12.5"
+    assert sheet_cell(pd.Timestamp("2024-01-05")) == sheet_cell("2024-01-05") == "45296"
+    assert sheet_cell(True) == sheet_cell("True") == "TRUE"
+    assert sheet_cell(None) == sheet_cell(np.nan) == sheet_cell("") == ""
+    assert sheet_cell("jane@example.com") == "jane@example.com"
+
+
+def test_sheet_values_to_frame_pads_and_orders_columns():
+    values = [["b", "a"], ["1", "2"], ["3"]]
+
+    frame = sheet_values_to_frame(values, ["a", "b"])
+    assert frame.columns.tolist() == ["a", "b"]
+    assert frame.values.tolist() == [["2", "1"], ["", "3"]]
+
+
+def test_index_fingerprints_match_a_formula_read_back():
+    dataframe = pd.DataFrame(
+        {
+            "name": ["Acme"],
+            "employees": [1234.0],
+            "created_at": [pd.Timestamp("2024-01-05 12:30:00")],
+            "customer": [True],
+            "notes": [np.nan],
+        }
+    )
+    # the FORMULA render returns numbers, serial dates and booleans, and drops trailing blanks.
+    read_back = [dataframe.columns.tolist(), ["Acme", 1234, 45296.520833333336, True]]
+
+    index = SheetFingerprintIndex()
+    written = index.fingerprint_rows(dataframe)
+    seeded = index.fingerprint_rows(sheet_values_to_frame(read_back, dataframe.columns))
+    assert written.tolist() == seeded.tolist()
@@ -0,0 +1,33 @@
+import pytest
+
+from app.data.ledger import ProcessingLedger
+
+
+def test_failed_files_query_filters_on_the_source():
+    query = ProcessingLedger().failed_files_query("sales_sync")
+
+    assert query.count("l.source = 'sales_sync'") == 2
+
+
+def test_failed_files_query_stops_at_max_attempts():
+    query = ProcessingLedger().failed_files_query("sales_sync", max_attempts=5)
+
+    assert "COALESCE(a.attempts, 0) < 5" in query
+
+
+def test_failed_files_query_inlines_max_attempts_as_an_int():
+    query = ProcessingLedger().failed_files_query("sales_sync", max_attempts=4.0)
+
+    assert "COALESCE(a.attempts, 0) < 4\n" in query
+
+
+def test_failed_files_query_rejects_a_non_numeric_max_attempts():
+    with pytest.raises(ValueError):
+        ProcessingLedger().failed_files_query("sales_sync", max_attempts="3; DROP TABLE x")
+
+
+def test_failed_files_query_counts_stuck_runs_as_failed():
+    query = ProcessingLedger(stuck_after_minutes=45).failed_files_query("sales_sync")
+
+    assert query.count("INTERVAL '45 minutes'") == 2
+    assert "COALESCE(l.error, 'stuck') AS error" in query
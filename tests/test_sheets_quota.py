@@ -0,0 +1,99 @@
+import json
+
+import pytest
+import requests
+from gspread.exceptions import APIError
+
+from app.google_drive import sheets
+from app.google_drive.sheets import TokenBucket, call_with_quota
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(sheets, "monotonic", clock.monotonic)
+    monkeypatch.setattr(sheets, "sleep", clock.sleep)
+    return clock
+
+
+def api_error(status_code):
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = json.dumps({"error": {"code": status_code, "message": "error"}}).encode()
+    return APIError(response)
+
+
+def test_token_bucket_allows_a_burst_up_to_the_rate(clock):
+    bucket = TokenBucket(rate_per_minute=3)
+    for _ in range(3):
+        bucket.acquire()
+
+    assert clock.sleeps == []
+
+
+def test_token_bucket_waits_for_the_next_token(clock):
+    bucket = TokenBucket(rate_per_minute=60)
+    for _ in range(60):
+        bucket.acquire()
+    bucket.acquire()
+
+    assert clock.sleeps == [pytest.approx(1.0)]
+
+
+def test_token_bucket_refills_over_time(clock):
+    bucket = TokenBucket(rate_per_minute=60)
+    for _ in range(60):
+        bucket.acquire()
+    clock.now += 30
+    for _ in range(30):
+        bucket.acquire()
+
+    assert clock.sleeps == []
+
+
+def test_call_with_quota_backs_off_on_429(clock):
+    results = iter([api_error(429), api_error(429), "done"])
+
+    def call():
+        result = next(results)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    assert call_with_quota(TokenBucket(rate_per_minute=60), call) == "done"
+    assert clock.sleeps == [5, 10]
+
+
+def test_call_with_quota_raises_other_errors_at_once(clock):
+    def call():
+        raise api_error(500)
+
+    with pytest.raises(APIError):
+        call_with_quota(TokenBucket(rate_per_minute=60), call)
+    assert clock.sleeps == []
+
+
+def test_call_with_quota_gives_up_after_max_retries(clock):
+    calls = []
+
+    def call():
+        calls.append(1)
+        raise api_error(429)
+
+    with pytest.raises(APIError):
+        call_with_quota(TokenBucket(rate_per_minute=60), call, max_retries=2)
+    assert len(calls) == 3
+    assert clock.sleeps == [5, 10]